@@ -1,16 +1,30 @@
 from flask import Flask, request, jsonify
-import threading
 import os
 from dotenv import load_dotenv
 import printslicer as ps
+import workers
+import display_pool
+import converters
+import conversion_pool
+import result_cache
+import job_store
+import callback_outbox as outbox
+import meshtools
+import mass_estimator
+import atexit
+import threading
+import concurrent.futures
 import logging
 import gc
 import time
-import requests
+import downloader
+import url_index
+import compression
+import engine_router
+import model_bounds
 import tempfile
+import json
 from werkzeug.utils import secure_filename
-import trimesh
-import pymeshlab
 
 from logging.config import dictConfig
 
@@ -86,6 +100,11 @@ if not os.path.exists(tmp_directory):
 else:
     logging.info(f"[STARTUP] Tmp directory already exists")
 
+# Persistent state (result cache, etc.) lives in the data directory
+data_directory = os.getenv('DATA_DIR', 'data')
+logging.info(f"[STARTUP] Data directory: {data_directory}")
+os.makedirs(data_directory, exist_ok=True)
+
 # Log directory contents for debugging
 try:
     dir_contents = os.listdir('.')
@@ -93,14 +112,187 @@ try:
 except Exception as e:
     logging.warning(f"[STARTUP] Could not list directory contents: {e}")
 
+# Bounded executor for slicing jobs: SLICER_WORKERS concurrent slicer runs
+# (default: CPU count) plus SLICER_QUEUE_SIZE jobs waiting for a slot
+slicer_workers = int(os.getenv('SLICER_WORKERS', os.cpu_count() or 1))
+slicer_queue_size = int(os.getenv('SLICER_QUEUE_SIZE', slicer_workers * 4))
+logging.info(f"[STARTUP] Slicer workers: {slicer_workers}, queue size: {slicer_queue_size}")
+job_executor = workers.JobExecutor(slicer_workers, slicer_queue_size)
+
+# X displays for SuperSlicer: a pool of long-lived Xvfb servers instead of xvfb-run per slice,
+# or no display at all when the slicer is found to work headless
+slicer_display_mode = os.getenv('SLICER_DISPLAY_MODE', 'auto')
+slicer_displays = int(os.getenv('SLICER_DISPLAYS', slicer_workers))
+ps.display_pool = display_pool.DisplayPool(slicer_displays, slicer_display_mode)
+
+def detect_display_mode():
+    """Probe whether SuperSlicer runs headless by slicing a small test cube without a display"""
+    probe_stl = os.path.join(tmp_directory, f'display_probe_{os.getpid()}.stl')
+    probe_gcode = os.path.join(tmp_directory, f'display_probe_{os.getpid()}.gcode')
+    try:
+        ps.write_test_cube(probe_stl)
+        ps.display_pool.detect(['./slicersuper', '--load', 'config.ini', '--export-gcode', '-o', probe_gcode,
+                                probe_stl])
+    except Exception as e:
+        logging.error(f"[STARTUP] Display detection failed, staying on xvfb-run: {str(e)}")
+    finally:
+        for probe_file in (probe_stl, probe_gcode):
+            if os.path.exists(probe_file):
+                os.remove(probe_file)
+
+# The probe is a real slice that can take a while, so slices use xvfb-run until it finishes
+if ps.display_pool.detecting:
+    threading.Thread(target=detect_display_mode, name='display-detect', daemon=True).start()
+atexit.register(ps.display_pool.shutdown)
+
+# Mesh conversion runs in recycled worker processes so trimesh/pymeshlab
+# memory growth and hangs stay out of the HTTP worker
+conversion_workers = int(os.getenv('CONVERSION_WORKERS', min(2, slicer_workers)))
+conversion_max_jobs = int(os.getenv('CONVERSION_MAX_JOBS_PER_WORKER', 20))
+conversion_max_rss_mb = int(os.getenv('CONVERSION_MAX_WORKER_RSS_MB', 1024))
+conversion_timeout = float(os.getenv('CONVERSION_TIMEOUT', 180))
+converter_pool = conversion_pool.ConversionPool(
+    conversion_workers,
+    conversion_max_jobs,
+    conversion_max_rss_mb * 1024 * 1024,
+    conversion_timeout
+)
+atexit.register(converter_pool.shutdown)
+
+# Conversion engines are ordered per format from recorded success rates and times;
+# each engine has its own timeout so a hanging loader hands over to the next one
+CONVERSION_ENGINES = converters.ENGINES
+conversion_engine_timeouts = {
+    engine: float(os.getenv(f'CONVERSION_TIMEOUT_{engine.upper()}', conversion_timeout))
+    for engine in CONVERSION_ENGINES
+}
+# Seconds each mesh repair step (duplicate/degenerate face removal, hole filling) may take before it is skipped
+conversion_repair_budget = float(os.getenv('CONVERSION_REPAIR_BUDGET', 30))
+conversion_router = engine_router.EngineRouter(
+    os.path.join(data_directory, 'conversions.db'),
+    list(CONVERSION_ENGINES),
+    preferred=converters.PREFERRED_ENGINES,
+    min_samples=int(os.getenv('CONVERSION_ROUTING_MIN_SAMPLES', 5)),
+    exploration=float(os.getenv('CONVERSION_ROUTING_EXPLORATION', 0.1))
+)
+
+# Slicer results keyed by upload SHA-256 + config.ini hash + service version
+result_cache_max_entries = int(os.getenv('RESULT_CACHE_MAX_ENTRIES', 50000))
+result_cache_max_age_days = float(os.getenv('RESULT_CACHE_MAX_AGE_DAYS', 30))
+if result_cache_max_entries > 0:
+    slicer_cache = result_cache.ResultCache(
+        os.path.join(data_directory, 'results.db'),
+        'config.ini',
+        version,
+        result_cache_max_entries,
+        result_cache_max_age_days * 86400
+    )
+else:
+    logging.info(f"[STARTUP] Result cache disabled")
+    slicer_cache = None
+
+# Shared pooled session for file_url downloads with timeouts and a size cap
+file_downloader = downloader.Downloader(
+    max_bytes=int(float(os.getenv('DOWNLOAD_MAX_MB', 500)) * 1024 * 1024),
+    connect_timeout=float(os.getenv('DOWNLOAD_CONNECT_TIMEOUT', 10)),
+    read_timeout=float(os.getenv('DOWNLOAD_READ_TIMEOUT', 60)),
+    max_retries=int(os.getenv('DOWNLOAD_MAX_RETRIES', 3)),
+    pool_size=max(10, slicer_workers)
+)
+
+# Largest size a .gz/.zst/.zip model may expand to, so a small archive cannot fill the disk
+decompressed_max_bytes = int(float(os.getenv('DECOMPRESSED_MAX_MB', 1024)) * 1024 * 1024)
+
+# Downloaded URLs with their ETag/Last-Modified, so repeat file_url jobs use conditional GETs
+download_index_max_mb = float(os.getenv('DOWNLOAD_INDEX_MAX_MB', 2048))
+if download_index_max_mb > 0:
+    download_index = url_index.UrlIndex(
+        os.path.join(data_directory, 'downloads.db'),
+        os.path.join(data_directory, 'downloads'),
+        int(download_index_max_mb * 1024 * 1024)
+    )
+else:
+    logging.info(f"[STARTUP] Download index disabled")
+    download_index = None
+
+# Most files accepted in one /api/slice/batch request
+batch_max_files = int(os.getenv('BATCH_MAX_FILES', 200))
+# Batch file_url downloads run concurrently, shared by all batches
+batch_download_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=int(os.getenv('BATCH_DOWNLOAD_WORKERS', 4)),
+    thread_name_prefix='batch-download'
+)
+# How often a batch resumed after a restart checks whether its member jobs have finished
+BATCH_RESUME_POLL_INTERVAL = 2.0
+
+# Longest a request may block with ?wait= before falling back to the 202 response; keep it below the gunicorn timeout
+slice_max_wait = float(os.getenv('SLICE_MAX_WAIT', 25))
+
+# Job states and results, so clients can poll and unfinished jobs survive a restart
+job_retention_days = float(os.getenv('JOB_RETENTION_DAYS', 7))
+jobs = job_store.JobStore(os.path.join(data_directory, 'jobs.db'), job_retention_days * 86400)
+
+# Callbacks are persisted and delivered with retries by a separate sender pool
+callback_outbox = outbox.CallbackOutbox(
+    os.path.join(data_directory, 'callbacks.db'),
+    senders=int(os.getenv('CALLBACK_SENDERS', 4)),
+    max_attempts=int(os.getenv('CALLBACK_MAX_ATTEMPTS', 8)),
+    base_delay=float(os.getenv('CALLBACK_RETRY_BASE_DELAY', 2)),
+    max_delay=float(os.getenv('CALLBACK_RETRY_MAX_DELAY', 600)),
+    connect_timeout=float(os.getenv('CALLBACK_CONNECT_TIMEOUT', 5)),
+    read_timeout=float(os.getenv('CALLBACK_READ_TIMEOUT', 30)),
+    batch_size=int(os.getenv('CALLBACK_BATCH_SIZE', 1)),
+    retention=job_retention_days * 86400,
+    on_result=jobs.set_callback_delivered
+)
+atexit.register(callback_outbox.shutdown)
+
+# Concurrent jobs for the same content and config attach to the one already running
+config_namespace = result_cache.config_namespace('config.ini', version)
+in_flight = workers.SingleFlight()
+
+# Layer height and nozzle from config.ini set the defaults for unit detection, tessellation and decimation
+print_settings = mass_estimator.load_print_settings('config.ini')
+
+# Models whose largest extent is below this many mm (by default one nozzle width, too small to slice)
+# are treated as inch exports, or meters when tiny, and scaled before slicing
+unit_detection_max_extent = float(os.getenv('UNIT_DETECTION_MAX_EXTENT_MM', print_settings['nozzle_diameter']))
 
+# STEP tessellation tolerances; by default derived from the layer height and nozzle in config.ini
+tessellation_defaults = converters.default_tessellation(print_settings['layer_height'],
+                                                       print_settings['nozzle_diameter'])
+tessellation_defaults['linear'] = float(os.getenv('TESSELLATION_LINEAR_MM', tessellation_defaults['linear']))
+tessellation_defaults['angular'] = float(os.getenv('TESSELLATION_ANGULAR_RAD', tessellation_defaults['angular']))
 
-def download_file_from_url(url, download_path='tmp', filename=None):
-    """Download a file from URL to local temp directory"""
+# Meshes above this many triangles are simplified before slicing (0 disables); the simplified mesh is
+# only used when its volume and bounding box stay within these deviations of the original
+decimation_target_faces = int(os.getenv('DECIMATION_TARGET_FACES', 0))
+decimation_max_volume_deviation = float(os.getenv('DECIMATION_MAX_VOLUME_DEVIATION', 0.005))
+decimation_max_bbox_deviation = float(os.getenv('DECIMATION_MAX_BBOX_DEVIATION_MM', print_settings['layer_height'] / 2))
+
+# Formats SuperSlicer loads itself; in full mode they skip conversion unless the slicer rejects them
+native_slicer_formats = {
+    '.' + extension.strip().lower().lstrip('.')
+    for extension in os.getenv('NATIVE_SLICER_FORMATS', 'obj,3mf,amf').split(',') if extension.strip()
+}
+
+# Shell + infill print mass model, calibrated with `python mass_estimator.py calibrate`
+mass_model = mass_estimator.MassEstimator.load('config.ini', os.path.join(data_directory, 'mass_estimator.json'))
+
+
+
+def download_file_from_url(url, download_path='tmp', filename=None, info=None):
+    """Download a file from URL to local temp directory
+    
+    When ``info`` is a dict it receives the byte count, SHA-256, download
+    time and, on failure, the error message and whether the size cap was hit.
+    """
     logging.info(f"[DOWNLOAD] Starting file download from URL: {url}")
     logging.info(f"[DOWNLOAD] Download path: {download_path}, Filename: {filename}")
     
     start_time = time.time()
+    if info is None:
+        info = {}
     
     try:
         logging.info(f"[DOWNLOAD] Creating download directory: {download_path}")
@@ -118,67 +310,108 @@ def download_file_from_url(url, download_path='tmp', filename=None):
         download_path_full = os.path.join(download_path, filename)
         logging.info(f"[DOWNLOAD] Full download path: {download_path_full}")
         
-        logging.info(f"[DOWNLOAD] Initiating HTTP request to: {url}")
-        response = requests.get(url, stream=True)
-        logging.info(f"[DOWNLOAD] HTTP response status: {response.status_code}")
-        
-        if response.status_code == 200:
-            total_bytes = 0
-            logging.info(f"[DOWNLOAD] Starting file write to: {download_path_full}")
-            with open(download_path_full, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-                    total_bytes += len(chunk)
-            
-            download_time = time.time() - start_time
-            logging.info(f"[DOWNLOAD] Successfully downloaded {total_bytes} bytes in {download_time:.2f} seconds")
-            logging.info(f"[DOWNLOAD] File saved to: {download_path_full}")
-            return download_path_full
-        else:
-            logging.error(f"[DOWNLOAD] Failed to download file from {url}. Status code: {response.status_code}")
-            logging.error(f"[DOWNLOAD] Response headers: {dict(response.headers)}")
-            return None
+        # Ask for the file only if it changed since the copy we already have
+        entry, headers = download_index.conditional_headers(url) if download_index is not None else (None, {})
+        result = file_downloader.fetch(url, download_path_full, headers)
+        if result['not_modified']:
+            try:
+                download_index.restore(url, entry, download_path_full)
+                info.update({"bytes": entry['size'], "sha256": entry['sha256'], "not_modified": True,
+                             "download_time": time.time() - start_time})
+                logging.info(f"[DOWNLOAD] Server answered 304, using stored copy: {download_path_full}")
+                return download_path_full
+            except OSError as e:
+                logging.warning(f"[DOWNLOAD] Stored copy of {url} is gone ({str(e)}), downloading again")
+                result = file_downloader.fetch(url, download_path_full)
+        
+        info.update(result)
+        if download_index is not None:
+            download_index.put(url, result['etag'], result['last_modified'], result['sha256'], download_path_full)
+        logging.info(f"[DOWNLOAD] File saved to: {download_path_full} (sha256 {result['sha256']})")
+        return download_path_full
+    except downloader.DownloadTooLargeError as e:
+        logging.error(f"[DOWNLOAD] {str(e)}")
+        info.update({"error": str(e), "too_large": True})
+        return None
     except Exception as e:
         download_time = time.time() - start_time
         logging.error(f"[DOWNLOAD] Exception occurred after {download_time:.2f} seconds: {str(e)}")
         logging.error(f"[DOWNLOAD] Exception type: {type(e).__name__}")
+        info.update({"error": str(e), "too_large": False})
         return None
 
-def send_callback(callback_url, result_data):
-    """Send results to callback URL"""
-    logging.info(f"[CALLBACK] Starting callback to: {callback_url}")
-    logging.info(f"[CALLBACK] Payload keys: {list(result_data.keys())}")
-    logging.info(f"[CALLBACK] Result status: {result_data.get('status', 'unknown')}")
+def send_callback(callback_url, result_data, job_id=None):
+    """Queue results for delivery to the callback URL; returns the outbox id, or None when there is no callback URL
     
-    start_time = time.time()
+    Delivery, retries and recording the outcome on the job happen in the callback outbox.
+    """
+    if not callback_url:
+        logging.info(f"[CALLBACK] No callback URL for this job, skipping callback")
+        return None
     
+    logging.info(f"[CALLBACK] Queueing callback to: {callback_url}")
+    logging.info(f"[CALLBACK] Payload keys: {list(result_data.keys())}")
+    logging.info(f"[CALLBACK] Result status: {result_data.get('status', 'unknown')}")
     try:
-        logging.info(f"[CALLBACK] Sending POST request with {len(str(result_data))} bytes of data")
-        response = requests.post(callback_url, json=result_data, timeout=30)
-        
-        callback_time = time.time() - start_time
-        logging.info(f"[CALLBACK] Received response in {callback_time:.2f} seconds")
-        logging.info(f"[CALLBACK] Response status code: {response.status_code}")
-        
-        if response.status_code == 200:
-            logging.info(f"[CALLBACK] Successfully sent callback to {callback_url}")
-            return True
-        else:
-            logging.error(f"[CALLBACK] Failed with status {response.status_code}")
-            logging.error(f"[CALLBACK] Response text: {response.text[:500]}...")  # Truncate long responses
-            logging.error(f"[CALLBACK] Response headers: {dict(response.headers)}")
-            return False
-    except requests.exceptions.Timeout:
-        logging.error(f"[CALLBACK] Request timed out after 30 seconds to {callback_url}")
-        return False
-    except requests.exceptions.ConnectionError as e:
-        logging.error(f"[CALLBACK] Connection error to {callback_url}: {str(e)}")
-        return False
+        return callback_outbox.enqueue(callback_url, result_data, job_id)
     except Exception as e:
-        callback_time = time.time() - start_time
-        logging.error(f"[CALLBACK] Exception after {callback_time:.2f} seconds: {str(e)}")
+        logging.error(f"[CALLBACK] Could not queue callback to {callback_url}: {str(e)}")
         logging.error(f"[CALLBACK] Exception type: {type(e).__name__}")
-        return False
+        if job_id:
+            jobs.set_callback_delivered(job_id, False)
+        return None
+
+# 'full' slices with SuperSlicer, 'fast' only measures the mesh,
+# 'estimate' measures the mesh and predicts filament usage from config.ini
+PROCESSING_MODES = ('full', 'fast', 'estimate')
+
+def queue_full_response(retry_after):
+    """Build the 503 response returned when the job queue has no free slot"""
+    response = jsonify({
+        "error": "Slicing queue is full, please retry later",
+        "retry_after": retry_after
+    })
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+def parse_wait(raw_wait):
+    """Parse the optional ``wait`` parameter into seconds, capped at SLICE_MAX_WAIT; raises ValueError if invalid"""
+    if raw_wait in (None, ''):
+        return 0.0
+    wait = float(raw_wait)
+    if wait < 0 or wait != wait:
+        raise ValueError("wait must be a non-negative number of seconds")
+    return min(wait, slice_max_wait)
+
+def parse_tessellation(source):
+    """Read tessellation_linear (mm) and tessellation_angular (radians) overrides from request data
+    
+    Returns None when neither is given; raises ValueError for values that are not positive numbers.
+    """
+    tessellation = {}
+    for key in ('linear', 'angular'):
+        raw = source.get(f'tessellation_{key}')
+        if raw is None or raw == '':
+            continue
+        value = float(raw)
+        if not value > 0 or value == float('inf'):
+            raise ValueError(f"tessellation_{key} must be a positive number")
+        tessellation[key] = value
+    return tessellation or None
+
+def resolve_conversion_options(file_path, requested):
+    """Conversion options that change the mesh of ``file_path``: tessellation tolerances for STEP, nothing otherwise
+    
+    Files no engine tessellates with tolerances (IGES, or STEP without
+    cascadio) get none, so they are not split across cache keys.
+    """
+    if not converters.supports_tessellation(get_file_extension(file_path)):
+        return {}
+    return {"tessellation": dict(tessellation_defaults, **((requested or {}).get('tessellation') or {}))}
+
+def conversion_options_key(conversion_options):
+    """Cache key suffix for options that change the converted mesh; empty when there are none"""
+    return f":{json.dumps(conversion_options, sort_keys=True)}" if conversion_options else ""
 
 def get_file_extension(filename):
     """Get file extension in lowercase"""
@@ -194,9 +427,17 @@ def is_supported_format(filename):
     supported_formats = {
         '.stl', '.obj', '.ply', '.off', '.3mf', '.dae', '.gltf', '.glb',
         '.x3d', '.wrl', '.vrml', '.step', '.stp', '.iges', '.igs',
-        '.collada', '.blend'  # Note: STEP/IGES may need special handling
+        '.collada', '.blend', '.amf'  # Note: STEP/IGES may need special handling
     }
     
+    # Compressed models are accepted by the name of the model inside; zip members are checked when unpacked
+    compressed = compression.compression_of(filename)
+    if compressed == '.zip':
+        logging.debug(f"[FORMAT_CHECK] Zip archive, contents are checked when it is unpacked")
+        return True
+    if compressed:
+        filename = compression.inner_filename(filename)
+    
     extension = get_file_extension(filename)
     is_supported = extension in supported_formats
     
@@ -206,149 +447,81 @@ def is_supported_format(filename):
     
     return is_supported
 
-def convert_to_stl_trimesh(input_path, output_path):
-    """Convert 3D file to STL using trimesh"""
-    logging.info(f"[CONVERT_TRIMESH] Starting conversion: {input_path} -> {output_path}")
-    
-    start_time = time.time()
+def is_model_file(filename):
+    """Whether ``filename`` is a supported, uncompressed 3D model"""
+    return not compression.compression_of(filename) and is_supported_format(filename)
+
+def unpack_file(file_path, job_id=None):
+    """Decompress a .gz, .zst or .zip model into the temp directory and remove the compressed file
     
+    Returns the decompression details, including the unpacked ``path`` and its SHA-256.
+    """
+    logging.info(f"[DECOMPRESS] Unpacking {file_path} (limit {decompressed_max_bytes / 1024 / 1024:.0f} MB)...")
     try:
-        # Check input file exists and size
-        if not os.path.exists(input_path):
-            raise FileNotFoundError(f"Input file does not exist: {input_path}")
-        
-        file_size = os.path.getsize(input_path)
-        logging.info(f"[CONVERT_TRIMESH] Input file size: {file_size} bytes")
-        
-        # Load mesh with trimesh
-        logging.info(f"[CONVERT_TRIMESH] Loading mesh with trimesh...")
-        mesh = trimesh.load(input_path)
-        logging.info(f"[CONVERT_TRIMESH] Mesh loaded successfully, type: {type(mesh).__name__}")
-        
-        # Handle scene objects (for formats like GLTF, OBJ with multiple objects)
-        if hasattr(mesh, 'geometry'):
-            logging.info(f"[CONVERT_TRIMESH] Scene detected with {len(mesh.geometry)} geometries")
-            
-            # It's a Scene, combine all geometries
-            if len(mesh.geometry) == 0:
-                raise ValueError("No geometry found in the file")
-            elif len(mesh.geometry) == 1:
-                logging.info(f"[CONVERT_TRIMESH] Single geometry in scene, extracting...")
-                mesh = list(mesh.geometry.values())[0]
-            else:
-                logging.info(f"[CONVERT_TRIMESH] Multiple geometries found, combining {len(mesh.geometry)} meshes...")
-                # Combine multiple geometries
-                meshes = list(mesh.geometry.values())
-                mesh = trimesh.util.concatenate(meshes)
-                logging.info(f"[CONVERT_TRIMESH] Meshes combined successfully")
-        else:
-            logging.info(f"[CONVERT_TRIMESH] Single mesh object loaded")
-        
-        # Ensure it's a valid mesh
-        if not hasattr(mesh, 'vertices') or len(mesh.vertices) == 0:
-            raise ValueError("Invalid or empty mesh")
-        
-        logging.info(f"[CONVERT_TRIMESH] Mesh info: {len(mesh.vertices)} vertices, {len(mesh.faces)} faces")
-        
-        # Fix mesh issues
-        logging.info(f"[CONVERT_TRIMESH] Cleaning mesh: removing duplicate faces...")
-        mesh.remove_duplicate_faces()
-        
-        logging.info(f"[CONVERT_TRIMESH] Cleaning mesh: removing degenerate faces...")
-        mesh.remove_degenerate_faces()
-        
-        logging.info(f"[CONVERT_TRIMESH] Cleaning mesh: filling holes...")
-        mesh.fill_holes()
-        
-        logging.info(f"[CONVERT_TRIMESH] Final mesh: {len(mesh.vertices)} vertices, {len(mesh.faces)} faces")
-        
-        # Export as STL
-        logging.info(f"[CONVERT_TRIMESH] Exporting to STL: {output_path}")
-        mesh.export(output_path)
-        
-        # Verify output file was created
+        decompression = compression.decompress(file_path, tmp_directory, decompressed_max_bytes, is_model_file)
+        if job_id:
+            jobs.set_file_path(job_id, decompression['path'])
+        return decompression
+    finally:
+        try:
+            os.remove(file_path)
+            logging.info(f"[DECOMPRESS] Compressed file removed: {file_path}")
+        except OSError as e:
+            logging.warning(f"[DECOMPRESS] Could not remove compressed file {file_path}: {e}")
+
+def run_conversion(convert_func, input_path, output_path, timeout=None, options=None):
+    """Run a converter in the conversion pool, treating timeouts and worker crashes as failures"""
+    try:
+        return converter_pool.run(convert_func, input_path, output_path, options, timeout=timeout)
+    except (conversion_pool.ConversionTimeoutError, conversion_pool.ConversionWorkerError) as e:
+        logging.error(f"[CONVERT_STL] {convert_func.__name__} failed in conversion pool: {str(e)}")
+        # A killed worker can leave a partially written file behind
         if os.path.exists(output_path):
-            output_size = os.path.getsize(output_path)
-            conversion_time = time.time() - start_time
-            logging.info(f"[CONVERT_TRIMESH] Conversion successful in {conversion_time:.2f}s")
-            logging.info(f"[CONVERT_TRIMESH] Output file size: {output_size} bytes")
-            return True
-        else:
-            raise Exception("Output file was not created")
-        
-    except Exception as e:
-        conversion_time = time.time() - start_time
-        logging.error(f"[CONVERT_TRIMESH] Conversion failed after {conversion_time:.2f}s: {str(e)}")
-        logging.error(f"[CONVERT_TRIMESH] Exception type: {type(e).__name__}")
+            try:
+                os.remove(output_path)
+            except OSError as remove_error:
+                logging.warning(f"[CONVERT_STL] Could not remove partial output {output_path}: {remove_error}")
         return False
 
-def convert_to_stl_pymeshlab(input_path, output_path):
-    """Convert 3D file to STL using PyMeshLab (fallback for STEP/complex formats)"""
-    logging.info(f"[CONVERT_PYMESHLAB] Starting conversion: {input_path} -> {output_path}")
-    
-    start_time = time.time()
+def normalize_ascii_stl(input_path, file_id=None, metrics=None, job_id=None):
+    """Rewrite an ASCII STL as binary; returns the binary path, or the input path if conversion fails"""
+    base_name = os.path.splitext(os.path.basename(input_path))[0]
+    output_path = os.path.join(tmp_directory, f"{file_id or base_name}_{int(time.time())}_binary.stl")
+    logging.info(f"[CONVERT_STL] ASCII STL detected, converting to binary: {input_path} -> {output_path}")
     
     try:
-        # Check input file exists and size
-        if not os.path.exists(input_path):
-            raise FileNotFoundError(f"Input file does not exist: {input_path}")
-        
-        file_size = os.path.getsize(input_path)
-        logging.info(f"[CONVERT_PYMESHLAB] Input file size: {file_size} bytes")
-        
-        logging.info(f"[CONVERT_PYMESHLAB] Initializing PyMeshLab MeshSet...")
-        ms = pymeshlab.MeshSet()
-        
-        logging.info(f"[CONVERT_PYMESHLAB] Loading mesh from: {input_path}")
-        ms.load_new_mesh(input_path)
-        
-        current_mesh = ms.current_mesh()
-        vertex_count = current_mesh.vertex_number()
-        face_count = current_mesh.face_number()
-        
-        logging.info(f"[CONVERT_PYMESHLAB] Loaded mesh: {vertex_count} vertices, {face_count} faces")
-        
-        # Apply some basic cleaning
-        if vertex_count > 0:
-            logging.info(f"[CONVERT_PYMESHLAB] Cleaning mesh: removing duplicate vertices...")
-            ms.meshing_remove_duplicate_vertices()
-            
-            logging.info(f"[CONVERT_PYMESHLAB] Cleaning mesh: removing duplicate faces...")
-            ms.meshing_remove_duplicate_faces()
-            
-            logging.info(f"[CONVERT_PYMESHLAB] Cleaning mesh: filling holes (max size: 30)...")
-            ms.meshing_close_holes(maxholesize=30)
-            
-            # Log final mesh stats
-            final_mesh = ms.current_mesh()
-            final_vertices = final_mesh.vertex_number()
-            final_faces = final_mesh.face_number()
-            logging.info(f"[CONVERT_PYMESHLAB] Final mesh: {final_vertices} vertices, {final_faces} faces")
-        else:
-            logging.warning(f"[CONVERT_PYMESHLAB] Mesh has no vertices, skipping cleanup")
-        
-        # Save as STL
-        logging.info(f"[CONVERT_PYMESHLAB] Saving mesh as STL: {output_path}")
-        ms.save_current_mesh(output_path)
-        
-        # Verify output file was created
+        result = converter_pool.run(meshtools.ascii_stl_to_binary, input_path, output_path)
+    except (conversion_pool.ConversionTimeoutError, conversion_pool.ConversionWorkerError) as e:
+        logging.warning(f"[CONVERT_STL] ASCII to binary conversion failed, slicing the ASCII file as-is: {str(e)}")
         if os.path.exists(output_path):
-            output_size = os.path.getsize(output_path)
-            conversion_time = time.time() - start_time
-            logging.info(f"[CONVERT_PYMESHLAB] Conversion successful in {conversion_time:.2f}s")
-            logging.info(f"[CONVERT_PYMESHLAB] Output file size: {output_size} bytes")
-            return True
-        else:
-            raise Exception("Output file was not created")
-        
+            os.remove(output_path)
+        return input_path
+    
+    logging.info(f"[CONVERT_STL] Binary STL written: {result['triangle_count']} facets, "
+                 f"{result['bytes_saved']} bytes saved, parsed in {result['parse_time']:.3f}s")
+    if metrics is not None:
+        metrics['stl_normalization'] = {
+            "bytes_saved": result['bytes_saved'],
+            "parse_time": result['parse_time']
+        }
+    
+    # The job points at the binary copy first, so a restart resumes from it instead of losing the input
+    if job_id:
+        jobs.set_file_path(job_id, output_path)
+    try:
+        os.remove(input_path)
+        logging.info(f"[CONVERT_STL] Original ASCII file removed: {input_path}")
     except Exception as e:
-        conversion_time = time.time() - start_time
-        logging.error(f"[CONVERT_PYMESHLAB] Conversion failed after {conversion_time:.2f}s: {str(e)}")
-        logging.error(f"[CONVERT_PYMESHLAB] Exception type: {type(e).__name__}")
-        return False
+        logging.warning(f"[CONVERT_STL] Could not remove original file {input_path}: {e}")
+    return output_path
 
-def convert_file_to_stl(input_path, file_id=None):
-    """Convert various 3D file formats to STL"""
+def convert_file_to_stl(input_path, file_id=None, metrics=None, conversion_options=None, job_id=None):
+    """Convert various 3D file formats to binary STL
+    
+    Stage timings and sizes are added to ``metrics`` when a dict is given.
+    ``conversion_options`` are passed to the converters, e.g. tessellation tolerances.
+    The job ``job_id`` is pointed at the STL before the original file is removed.
+    """
     logging.info(f"[CONVERT_STL] Starting conversion process for: {input_path}")
     logging.info(f"[CONVERT_STL] File ID: {file_id}")
     
@@ -362,10 +535,12 @@ def convert_file_to_stl(input_path, file_id=None):
     file_ext = get_file_extension(input_path)
     logging.info(f"[CONVERT_STL] Detected file extension: {file_ext}")
     
-    # If already STL, return as-is
+    # Binary STL is used as-is; ASCII STL is rewritten as binary, which is smaller and faster to parse downstream
     if file_ext == '.stl':
-        logging.info(f"[CONVERT_STL] File is already STL format, no conversion needed")
-        return input_path
+        if meshtools.is_binary_stl(input_path):
+            logging.info(f"[CONVERT_STL] File is already binary STL format, no conversion needed")
+            return input_path
+        return normalize_ascii_stl(input_path, file_id, metrics, job_id)
     
     # Generate output STL path
     base_name = os.path.splitext(os.path.basename(input_path))[0]
@@ -375,25 +550,25 @@ def convert_file_to_stl(input_path, file_id=None):
     logging.info(f"[CONVERT_STL] Converting {file_ext} to STL: {input_path} -> {output_path}")
     logging.info(f"[CONVERT_STL] Generated output filename: {output_filename}")
     
-    # Try trimesh first (works for most formats)
-    logging.info(f"[CONVERT_STL] Attempting conversion with trimesh (primary method)...")
-    if convert_to_stl_trimesh(input_path, output_path):
-        logging.info(f"[CONVERT_STL] Trimesh conversion successful, cleaning up original file...")
-        # Clean up original file
-        try:
-            os.remove(input_path)
-            logging.info(f"[CONVERT_STL] Original file removed: {input_path}")
-        except Exception as e:
-            logging.warning(f"[CONVERT_STL] Could not remove original file {input_path}: {e}")
+    # Engines are tried in the order that has worked best for this format so far
+    # Requested tessellation tolerances are only applied by some engines, which then go first
+    engines = converters.tessellating_first(conversion_router.order(file_ext), conversion_options)
+    logging.info(f"[CONVERT_STL] Engine order for {file_ext}: {', '.join(engines)}")
+    for attempt, engine in enumerate(engines, 1):
+        logging.info(f"[CONVERT_STL] Attempting conversion with {engine} (timeout "
+                     f"{conversion_engine_timeouts[engine]:.0f}s)...")
+        attempt_start_time = time.time()
+        converted = run_conversion(CONVERSION_ENGINES[engine], input_path, output_path,
+                                   conversion_engine_timeouts[engine],
+                                   dict(conversion_options or {}, repair_budget=conversion_repair_budget))
+        conversion_router.record(file_ext, engine, bool(converted), time.time() - attempt_start_time)
+        if not converted:
+            logging.info(f"[CONVERT_STL] {engine} conversion failed")
+            continue
         
-        conversion_time = time.time() - start_time
-        logging.info(f"[CONVERT_STL] Total conversion completed in {conversion_time:.2f}s")
-        return output_path
-    
-    # Fallback to PyMeshLab for complex formats
-    logging.info(f"[CONVERT_STL] Trimesh conversion failed, trying PyMeshLab (fallback method)...")
-    if convert_to_stl_pymeshlab(input_path, output_path):
-        logging.info(f"[CONVERT_STL] PyMeshLab conversion successful, cleaning up original file...")
+        logging.info(f"[CONVERT_STL] {engine} conversion successful, cleaning up original file...")
+        if job_id:
+            jobs.set_file_path(job_id, output_path)
         # Clean up original file
         try:
             os.remove(input_path)
@@ -401,6 +576,16 @@ def convert_file_to_stl(input_path, file_id=None):
         except Exception as e:
             logging.warning(f"[CONVERT_STL] Could not remove original file {input_path}: {e}")
         
+        if metrics is not None:
+            metrics['conversion'] = {"engine": engine, "attempts": attempt}
+            if isinstance(converted, dict):
+                metrics['conversion']['checks'] = converted.get('checks')
+                metrics['conversion']['repairs'] = converted['repairs']
+                metrics['conversion']['skipped_repairs'] = converted['skipped']
+                if converted.get('tessellation'):
+                    metrics['conversion']['tessellation'] = converted['tessellation']
+                if converted.get('scene'):
+                    metrics['conversion']['scene'] = converted['scene']
         conversion_time = time.time() - start_time
         logging.info(f"[CONVERT_STL] Total conversion completed in {conversion_time:.2f}s")
         return output_path
@@ -409,16 +594,304 @@ def convert_file_to_stl(input_path, file_id=None):
     conversion_time = time.time() - start_time
     logging.error(f"[CONVERT_STL] All conversion methods failed after {conversion_time:.2f}s")
     logging.error(f"[CONVERT_STL] Failed to convert {input_path} to STL using all available methods")
-    logging.error(f"[CONVERT_STL] Attempted methods: trimesh, pymeshlab")
+    logging.error(f"[CONVERT_STL] Attempted methods: {', '.join(engines)}")
+    return None
+
+def native_preflight(file_path, max_dimensions):
+    """Read the bounding box of a native-format file before it is handed to SuperSlicer
+    
+    Returns the reason to convert it instead, or None to slice it natively:
+    unit scaling, the oversize check and decimation need the converted STL.
+    Files no engine converts are always sliced natively.
+    """
+    file_ext = get_file_extension(file_path)
+    if not converters.can_convert(file_ext):
+        return None
+    try:
+        bounds = model_bounds.read_bounds(file_path)
+    except Exception as e:
+        return f"bounding box unreadable: {str(e)}"
+    
+    size = [bounds['size_x'], bounds['size_y'], bounds['size_z']]
+    scale_factor = ps.detect_unit_scale(size, max_dimensions, unit_detection_max_extent)
+    if scale_factor != 1.0:
+        return f"{size[0]:.4f}x{size[1]:.4f}x{size[2]:.4f}mm, needs scaling by {scale_factor}"
+    if not all(extent <= max_dimensions[axis] for extent, axis in zip(size, 'xyz')):
+        return f"{size[0]:.2f}x{size[1]:.2f}x{size[2]:.2f}mm, exceeds max dimensions"
+    if decimation_target_faces and bounds['triangle_count'] > decimation_target_faces:
+        return f"{bounds['triangle_count']} triangles, above the decimation target"
     return None
 
-def process_3d_file(file_path, callback_url, file_id=None, max_dimensions=None):
-    """Process 3D file (convert if needed) and send results to callback URL"""
+def slice_natively(file_path, metrics):
+    """Slice a native-format file without converting it; returns the response, or None if the slicer rejected it
+    
+    Files whose slicer output lists several objects are rejected too: only
+    the converted, merged mesh gives one volume and bounding box for them.
+    """
+    file_ext = get_file_extension(file_path)
+    logging.info(f"[PROCESS] Step 1: Slicing {file_ext} natively, skipping conversion...")
+    slicer_start_time = time.time()
+    response = ps.run_slicer_command_and_extract_info(os.path.abspath(file_path), os.path.basename(file_path))
+    slicer_time = time.time() - slicer_start_time
+    
+    accepted = response['status'] == 200 and response.get('object_count', 1) == 1
+    metrics['native_slicing'] = {
+        "format": file_ext.lstrip('.'),
+        "accepted": accepted,
+        "slicer_time": slicer_time
+    }
+    if not accepted:
+        reason = response.get('error') or f"{response.get('object_count')} objects"
+        logging.warning(f"[PROCESS] Native slicing not usable ({reason}), falling back to conversion")
+        return None, slicer_time
+    logging.info(f"[PROCESS] Native slicing completed in {slicer_time:.2f}s")
+    return response, slicer_time
+
+def decimate_for_slicing(stl_path, triangle_count, metrics):
+    """Simplify an STL above the decimation target; returns the simplified path, or None to slice the original"""
+    output_path = f"{os.path.splitext(stl_path)[0]}_decimated.stl"
+    logging.info(f"[PROCESS] Mesh has {triangle_count} triangles, "
+                 f"decimating to {decimation_target_faces} before slicing...")
+    try:
+        report = converter_pool.run(converters.decimate_stl, stl_path, output_path, decimation_target_faces,
+                                    decimation_max_volume_deviation, decimation_max_bbox_deviation)
+    except (conversion_pool.ConversionTimeoutError, conversion_pool.ConversionWorkerError) as e:
+        logging.warning(f"[PROCESS] Decimation failed, slicing the original mesh: {str(e)}")
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        metrics['decimation'] = {"accepted": False, "error": str(e)}
+        return None
+    
+    metrics['decimation'] = report
+    if not report['accepted']:
+        logging.warning(f"[PROCESS] Decimated mesh deviates too far from the original, slicing the original mesh")
+        return None
+    return output_path
+
+def analyze_file(file_path, file_id, max_dimensions, mode, content_hash, conversion_options=None, job_id=None):
+    """Steps 0-4 of process_3d_file: cache lookup, conversion, pre-flight and slicing or mesh analysis
+    
+    Returns the slicer-shaped ``response`` with the cache status, stage
+    timings and metrics. The input file and intermediate STL are removed;
+    ``job_id``'s stored input follows the intermediate STL so it can resume.
+    """
+    # Look up a previous result for the exact same upload and slicer config
+    cache_key = None
+    response = None
+    analysis_time = None
+    preflight_time = None
+    scale_factor = 1.0
+    metrics = {}
+    if slicer_cache is not None and mode == 'full':
+        logging.info(f"[PROCESS] Step 0: Checking result cache...")
+        cache_key = slicer_cache.make_key(content_hash + conversion_options_key(conversion_options))
+        response = slicer_cache.get(cache_key)
+    
+    if response is not None:
+        # The unit scale depends on the dimension limits, so a hit is only valid if this request would pick the same one
+        scale_factor = response.get('unit_scale_factor', 1.0)
+        if response['status'] == 200:
+            unscaled = [response[f'size_{axis}'] / scale_factor for axis in 'xyz']
+            if ps.detect_unit_scale(unscaled, max_dimensions, unit_detection_max_extent) != scale_factor:
+                logging.info(f"[PROCESS] Cached result was scaled by {scale_factor}, "
+                             "which does not apply to these limits")
+                response = None
+                scale_factor = 1.0
+    
+    if response is not None:
+        logging.info(f"[PROCESS] Cache hit, skipping conversion and slicing")
+        cache_status = "hit"
+        conversion_time = 0.0
+        slicer_time = 0.0
+        try:
+            os.remove(file_path)
+            logging.info(f"[PROCESS] Input file removed: {file_path}")
+        except Exception as e:
+            logging.warning(f"[PROCESS] Failed to clean up input file {file_path}: {e}")
+    else:
+        # Fast mode never consults the cache, its analysis is cheaper than a lookup's bookkeeping
+        cache_status = "miss" if mode == 'full' else "bypass"
+        
+        # Formats SuperSlicer reads itself go straight to the slicer; conversion is only the fallback
+        native_response = None
+        if mode == 'full' and get_file_extension(file_path) in native_slicer_formats:
+            preflight_start_time = time.time()
+            decline_reason = native_preflight(file_path, max_dimensions)
+            preflight_time = time.time() - preflight_start_time
+            if decline_reason:
+                logging.info(f"[PROCESS] Not slicing natively ({decline_reason}), converting instead")
+                metrics['native_slicing'] = {
+                    "format": get_file_extension(file_path).lstrip('.'),
+                    "accepted": False,
+                    "reason": decline_reason,
+                    "preflight_time": preflight_time
+                }
+            else:
+                native_response, native_time = slice_natively(file_path, metrics)
+                metrics['native_slicing']['preflight_time'] = preflight_time
+            if native_response is not None:
+                if cache_key:
+                    slicer_cache.put(cache_key, native_response)
+                try:
+                    os.remove(file_path)
+                    logging.info(f"[PROCESS] Input file removed: {file_path}")
+                except Exception as e:
+                    logging.warning(f"[PROCESS] Failed to clean up input file {file_path}: {e}")
+                return {
+                    "response": native_response,
+                    "conversion_failed": False,
+                    "cache_status": cache_status,
+                    "conversion_time": 0.0,
+                    "slicer_time": native_time,
+                    "analysis_time": None,
+                    "preflight_time": preflight_time,
+                    "scale_factor": 1.0,
+                    "metrics": metrics
+                }
+        
+        # Convert to STL if not already STL
+        logging.info(f"[PROCESS] Step 1: Converting file to STL format...")
+        conversion_start_time = time.time()
+        stl_path = convert_file_to_stl(file_path, file_id, metrics, conversion_options, job_id)
+        conversion_time = time.time() - conversion_start_time
+        
+        if not stl_path:
+            logging.error(f"[PROCESS] Conversion failed after {conversion_time:.2f}s")
+            return {
+                "response": {"status": 400, "error": "Failed to convert file to STL format"},
+                "conversion_failed": True,
+                "cache_status": cache_status,
+                "conversion_time": conversion_time
+            }
+        
+        logging.info(f"[PROCESS] Conversion completed in {conversion_time:.2f}s. STL path: {stl_path}")
+        
+        # Get absolute path
+        absolute_path = os.path.abspath(stl_path)
+        logging.info(f"[PROCESS] Absolute STL path: {absolute_path}")
+        
+        # Verify STL file was created properly
+        if os.path.exists(absolute_path):
+            stl_size = os.path.getsize(absolute_path)
+            logging.info(f"[PROCESS] STL file verified, size: {stl_size} bytes")
+        else:
+            logging.error(f"[PROCESS] STL file was not created: {absolute_path}")
+        
+        # Read the bounding box first: fix inch/meter exports and reject oversized models before slicing
+        logging.info(f"[PROCESS] Step 2: Running pre-flight dimension and unit check...")
+        preflight_start_time = time.time()
+        preflight = ps.preflight_check(absolute_path, max_dimensions, unit_detection_max_extent)
+        preflight_time = time.time() - preflight_start_time
+        if preflight['status'] == 200:
+            scale_factor = preflight['scale_factor']
+        else:
+            logging.warning("[PROCESS] Pre-flight check failed, leaving checks to the slicer: "
+                            f"{preflight.get('error')}")
+        
+        if preflight['status'] == 200 and not preflight['fits']:
+            logging.warning(f"[PROCESS] Model exceeds max dimensions, skipping analysis")
+            response = preflight
+            slicer_time = 0.0
+        elif mode in ('fast', 'estimate'):
+            # Analytic volume/bounding box straight from the mesh, no slicer run
+            logging.info(f"[PROCESS] Step 3: Analyzing mesh geometry ({mode} mode)...")
+            analysis_start_time = time.time()
+            response = ps.analyze_stl(absolute_path)
+            if mode == 'estimate' and response['status'] == 200:
+                estimate = mass_model.estimate(response)
+                logging.info(f"[PROCESS] Estimated extrusion: {estimate['extruded_volume']:.2f}mm³ "
+                             f"(shell {estimate['shell_volume']:.2f}mm³, infill {estimate['infill_volume']:.2f}mm³), "
+                             f"mass {estimate['mass']:.2f}g")
+                response['solid_mass'] = response['mass']
+                response['mass'] = estimate['mass']
+                response['extruded_volume'] = estimate['extruded_volume']
+            analysis_time = time.time() - analysis_start_time
+            slicer_time = 0.0
+            logging.info(f"[PROCESS] Mesh analysis completed in {analysis_time:.3f}s")
+        else:
+            # Re-exports of the same model (other header, facet order or encoding) hit on geometry;
+            # fingerprinting runs in the conversion pool so its temporaries stay out of this process
+            geometry_key = None
+            if slicer_cache is not None:
+                try:
+                    fingerprint = converter_pool.run(meshtools.file_geometry_fingerprint, absolute_path)
+                    geometry_key = slicer_cache.make_key(f"geometry:{fingerprint}")
+                    response = slicer_cache.get(geometry_key)
+                except Exception as e:
+                    logging.warning(f"[PROCESS] Could not fingerprint geometry of {absolute_path}: {e}")
+        
+            if response is not None:
+                logging.info(f"[PROCESS] Geometry cache hit, skipping slicer")
+                cache_status = "geometry_hit"
+                slicer_time = 0.0
+                response = dict(response, unit_scale_factor=scale_factor)
+                slicer_cache.put(cache_key, response)
+            else:
+                # Run slicer to get mass and dimensions
+                logging.info(f"[PROCESS] Step 3: Running slicer analysis...")
+                slicer_start_time = time.time()
+                slice_path = absolute_path
+                if decimation_target_faces and preflight.get('triangle_count', 0) > decimation_target_faces:
+                    slice_path = (decimate_for_slicing(absolute_path, preflight['triangle_count'], metrics)
+                                  or absolute_path)
+                response = ps.run_slicer_command_and_extract_info(slice_path, os.path.basename(file_path))
+                slicer_time = time.time() - slicer_start_time
+                if slice_path != absolute_path:
+                    os.remove(slice_path)
+            
+                logging.info(f"[PROCESS] Slicer analysis completed in {slicer_time:.2f}s")
+                logging.info(f"[PROCESS] Slicer response status: {response.get('status', 'unknown')}")
+            
+                if 'mass' in response:
+                    logging.info(f"[PROCESS] Extracted mass: {response['mass']:.2f}g")
+                if 'size_x' in response and 'size_y' in response and 'size_z' in response:
+                    logging.info("[PROCESS] Extracted dimensions: "
+                                 f"{response['size_x']:.2f}x{response['size_y']:.2f}x{response['size_z']:.2f}mm")
+            
+                # Only successful slices are cached; failures may be transient
+                if cache_key and response['status'] == 200:
+                    response['unit_scale_factor'] = scale_factor
+                    slicer_cache.put(cache_key, response)
+                    if geometry_key:
+                        slicer_cache.put(geometry_key, response)
+        
+        # Clean up temporary file
+        logging.info(f"[PROCESS] Step 4: Cleaning up temporary files...")
+        try:
+            os.remove(absolute_path)
+            logging.info(f"[PROCESS] Temporary STL file removed: {absolute_path}")
+        except Exception as e:
+            logging.warning(f"[PROCESS] Failed to clean up temp file {absolute_path}: {e}")
+    
+    return {
+        "response": response,
+        "conversion_failed": False,
+        "cache_status": cache_status,
+        "conversion_time": conversion_time,
+        "slicer_time": slicer_time,
+        "analysis_time": analysis_time,
+        "preflight_time": preflight_time,
+        "scale_factor": scale_factor,
+        "metrics": metrics
+    }
+
+def process_3d_file(file_path, callback_url, file_id=None, max_dimensions=None, mode='full', job_id=None,
+                    content_hash=None, conversion_options=None):
+    """Process 3D file (convert if needed) and send results to callback URL
+    
+    mode='full' runs SuperSlicer; mode='fast' computes volume and dimensions
+    analytically from the mesh and skips the slicer; mode='estimate' does the
+    same and predicts the extruded filament mass from config.ini settings.
+    When ``job_id`` is given the job's state and result are recorded in the job store.
+    ``content_hash`` is the file's SHA-256 when it is already known, e.g. from the download.
+    ``conversion_options`` holds requested converter settings such as ``tessellation`` overrides.
+    """
     logging.info(f"[PROCESS] ===== STARTING 3D FILE PROCESSING =====")
     logging.info(f"[PROCESS] File path: {file_path}")
     logging.info(f"[PROCESS] Callback URL: {callback_url}")
     logging.info(f"[PROCESS] File ID: {file_id}")
     logging.info(f"[PROCESS] Max dimensions: {max_dimensions}")
+    logging.info(f"[PROCESS] Mode: {mode}")
     
     start_time = time.time()
     
@@ -440,77 +913,93 @@ def process_3d_file(file_path, callback_url, file_id=None, max_dimensions=None):
         logging.error(f"[PROCESS] Input file does not exist: {file_path}")
     
     try:
+        if job_id:
+            jobs.mark_processing(job_id)
         logging.info(f"[PROCESS] Starting 3D file processing for file: {file_path}")
         
-        # Convert to STL if not already STL
-        logging.info(f"[PROCESS] Step 1: Converting file to STL format...")
-        conversion_start_time = time.time()
-        stl_path = convert_file_to_stl(file_path, file_id)
-        conversion_time = time.time() - conversion_start_time
+        # Compressed files are unpacked first so the cache and single-flight key on the model itself
+        decompression = None
+        if compression.compression_of(file_path):
+            logging.info(f"[PROCESS] Unpacking compressed file before analysis...")
+            decompression = unpack_file(file_path, job_id)
+            file_path = decompression['path']
+            content_hash = decompression['sha256']
         
-        if not stl_path:
-            logging.error(f"[PROCESS] Conversion failed after {conversion_time:.2f}s")
+        # Identical jobs running at the same time (same content, slicer config, mode and limits) share one analysis
+        if content_hash is None:
+            content_hash = result_cache.hash_file(file_path)
+        conversion_options = resolve_conversion_options(file_path, conversion_options)
+        flight_key = (f"{config_namespace}:{content_hash}{conversion_options_key(conversion_options)}:{mode}:"
+                      f"{sorted(max_dimensions.items())}")
+        outcome, shared = in_flight.run(flight_key, analyze_file, file_path, file_id, max_dimensions, mode,
+                                        content_hash, conversion_options, job_id)
+        if shared:
+            logging.info(f"[PROCESS] Joined an identical in-flight job, reusing its result")
+            try:
+                os.remove(file_path)
+                logging.info(f"[PROCESS] Input file removed: {file_path}")
+            except Exception as e:
+                logging.warning(f"[PROCESS] Failed to clean up input file {file_path}: {e}")
+        
+        response = outcome['response']
+        cache_status = outcome['cache_status']
+        conversion_time = outcome['conversion_time']
+        
+        if outcome['conversion_failed']:
             error_data = {
                 "file_id": file_id,
+                "job_id": job_id,
                 "status": "error",
-                "error": "Failed to convert file to STL format",
+                "error": response['error'],
                 "processing_time": time.time() - start_time,
                 "conversion_time": conversion_time,
+                "cache": cache_status,
                 "timestamp": time.time()
             }
+            if job_id:
+                jobs.finish(job_id, error_data)
             logging.info(f"[PROCESS] Sending error callback for conversion failure...")
-            send_callback(callback_url, error_data)
+            send_callback(callback_url, error_data, job_id)
             return error_data
         
-        logging.info(f"[PROCESS] Conversion completed in {conversion_time:.2f}s. STL path: {stl_path}")
-        
-        # Get absolute path
-        absolute_path = os.path.abspath(stl_path)
-        logging.info(f"[PROCESS] Absolute STL path: {absolute_path}")
-        
-        # Verify STL file was created properly
-        if os.path.exists(absolute_path):
-            stl_size = os.path.getsize(absolute_path)
-            logging.info(f"[PROCESS] STL file verified, size: {stl_size} bytes")
-        else:
-            logging.error(f"[PROCESS] STL file was not created: {absolute_path}")
-        
-        # Run slicer to get mass and dimensions
-        logging.info(f"[PROCESS] Step 2: Running slicer analysis...")
-        slicer_start_time = time.time()
-        response = ps.run_slicer_command_and_extract_info(absolute_path, os.path.basename(file_path))
-        slicer_end_time = time.time()
-        
-        processing_time = slicer_end_time - start_time
-        slicer_time = slicer_end_time - slicer_start_time
-        
-        logging.info(f"[PROCESS] Slicer analysis completed in {slicer_time:.2f}s")
-        logging.info(f"[PROCESS] Slicer response status: {response.get('status', 'unknown')}")
-        
-        if 'mass' in response:
-            logging.info(f"[PROCESS] Extracted mass: {response['mass']:.2f}g")
-        if 'size_x' in response and 'size_y' in response and 'size_z' in response:
-            logging.info(f"[PROCESS] Extracted dimensions: {response['size_x']:.2f}x{response['size_y']:.2f}x{response['size_z']:.2f}mm")
+        slicer_time = outcome['slicer_time']
+        analysis_time = outcome['analysis_time']
+        preflight_time = outcome['preflight_time']
+        scale_factor = outcome['scale_factor']
+        metrics = outcome['metrics']
+        if decompression:
+            # Copied because a shared outcome's metrics belong to every job that joined it
+            metrics = dict(metrics or {}, decompression={
+                "format": decompression['format'],
+                "compressed_bytes": decompression['compressed_bytes'],
+                "decompressed_bytes": decompression['decompressed_bytes'],
+                "decompress_time": decompression['decompress_time']
+            })
         
-        # Clean up temporary file
-        logging.info(f"[PROCESS] Step 3: Cleaning up temporary files...")
-        try:
-            os.remove(absolute_path)
-            logging.info(f"[PROCESS] Temporary STL file removed: {absolute_path}")
-        except Exception as e:
-            logging.warning(f"[PROCESS] Failed to clean up temp file {absolute_path}: {e}")
+        processing_time = time.time() - start_time
         
         # Prepare result data
         result_data = {
             "file_id": file_id,
+            "job_id": job_id,
             "processing_time": processing_time,
             "conversion_time": conversion_time,
             "slicer_time": slicer_time,
+            "cache": cache_status,
+            "mode": mode,
             "timestamp": time.time()
         }
+        if analysis_time is not None:
+            result_data["analysis_time"] = analysis_time
+        if preflight_time is not None:
+            result_data["preflight_time"] = preflight_time
+        if scale_factor != 1.0:
+            result_data["unit_scale_factor"] = scale_factor
+        if metrics:
+            result_data["metrics"] = metrics
         
         if response['status'] == 200:
-            logging.info(f"[PROCESS] Step 4: Validating dimensions against limits...")
+            logging.info(f"[PROCESS] Step 5: Validating dimensions against limits...")
             logging.info(f"[PROCESS] Model dimensions: {response['size_x']:.2f}x{response['size_y']:.2f}x{response['size_z']:.2f}mm")
             logging.info(f"[PROCESS] Max allowed: {max_dimensions['x']}x{max_dimensions['y']}x{max_dimensions['z']}mm")
             
@@ -545,6 +1034,18 @@ def process_3d_file(file_path, callback_url, file_id=None, max_dimensions=None):
                         "z": response['size_z']
                     }
                 })
+                if mode in ('fast', 'estimate'):
+                    result_data.update({
+                        "volume_mm3": response['volume'],
+                        "surface_area_mm2": response['surface_area'],
+                        "triangle_count": response['triangle_count']
+                    })
+                if mode == 'estimate':
+                    result_data.update({
+                        "extruded_volume_mm3": response['extruded_volume'],
+                        "solid_mass_grams": response['solid_mass'],
+                        "estimator_calibrated": mass_model.calibrated
+                    })
         else:
             logging.error(f"[PROCESS] Slicer analysis failed with status {response['status']}")
             result_data.update({
@@ -552,14 +1053,17 @@ def process_3d_file(file_path, callback_url, file_id=None, max_dimensions=None):
                 "error": response.get('error', 'Unknown slicing error')
             })
         
+        if job_id:
+            jobs.finish(job_id, result_data)
+        
         # Send callback
-        logging.info(f"[PROCESS] Step 5: Sending results via callback...")
-        callback_success = send_callback(callback_url, result_data)
+        logging.info(f"[PROCESS] Step 6: Sending results via callback...")
+        callback_id = send_callback(callback_url, result_data, job_id)
         
         logging.info(f"[PROCESS] ===== PROCESSING COMPLETED =====")
         logging.info(f"[PROCESS] Final status: {result_data['status']}")
         logging.info(f"[PROCESS] Total processing time: {processing_time:.2f}s")
-        logging.info(f"[PROCESS] Callback sent: {callback_success}")
+        logging.info(f"[PROCESS] Callback queued: {callback_id is not None}")
         
         return result_data
         
@@ -572,16 +1076,266 @@ def process_3d_file(file_path, callback_url, file_id=None, max_dimensions=None):
         
         error_data = {
             "file_id": file_id,
+            "job_id": job_id,
             "status": "error", 
             "error": f"Processing error: {str(e)}",
             "processing_time": processing_time,
             "timestamp": time.time()
         }
         
+        try:
+            if job_id:
+                jobs.finish(job_id, error_data)
+        except Exception as store_error:
+            logging.error(f"[PROCESS] Could not record failure for job {job_id}: {str(store_error)}")
+        
         logging.info(f"[PROCESS] Sending error callback...")
-        send_callback(callback_url, error_data)
+        send_callback(callback_url, error_data, job_id)
         return error_data
 
+# Processing attempts after which an interrupted job is failed instead of resumed
+JOB_MAX_ATTEMPTS = 3
+
+def run_job(file_path, callback_url, file_id, max_dimensions, mode, job_id, content_hash=None, conversion_options=None):
+    """Executor entry point for a queued job"""
+    with app.app_context():
+        logging.info(f"[API] Worker started for job {job_id}")
+        result_data = process_3d_file(file_path, callback_url, file_id, max_dimensions, mode, job_id, content_hash,
+                                      conversion_options)
+        logging.info(f"[API] Background processing completed, running garbage collection")
+        gc.collect()
+        return result_data
+
+def resume_jobs():
+    """Requeue jobs that were accepted by a process that has since exited"""
+    for job in jobs.claim_orphaned():
+        error = None
+        if not job['file_path'] or not os.path.exists(job['file_path']):
+            error = "Input file was lost when the service restarted, please resubmit"
+        elif job['attempts'] >= JOB_MAX_ATTEMPTS:
+            # A job that keeps taking the process down must not be retried forever
+            error = f"Job was interrupted {job['attempts']} times and will not be retried"
+        
+        if error:
+            logging.error(f"[RESUME] Not resuming job {job['job_id']}: {error}")
+            error_data = {
+                "file_id": job['file_id'],
+                "job_id": job['job_id'],
+                "status": "error",
+                "error": error,
+                "timestamp": time.time()
+            }
+            jobs.finish(job['job_id'], error_data)
+            send_callback(job['callback_url'], error_data, job['job_id'])
+            continue
+        
+        logging.info(f"[RESUME] Resuming job {job['job_id']} ({job['file_path']})")
+        # Block for a slot: resumed jobs were already accepted and must not be rejected
+        job_executor.submit(run_job, job['file_path'], job['callback_url'], job['file_id'],
+                            job['max_dimensions'], job['mode'], job['job_id'], None, job['options'], block=True)
+
+
+def summarize_batch(batch_id, results, processing_time):
+    """Build the aggregated callback payload for a finished batch"""
+    succeeded = [result for result in results if result.get('status') == 'success']
+    failed = len(results) - len(succeeded)
+    if not failed:
+        status = "success"
+    elif succeeded:
+        status = "partial"
+    else:
+        status = "error"
+    
+    return {
+        "batch_id": batch_id,
+        "status": status,
+        "file_count": len(results),
+        "unique_files": len([result for result in results if 'duplicate_of' not in result]),
+        "succeeded": len(succeeded),
+        "failed": failed,
+        "totals": {
+            "mass_grams": sum(result['mass_grams'] for result in succeeded),
+            "slicer_time": sum(result.get('slicer_time', 0) for result in results if 'duplicate_of' not in result),
+        },
+        "results": results,
+        "processing_time": processing_time,
+        "timestamp": time.time()
+    }
+
+def send_batch_callback(batch_id, callback_url, members, results, processing_time):
+    """Fill in duplicate members' results, send the aggregated callback and mark the batch completed"""
+    def resolve(index):
+        original = members[index]['duplicate_of']
+        if results[original] is None:
+            resolve(original)
+        results[index] = dict(results[original], file_id=members[index]['file_id'],
+                              job_id=None, duplicate_of=members[original]['file_id'])
+    
+    for index, member in enumerate(members):
+        if results[index] is None and 'duplicate_of' in member:
+            resolve(index)
+    
+    summary = summarize_batch(batch_id, results, processing_time)
+    logging.info(f"[BATCH] Batch {batch_id} finished in {summary['processing_time']:.2f}s: "
+                 f"{summary['succeeded']} succeeded, {summary['failed']} failed, "
+                 f"{summary['unique_files']} unique files")
+    
+    callback_id = send_callback(callback_url, summary)
+    jobs.finish_batch(batch_id)
+    logging.info(f"[BATCH] ===== BATCH {batch_id} COMPLETED (callback queued: {callback_id is not None}) =====")
+    return summary
+
+def dimension_key(max_dimensions):
+    """Dimension limits in a form where equal limits compare equal, e.g. 300 and 300.0"""
+    key = []
+    for axis, value in sorted(max_dimensions.items()):
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            pass
+        key.append((axis, value))
+    return tuple(key)
+
+def process_batch(batch_id, entries, callback_url, max_dimensions, mode, conversion_options=None):
+    """Download, deduplicate and queue every file of a batch, then send one aggregated callback
+    
+    Each entry has a ``file_id`` and either a ``file_path`` (uploaded) or a
+    ``file_url`` with an ``original_filename``. URLs are downloaded in
+    parallel and files are queued in entry order as their downloads finish.
+    Entries with the same URL or identical file contents and the same
+    dimension limits are processed once, as the earliest of them, and its
+    result is reported for every entry that shares it. The batch must already
+    be recorded with ``jobs.create_batch``; its members are kept up to date in
+    the job store so the callback is still sent after a restart.
+    """
+    logging.info(f"[BATCH] ===== STARTING BATCH {batch_id} ({len(entries)} files) =====")
+    start_time = time.time()
+    results = [None] * len(entries)
+    members = [{"file_id": entry['file_id']} for entry in entries]
+    limits = [entry.get('max_dimensions') or max_dimensions for entry in entries]
+    futures = {}
+    first_by_url = {}
+    first_by_hash = {}
+    
+    def queue(index, file_path, content_hash):
+        file_id = entries[index]['file_id']
+        # The fit check depends on the limits, so only files with equal limits share a result
+        key = (content_hash, dimension_key(limits[index]))
+        if key in first_by_hash:
+            members[index]['duplicate_of'] = first_by_hash[key]
+            logging.info(f"[BATCH] {file_id}: identical to entry {first_by_hash[key]}, skipping")
+            try:
+                os.remove(file_path)
+            except OSError as e:
+                logging.warning(f"[BATCH] Could not remove duplicate file {file_path}: {e}")
+            return
+        first_by_hash[key] = index
+        
+        job_id = jobs.create(file_path, None, file_id, limits[index], mode, conversion_options)
+        members[index]['job_id'] = job_id
+        # Block for a slot rather than reject: the batch as a whole was already accepted
+        futures[index] = job_executor.submit(run_job, file_path, None, file_id, limits[index], mode, job_id,
+                                             content_hash, conversion_options, block=True)
+        logging.info(f"[BATCH] {file_id}: queued as job {job_id}")
+    
+    # Every download starts right away; they run in parallel on the download executor
+    downloads = {}
+    for index, entry in enumerate(entries):
+        if not entry.get('file_url'):
+            continue
+        key = (entry['file_url'], dimension_key(limits[index]))
+        if key in first_by_url:
+            members[index]['duplicate_of'] = first_by_url[key]
+            logging.info(f"[BATCH] {entry['file_id']}: same URL as entry {first_by_url[key]}, skipping download")
+            continue
+        first_by_url[key] = index
+        filename = secure_filename(f"{batch_id}_{index}_{entry['original_filename']}")
+        download_info = {}
+        download = batch_download_executor.submit(download_file_from_url, entry['file_url'], tmp_directory,
+                                                  filename, download_info)
+        downloads[index] = (download, download_info)
+    jobs.set_batch_members(batch_id, members)
+    
+    # Entries are queued in order, so the earliest of several identical files is the one processed
+    for index, entry in enumerate(entries):
+        if 'duplicate_of' in members[index]:
+            continue
+        if index not in downloads:
+            queue(index, entry['file_path'], result_cache.hash_file(entry['file_path']))
+            jobs.set_batch_members(batch_id, members)
+            continue
+        
+        download, download_info = downloads[index]
+        try:
+            file_path = download.result()
+        except Exception as e:
+            file_path = None
+            download_info['error'] = str(e)
+        if file_path:
+            queue(index, file_path, download_info['sha256'])
+        else:
+            results[index] = {
+                "file_id": entry['file_id'],
+                "status": "error",
+                "error": f"Failed to download 3D file from URL: {download_info.get('error', 'unknown error')}",
+                "timestamp": time.time()
+            }
+            members[index]['result'] = results[index]
+        jobs.set_batch_members(batch_id, members)
+    
+    for index, future in futures.items():
+        try:
+            results[index] = future.result()
+        except Exception as e:
+            logging.error(f"[BATCH] Job for {entries[index]['file_id']} raised: {str(e)}")
+            results[index] = {
+                "file_id": entries[index]['file_id'],
+                "status": "error",
+                "error": f"Processing error: {str(e)}",
+                "timestamp": time.time()
+            }
+    
+    return send_batch_callback(batch_id, callback_url, members, results, time.time() - start_time)
+
+def resume_batch(batch):
+    """Send the aggregated callback of a batch accepted by an exited process once its member jobs are finished"""
+    batch_id = batch['batch_id']
+    members = batch['members']
+    results = [None] * len(members)
+    logging.info(f"[RESUME] Waiting for the member jobs of batch {batch_id}")
+    
+    for index, member in enumerate(members):
+        if 'result' in member:
+            results[index] = member['result']
+        elif 'job_id' in member:
+            # Member jobs are resumed by resume_jobs; the job store is where their results land
+            while True:
+                job = jobs.get(member['job_id'])
+                if job is None or job['state'] in ('completed', 'failed'):
+                    break
+                time.sleep(BATCH_RESUME_POLL_INTERVAL)
+            results[index] = (job or {}).get('result') or {
+                "file_id": member['file_id'],
+                "job_id": member['job_id'],
+                "status": "error",
+                "error": "Job result was lost when the service restarted, please resubmit",
+                "timestamp": time.time()
+            }
+        elif 'duplicate_of' not in member:
+            # The file was still downloading or waiting to be queued when the process exited
+            results[index] = {
+                "file_id": member['file_id'],
+                "status": "error",
+                "error": "File was not queued before the service restarted, please resubmit",
+                "timestamp": time.time()
+            }
+    
+    send_batch_callback(batch_id, batch['callback_url'], members, results, time.time() - batch['created_at'])
+
+def resume_batches():
+    """Finish batches that were accepted by a process that has since exited"""
+    for batch in jobs.claim_orphaned_batches():
+        threading.Thread(target=resume_batch, args=(batch,), name=f"batch-{batch['batch_id']}", daemon=True).start()
 
 @app.route('/api/slice', methods=['POST'])
 def slice_3d_file():
@@ -589,7 +1343,7 @@ def slice_3d_file():
     Process 3D file (STL, OBJ, 3MF, STEP, etc.) and return results via callback
     
     Supported formats: STL, OBJ, PLY, OFF, 3MF, GLTF, GLB, DAE, X3D, WRL, VRML, 
-                      STEP, STP, IGES, IGS, COLLADA, BLEND
+                      STEP, STP, IGES, IGS, COLLADA, BLEND, AMF
     
     Request body can be:
     1. JSON with file URL:
@@ -598,7 +1352,11 @@ def slice_3d_file():
         "callback_url": "https://your-api.com/callback",
         "file_id": "optional_file_identifier",
         "file_name": "model.stl",  // optional: use when URL lacks filename/extension
-        "max_dimensions": {"x": 300, "y": 300, "z": 300}  // optional
+        "max_dimensions": {"x": 300, "y": 300, "z": 300},  // optional
+        "mode": "full",  // optional: "full" (slice), "fast" (mesh analysis only) or "estimate" (predicted print mass)
+        "wait": 10,  // optional: seconds to hold the request for the result, callback_url is then optional
+        "tessellation_linear": 0.05,  // optional: STEP chord tolerance in mm
+        "tessellation_angular": 0.5  // optional: STEP angular tolerance in radians
     }
     
     2. Form-data with file upload:
@@ -606,6 +1364,12 @@ def slice_3d_file():
     - callback_url: callback URL
     - file_id: optional file identifier 
     - max_x, max_y, max_z: optional dimension limits
+    - mode: optional processing mode ("full", "fast" or "estimate")
+    - wait: optional seconds to hold the request for the result
+    - tessellation_linear, tessellation_angular: optional STEP tolerances
+    
+    With ``wait`` the response is 200 with the callback payload when the job
+    finishes in time, otherwise the usual 202.
     """
     request_start_time = time.time()
     logging.info(f"[API] ##### NEW API REQUEST TO /api/slice #####")
@@ -615,6 +1379,13 @@ def slice_3d_file():
     logging.info(f"[API] Request remote_addr: {request.remote_addr}")
     logging.info(f"[API] Request user_agent: {request.headers.get('User-Agent', 'Unknown')}")
     
+    # Reject early when the queue is saturated so we don't download or store files we can't process
+    try:
+        job_executor.ensure_capacity()
+    except workers.QueueFullError as e:
+        logging.warning(f"[API] Job queue is full, rejecting request (retry after {e.retry_after}s)")
+        return queue_full_response(e.retry_after)
+    
     try:
         # Check if it's JSON request (URL) or form-data (file upload)
         if request.is_json:
@@ -627,6 +1398,8 @@ def slice_3d_file():
             file_id = data.get('file_id')
             provided_file_name = data.get('file_name')  # Optional filename when URL lacks it
             max_dimensions = data.get('max_dimensions', {'x': 300, 'y': 300, 'z': 300})
+            mode = data.get('mode', 'full')
+            raw_wait = data.get('wait', request.args.get('wait'))
             
             logging.info(f"[API] File URL: {file_url}")
             logging.info(f"[API] Callback URL: {callback_url}")
@@ -634,9 +1407,27 @@ def slice_3d_file():
             logging.info(f"[API] Provided filename: {provided_file_name}")
             logging.info(f"[API] Max dimensions: {max_dimensions}")
             
-            if not file_url or not callback_url:
+            try:
+                wait = parse_wait(raw_wait)
+            except (TypeError, ValueError):
+                logging.error(f"[API] Invalid wait: {raw_wait}")
+                return jsonify({"error": "wait must be a non-negative number of seconds"}), 400
+            
+            if not file_url or not (callback_url or wait):
                 logging.error(f"[API] Missing required parameters - file_url: {bool(file_url)}, callback_url: {bool(callback_url)}")
-                return jsonify({"error": "file_url and callback_url are required"}), 400
+                return jsonify({
+                    "error": "file_url and callback_url are required (callback_url is optional with wait)"
+                }), 400
+            
+            if mode not in PROCESSING_MODES:
+                logging.error(f"[API] Invalid mode: {mode}")
+                return jsonify({"error": f"Invalid mode '{mode}'. Supported modes: {', '.join(PROCESSING_MODES)}"}), 400
+            
+            try:
+                tessellation = parse_tessellation(data)
+            except (TypeError, ValueError) as e:
+                logging.error(f"[API] Invalid tessellation tolerance: {str(e)}")
+                return jsonify({"error": f"Invalid tessellation tolerance: {str(e)}"}), 400
             
             # Determine filename for validation and storage
             logging.info(f"[API] Determining filename for validation...")
@@ -659,7 +1450,8 @@ def slice_3d_file():
             if not is_supported_format(original_filename):
                 logging.error(f"[API] Unsupported file format: {get_file_extension(original_filename)}")
                 return jsonify({
-                    "error": f"Unsupported file format. Supported formats: STL, OBJ, PLY, OFF, 3MF, GLTF, GLB, DAE, X3D, WRL, VRML, STEP, STP, IGES, IGS, COLLADA, BLEND"
+                    "error": "Unsupported file format. Supported formats: STL, OBJ, PLY, OFF, 3MF, GLTF, GLB, DAE, "
+                             "X3D, WRL, VRML, STEP, STP, IGES, IGS, COLLADA, BLEND, AMF"
                 }), 400
             
             # Download file from URL
@@ -667,7 +1459,8 @@ def slice_3d_file():
             logging.info(f"[API] Generated filename for download: {filename}")
             
             download_start_time = time.time()
-            file_path = download_file_from_url(file_url, tmp_directory, filename)
+            download_info = {}
+            file_path = download_file_from_url(file_url, tmp_directory, filename, download_info)
             download_time = time.time() - download_start_time
             
             if not file_path:
@@ -675,17 +1468,22 @@ def slice_3d_file():
                 error_data = {
                     "file_id": file_id,
                     "status": "error",
-                    "error": "Failed to download 3D file from URL",
+                    "error": f"Failed to download 3D file from URL: {download_info.get('error', 'unknown error')}",
                     "download_time": download_time,
                     "timestamp": time.time()
                 }
                 send_callback(callback_url, error_data)
+                if download_info.get('too_large'):
+                    return jsonify({"error": download_info['error']}), 413
                 return jsonify({"error": "Failed to download 3D file"}), 400
-                
+            
+            # Hashed while streaming, so the job can look up the result cache without reading the file again
+            content_hash = download_info['sha256']
             logging.info(f"[API] File downloaded successfully in {download_time:.2f}s: {file_path}")
                 
         else:
             logging.info(f"[API] Processing form-data request (file upload)...")
+            content_hash = None
             logging.info(f"[API] Form keys: {list(request.form.keys())}")
             logging.info(f"[API] File keys: {list(request.files.keys())}")
             
@@ -705,14 +1503,32 @@ def slice_3d_file():
             
             callback_url = request.form.get('callback_url')
             file_id = request.form.get('file_id')
+            mode = request.form.get('mode', 'full')
+            raw_wait = request.form.get('wait', request.args.get('wait'))
             
             logging.info(f"[API] Callback URL: {callback_url}")
             logging.info(f"[API] File ID: {file_id}")
             logging.info(f"[API] Uploaded filename: {file.filename}")
             
-            if not callback_url:
+            try:
+                wait = parse_wait(raw_wait)
+            except (TypeError, ValueError):
+                logging.error(f"[API] Invalid wait: {raw_wait}")
+                return jsonify({"error": "wait must be a non-negative number of seconds"}), 400
+            
+            if not callback_url and not wait:
                 logging.error(f"[API] Missing callback_url in form data")
-                return jsonify({"error": "callback_url is required"}), 400
+                return jsonify({"error": "callback_url is required (optional with wait)"}), 400
+            
+            if mode not in PROCESSING_MODES:
+                logging.error(f"[API] Invalid mode: {mode}")
+                return jsonify({"error": f"Invalid mode '{mode}'. Supported modes: {', '.join(PROCESSING_MODES)}"}), 400
+            
+            try:
+                tessellation = parse_tessellation(request.form)
+            except (TypeError, ValueError) as e:
+                logging.error(f"[API] Invalid tessellation tolerance: {str(e)}")
+                return jsonify({"error": f"Invalid tessellation tolerance: {str(e)}"}), 400
             
             if file.filename == '':
                 logging.error(f"[API] Empty filename provided")
@@ -723,7 +1539,8 @@ def slice_3d_file():
             if not is_supported_format(file.filename):
                 logging.error(f"[API] Unsupported format: {get_file_extension(file.filename)}")
                 return jsonify({
-                    "error": f"Unsupported file format. Supported formats: STL, OBJ, PLY, OFF, 3MF, GLTF, GLB, DAE, X3D, WRL, VRML, STEP, STP, IGES, IGS, COLLADA, BLEND"
+                    "error": "Unsupported file format. Supported formats: STL, OBJ, PLY, OFF, 3MF, GLTF, GLB, DAE, "
+                             "X3D, WRL, VRML, STEP, STP, IGES, IGS, COLLADA, BLEND, AMF"
                 }), 400
             
             # Save uploaded file
@@ -750,25 +1567,43 @@ def slice_3d_file():
             }
             logging.info(f"[API] Max dimensions from form: {max_dimensions}")
         
-        # Start processing in background thread
+        # Queue processing on the slicer executor
         request_time = time.time() - request_start_time
-        logging.info(f"[API] Request processing completed in {request_time:.2f}s, starting background thread...")
+        logging.info(f"[API] Request processing completed in {request_time:.2f}s, queueing job...")
+        
+        conversion_options = {"tessellation": tessellation} if tessellation else None
+        job_id = jobs.create(file_path, callback_url, file_id, max_dimensions, mode, conversion_options)
         
-        def process_async():
-            with app.app_context():
-                logging.info(f"[API] Background thread started for file processing")
-                process_3d_file(file_path, callback_url, file_id, max_dimensions)
-                logging.info(f"[API] Background processing completed, running garbage collection")
-                gc.collect()
+        try:
+            future = job_executor.submit(run_job, file_path, callback_url, file_id, max_dimensions, mode, job_id,
+                                         content_hash, conversion_options)
+        except workers.QueueFullError as e:
+            logging.warning(f"[API] Job queue filled up during request, discarding {file_path}")
+            jobs.delete(job_id)
+            try:
+                os.remove(file_path)
+            except OSError as remove_error:
+                logging.warning(f"[API] Could not remove rejected file {file_path}: {remove_error}")
+            return queue_full_response(e.retry_after)
         
-        thread = threading.Thread(target=process_async)
-        thread.start()
+        if wait:
+            logging.info(f"[API] Waiting up to {wait:.1f}s for job {job_id} to finish...")
+            try:
+                result_data = future.result(timeout=wait)
+                logging.info(f"[API] Job {job_id} finished within wait, returning result directly")
+                logging.info(f"[API] ##### API REQUEST COMPLETED #####")
+                return jsonify(result_data), 200
+            except concurrent.futures.TimeoutError:
+                logging.info(f"[API] Job {job_id} still running after {wait:.1f}s, falling back to 202")
         
         response_data = {
             "message": "3D file processing started", 
             "file_id": file_id,
+            "job_id": job_id,
             "status": "processing",
-            "original_format": get_file_extension(filename).upper().replace('.', '') if filename else "unknown",
+            "mode": mode,
+            "original_format": (get_file_extension(compression.inner_filename(filename)).upper().replace('.', '')
+                                if filename else "unknown"),
             "request_processing_time": request_time
         }
         
@@ -789,6 +1624,169 @@ def slice_3d_file():
             "request_processing_time": request_time
         }), 500
 
+@app.route('/api/slice/batch', methods=['POST'])
+def slice_batch():
+    """
+    Process many 3D files and deliver one aggregated callback
+    
+    Request body can be:
+    1. JSON with file URLs:
+    {
+        "files": [
+            {"file_url": "https://example.com/part1.stl", "file_id": "part1"},
+            {"file_url": "https://example.com/download?id=2", "file_id": "part2", "file_name": "part2.obj"}
+        ],
+        "callback_url": "https://your-api.com/callback",
+        "batch_id": "optional_batch_identifier",
+        "max_dimensions": {"x": 300, "y": 300, "z": 300},  // optional, per file overrides allowed
+        "mode": "full"  // optional
+    }
+    
+    2. Form-data with several files in the model_files field plus callback_url,
+       batch_id, mode and max_x/max_y/max_z; each file's name is its file_id.
+    """
+    request_start_time = time.time()
+    logging.info(f"[API] ##### NEW API REQUEST TO /api/slice/batch #####")
+    
+    try:
+        job_executor.ensure_capacity()
+    except workers.QueueFullError as e:
+        logging.warning(f"[API] Job queue is full, rejecting batch (retry after {e.retry_after}s)")
+        return queue_full_response(e.retry_after)
+    
+    try:
+        entries = []
+        if request.is_json:
+            data = request.get_json()
+            files = data.get('files') or []
+            callback_url = data.get('callback_url')
+            batch_id = data.get('batch_id')
+            max_dimensions = data.get('max_dimensions', {'x': 300, 'y': 300, 'z': 300})
+            mode = data.get('mode', 'full')
+            tessellation_source = data
+            
+            if not isinstance(files, list) or not files:
+                return jsonify({"error": "files must be a non-empty list"}), 400
+            
+            for index, item in enumerate(files):
+                if isinstance(item, str):
+                    item = {"file_url": item}
+                file_url = item.get('file_url') if isinstance(item, dict) else None
+                if not file_url:
+                    return jsonify({"error": f"files[{index}] has no file_url"}), 400
+                original_filename = item.get('file_name') or os.path.basename(file_url.split('?')[0])
+                if not original_filename or '.' not in original_filename or not is_supported_format(original_filename):
+                    return jsonify({"error": f"files[{index}]: unsupported or missing file extension in "
+                                             f"'{original_filename}', provide a supported 'file_name'"}), 400
+                entries.append({
+                    "file_id": item.get('file_id') or original_filename,
+                    "file_url": file_url,
+                    "original_filename": original_filename,
+                    "max_dimensions": item.get('max_dimensions')
+                })
+        else:
+            uploads = request.files.getlist('model_files') or request.files.getlist('model_file')
+            callback_url = request.form.get('callback_url')
+            batch_id = request.form.get('batch_id')
+            mode = request.form.get('mode', 'full')
+            tessellation_source = request.form
+            max_dimensions = {
+                'x': float(request.form.get('max_x', 300)),
+                'y': float(request.form.get('max_y', 300)),
+                'z': float(request.form.get('max_z', 300))
+            }
+            
+            if not uploads:
+                return jsonify({"error": "No 3D model files provided. Use the 'model_files' field name."}), 400
+            for upload in uploads:
+                if not upload.filename or not is_supported_format(upload.filename):
+                    return jsonify({"error": f"Unsupported file format: '{upload.filename}'"}), 400
+        
+        if not callback_url:
+            return jsonify({"error": "callback_url is required"}), 400
+        try:
+            tessellation = parse_tessellation(tessellation_source)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": f"Invalid tessellation tolerance: {str(e)}"}), 400
+        conversion_options = {"tessellation": tessellation} if tessellation else None
+        if mode not in PROCESSING_MODES:
+            return jsonify({"error": f"Invalid mode '{mode}'. Supported modes: {', '.join(PROCESSING_MODES)}"}), 400
+        file_count = len(entries) if request.is_json else len(uploads)
+        if file_count > batch_max_files:
+            return jsonify({"error": f"Batch has {file_count} files, the maximum is {batch_max_files}"}), 400
+        
+        batch_id = batch_id or os.urandom(8).hex()
+        if request.is_json:
+            file_ids = [entry['file_id'] for entry in entries]
+        else:
+            file_ids = [upload.filename for upload in uploads]
+        if not jobs.create_batch(batch_id, callback_url, file_ids):
+            logging.warning(f"[API] Batch {batch_id} already exists, rejecting")
+            return jsonify({"error": f"Batch '{batch_id}' already exists, use another batch_id"}), 409
+        
+        if not request.is_json:
+            for index, upload in enumerate(uploads):
+                file_path = os.path.join(tmp_directory, secure_filename(f"{batch_id}_{index}_{upload.filename}"))
+                upload.save(file_path)
+                entries.append({"file_id": upload.filename, "file_path": file_path})
+            logging.info(f"[API] Saved {len(entries)} uploaded files for batch {batch_id}")
+        
+        # The batch runs on its own thread: it only feeds the executor and waits, so it must not hold a slicer slot
+        threading.Thread(
+            target=process_batch,
+            args=(batch_id, entries, callback_url, max_dimensions, mode, conversion_options),
+            name=f'batch-{batch_id}',
+            daemon=True
+        ).start()
+        
+        request_time = time.time() - request_start_time
+        response_data = {
+            "message": "Batch processing started",
+            "batch_id": batch_id,
+            "file_count": len(entries),
+            "status": "processing",
+            "mode": mode,
+            "request_processing_time": request_time
+        }
+        logging.info(f"[API] Returning 202 response: {response_data}")
+        return jsonify(response_data), 202
+    
+    except Exception as e:
+        request_time = time.time() - request_start_time
+        logging.error(f"[API] ##### BATCH REQUEST FAILED #####")
+        logging.error(f"[API] Exception after {request_time:.2f}s: {str(e)}")
+        return jsonify({
+            "error": f"Internal server error: {str(e)}",
+            "request_processing_time": request_time
+        }), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get the state and, once finished, the result payload of a job"""
+    logging.info(f"[API] Job lookup: {job_id}")
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    return jsonify(job), 200
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    """List jobs newest first, filtered by optional state and file_id query parameters"""
+    state = request.args.get('state')
+    file_id = request.args.get('file_id')
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), 500)
+        offset = max(int(request.args.get('offset', 0)), 0)
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+    
+    if state and state not in job_store.JOB_STATES:
+        return jsonify({"error": f"Invalid state '{state}'. Supported states: {', '.join(job_store.JOB_STATES)}"}), 400
+    
+    logging.info(f"[API] Job list: state={state}, file_id={file_id}, limit={limit}, offset={offset}")
+    job_list = jobs.list(state, file_id, limit, offset)
+    return jsonify({"jobs": job_list, "count": len(job_list), "limit": limit, "offset": offset}), 200
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
@@ -799,7 +1797,8 @@ def health_check():
         "status": "healthy",
         "version": version,
         "timestamp": time.time(),
-        "supported_formats": ["STL", "OBJ", "PLY", "OFF", "3MF", "GLTF", "GLB", "DAE", "X3D", "WRL", "VRML", "STEP", "STP", "IGES", "IGS", "COLLADA", "BLEND"]
+        "supported_formats": ["STL", "OBJ", "PLY", "OFF", "3MF", "GLTF", "GLB", "DAE", "X3D", "WRL", "VRML",
+                              "STEP", "STP", "IGES", "IGS", "COLLADA", "BLEND", "AMF"]
     }
     
     # Add system info for Docker debugging
@@ -810,7 +1809,16 @@ def health_check():
             "superslicer_exists": os.path.exists('./slicersuper'),
             "config_exists": os.path.exists('config.ini'),
             "python_version": os.sys.version.split()[0]
-        }
+        },
+        "workers": job_executor.stats(),
+        "conversion_pool": converter_pool.stats(),
+        "conversion_routing": conversion_router.stats(),
+        "result_cache": slicer_cache.stats() if slicer_cache is not None else None,
+        "displays": ps.display_pool.stats(),
+        "jobs": jobs.stats(),
+        "single_flight": in_flight.stats(),
+        "callbacks": callback_outbox.stats(),
+        "download_index": download_index.stats() if download_index is not None else None
     })
     
     logging.info(f"[HEALTH] Health check completed: {health_status['status']}")
@@ -822,10 +1830,12 @@ def supported_formats():
     formats = {
         "supported_formats": [
             {"extension": "STL", "description": "Stereolithography", "native": True},
-            {"extension": "OBJ", "description": "Wavefront OBJ", "native": False},
+            {"extension": "OBJ", "description": "Wavefront OBJ", "native": '.obj' in native_slicer_formats},
             {"extension": "PLY", "description": "Polygon File Format", "native": False},
             {"extension": "OFF", "description": "Object File Format", "native": False},
-            {"extension": "3MF", "description": "3D Manufacturing Format", "native": False},
+            {"extension": "3MF", "description": "3D Manufacturing Format", "native": '.3mf' in native_slicer_formats},
+            {"extension": "AMF", "description": "Additive Manufacturing File",
+             "native": '.amf' in native_slicer_formats},
             {"extension": "GLTF", "description": "GL Transmission Format", "native": False},
             {"extension": "GLB", "description": "GL Transmission Format Binary", "native": False},
             {"extension": "DAE", "description": "COLLADA Digital Asset Exchange", "native": False},
@@ -839,15 +1849,29 @@ def supported_formats():
             {"extension": "COLLADA", "description": "COLLAborative Design Activity", "native": False},
             {"extension": "BLEND", "description": "Blender File", "native": False}
         ],
+        "compressed_formats": [
+            {"extension": "GZ", "description": "gzip compressed model, e.g. model.stl.gz", "available": True},
+            {"extension": "ZST", "description": "Zstandard compressed model, e.g. model.obj.zst",
+             "available": compression.zstandard is not None},
+            {"extension": "ZIP", "description": "Zip archive containing exactly one model", "available": True}
+        ],
         "conversion_info": {
             "primary_engine": "trimesh",
             "fallback_engine": "pymeshlab",
-            "note": "Files are automatically converted to STL before slicing. Native STL files are processed directly."
+            "note": "Files are automatically converted to STL before slicing. Native formats are sliced directly in "
+                    "full mode and converted only if the slicer rejects them."
         }
     }
     return jsonify(formats), 200
 
 
+def resume_unfinished():
+    resume_jobs()
+    resume_batches()
+
+# Pick up jobs and batches left unfinished by a previous process without holding up startup
+threading.Thread(target=resume_unfinished, name='job-resume', daemon=True).start()
+
 # run app so it can be run with flask
 if __name__ == "__main__":
     app.run(host='0.0.0.0', port=5030, debug=True)
@@ -0,0 +1,112 @@
+"""Benchmark STEP tessellation tolerances: conversion time, mesh density and mass error.
+
+    python bench_tessellation.py part.step [--linear 0.01 0.025 0.05 0.1 0.2] [--angular 0.5] [--slice]
+
+Each tolerance is converted the way the service converts it: engines are
+tried in the learned order of the service's router (``DATA_DIR/conversions.db``)
+for the extension, without exploration so runs compare, with tolerance-aware
+engines first, and the engine that succeeded is reported. The router stats
+are only read, never created or updated; without them the default order is
+used. Mass
+error is relative to the finest linear tolerance given. With ``--slice`` each
+converted mesh is also run through SuperSlicer to time the slice and compare
+its reported mass.
+"""
+import argparse
+import os
+import tempfile
+import time
+import converters
+import engine_router
+import mass_estimator
+import meshtools
+import printslicer as ps
+
+
+def bench(path, linear_tolerances, angular, run_slicer=False, repair_budget=30, data_dir='data'):
+    """Convert ``path`` at each linear tolerance and return one row of measurements per tolerance"""
+    extension = os.path.splitext(path.lower())[1]
+    if not converters.supports_tessellation(extension):
+        print(f"warning: tolerances have no effect on {extension} files here (STEP with cascadio installed only)")
+    db_path = os.path.join(data_dir, 'conversions.db')
+    if os.path.exists(db_path):
+        router = engine_router.EngineRouter(db_path, list(converters.ENGINES), preferred=converters.PREFERRED_ENGINES)
+        engines = router.order(extension, explore=False)
+    else:
+        preferred = converters.PREFERRED_ENGINES.get(extension, [])
+        engines = preferred + [engine for engine in converters.ENGINES if engine not in preferred]
+
+    rows = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for linear in sorted(linear_tolerances):
+            output_path = os.path.join(work_dir, f"tessellated_{linear}.stl")
+            options = {"tessellation": {"linear": linear, "angular": angular}, "repair_budget": repair_budget}
+            start_time = time.time()
+            engine = None
+            for candidate in converters.tessellating_first(engines, options):
+                if converters.ENGINES[candidate](path, output_path, options):
+                    engine = candidate
+                    break
+            conversion_time = time.time() - start_time
+            if engine is None:
+                rows.append({"linear": linear, "error": "conversion failed"})
+                continue
+
+            stats = meshtools.read_mesh_stats(output_path)
+            row = {
+                "linear": linear,
+                "engine": engine,
+                "conversion_time": conversion_time,
+                "triangles": stats['triangle_count'],
+                "stl_bytes": os.path.getsize(output_path),
+                "mass": stats['volume'] / 1000 * mass_estimator.PLA_DENSITY
+            }
+            if run_slicer:
+                start_time = time.time()
+                sliced = ps.run_slicer_command_and_extract_info(output_path, os.path.basename(path))
+                row['slicer_time'] = time.time() - start_time
+                row['slicer_mass'] = sliced.get('mass')
+            rows.append(row)
+
+    reference = next((row for row in rows if 'mass' in row), None)
+    for row in rows:
+        if reference and 'mass' in row:
+            row['mass_error'] = abs(row['mass'] - reference['mass']) / reference['mass'] if reference['mass'] else 0.0
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare STEP tessellation tolerances")
+    parser.add_argument('path', help="STEP file")
+    parser.add_argument('--linear', type=float, nargs='+', default=[0.01, 0.025, 0.05, 0.1, 0.2, 0.5],
+                        help="Linear (chord) tolerances in mm")
+    parser.add_argument('--angular', type=float, default=0.5, help="Angular tolerance in radians")
+    parser.add_argument('--slice', action='store_true', help="Also slice each mesh with SuperSlicer")
+    parser.add_argument('--config', default='config.ini')
+    parser.add_argument('--data-dir', default=os.getenv('DATA_DIR', 'data'),
+                        help="Service data directory with conversions.db")
+    args = parser.parse_args()
+
+    settings = mass_estimator.load_print_settings(args.config)
+    default = converters.default_tessellation(settings['layer_height'], settings['nozzle_diameter'])
+    print(f"service default: {default['linear']:.4f} mm linear, {default['angular']} rad angular")
+
+    header = (f"{'linear mm':>10} {'engine':>9} {'convert s':>10} {'triangles':>10} {'STL MB':>8} "
+              f"{'mass g':>10} {'mass err':>9}")
+    if args.slice:
+        header += f" {'slice s':>8} {'slicer g':>9}"
+    print(header)
+    for row in bench(args.path, args.linear, args.angular, args.slice, data_dir=args.data_dir):
+        if 'error' in row:
+            print(f"{row['linear']:>10.4f} {row['error']}")
+            continue
+        line = (f"{row['linear']:>10.4f} {row['engine']:>9} {row['conversion_time']:>10.2f} {row['triangles']:>10} "
+                f"{row['stl_bytes'] / 1024 / 1024:>8.2f} {row['mass']:>10.3f} {row['mass_error'] * 100:>8.3f}%")
+        if args.slice:
+            slicer_mass = f"{row['slicer_mass']:.3f}" if row['slicer_mass'] is not None else "failed"
+            line += f" {row['slicer_time']:>8.2f} {slicer_mass:>9}"
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
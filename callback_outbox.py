@@ -0,0 +1,302 @@
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from job_store import pid_alive
+
+# Responses worth retrying; any other 4xx means the receiver rejected the payload itself
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504}
+
+
+def _retry_after_seconds(response):
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class CallbackOutbox:
+    """Durable, retrying delivery of callback payloads.
+
+    Payloads are written to SQLite before anything is sent, then delivered by
+    a pool of ``senders`` threads that keep one keep-alive session per host.
+    Failed deliveries are retried with exponential backoff and full jitter
+    (``base_delay`` doubling up to ``max_delay``, or the receiver's
+    Retry-After) until ``max_attempts`` is reached and the entry is marked
+    dead. With ``batch_size`` above 1, due payloads for the same URL are
+    posted together as a JSON array. ``on_result(job_id, delivered)`` is
+    called once per payload when it is delivered or given up on.
+    """
+
+    def __init__(self, db_path, senders=4, max_attempts=8, base_delay=2.0, max_delay=600.0,
+                 connect_timeout=5.0, read_timeout=30.0, batch_size=1, retention=86400, on_result=None):
+        self.db_path = db_path
+        self.senders = max(1, int(senders))
+        self.max_attempts = max(1, int(max_attempts))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = (connect_timeout, read_timeout)
+        self.batch_size = max(1, int(batch_size))
+        self.retention = retention
+        self.on_result = on_result
+
+        self._executor = ThreadPoolExecutor(max_workers=self.senders, thread_name_prefix='callback')
+        self._sessions = threading.local()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._attempts = 0
+        self._delivered = 0
+        self._failures = 0
+        self._dead = 0
+        self._latencies = deque(maxlen=200)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    url TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    job_id TEXT,
+                    state TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    owner_pid INTEGER,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    delivered_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (state, next_attempt_at)")
+            # Entries a dead process was sending go back to pending; the receiver may see them twice
+            rows = conn.execute("SELECT id, owner_pid FROM outbox WHERE state = 'sending'").fetchall()
+            for row_id, owner_pid in rows:
+                if not pid_alive(owner_pid):
+                    conn.execute("UPDATE outbox SET state = 'pending' WHERE id = ? AND state = 'sending'", (row_id,))
+
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='callback-dispatcher', daemon=True)
+        self._dispatcher.start()
+
+        logging.info(f"[CALLBACK_OUTBOX] Outbox ready at {db_path}: {self.senders} senders, "
+                     f"{self.max_attempts} attempts, backoff {base_delay}s-{max_delay}s, batch size {self.batch_size}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def enqueue(self, url, payload, job_id=None):
+        """Persist a payload for delivery to ``url`` and return its outbox id"""
+        now = time.time()
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "INSERT INTO outbox (url, payload, job_id, state, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, 'pending', ?, ?)",
+                (url, json.dumps(payload), job_id, now, now)
+            )
+            outbox_id = cursor.lastrowid
+        logging.info(f"[CALLBACK_OUTBOX] Queued callback {outbox_id} to {url}")
+        self._wakeup.set()
+        return outbox_id
+
+    def _session(self, url):
+        """Keep-alive session for the URL's host, one per sender thread"""
+        sessions = getattr(self._sessions, 'by_host', None)
+        if sessions is None:
+            sessions = self._sessions.by_host = {}
+        parts = urlsplit(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        session = sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=1, max_retries=0)
+            session.mount(host, adapter)
+            sessions[host] = session
+        return session
+
+    def _claim_due(self):
+        """Claim due pending entries, grouped into (url, rows) deliveries"""
+        now = time.time()
+        with self._lock:
+            free = self.senders - self._busy
+        if free <= 0:
+            return []
+
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, url, payload, job_id, attempts FROM outbox "
+                "WHERE state = 'pending' AND next_attempt_at <= ? "
+                "ORDER BY next_attempt_at LIMIT ?",
+                (now, free * self.batch_size)
+            ).fetchall()
+            claimed = []
+            for row in rows:
+                cursor = conn.execute(
+                    "UPDATE outbox SET state = 'sending', owner_pid = ? WHERE id = ? AND state = 'pending'",
+                    (os.getpid(), row[0])
+                )
+                if cursor.rowcount:
+                    claimed.append(row)
+
+        deliveries = {}
+        for row in claimed:
+            groups = deliveries.setdefault(row[1], [[]])
+            if len(groups[-1]) >= self.batch_size:
+                groups.append([])
+            groups[-1].append(row)
+        return [(url, group) for url, groups in deliveries.items() for group in groups]
+
+    def _dispatch_loop(self):
+        last_prune = 0.0
+        while not self._stopping.is_set():
+            try:
+                for url, rows in self._claim_due():
+                    with self._lock:
+                        self._busy += 1
+                    self._executor.submit(self._deliver, url, rows)
+
+                if time.time() - last_prune > 3600:
+                    last_prune = time.time()
+                    with self._connect() as conn:
+                        conn.execute("DELETE FROM outbox WHERE state IN ('delivered', 'dead') AND created_at < ?",
+                                     (time.time() - self.retention,))
+
+                with self._connect() as conn:
+                    next_due = conn.execute(
+                        "SELECT MIN(next_attempt_at) FROM outbox WHERE state = 'pending'"
+                    ).fetchone()[0]
+                wait = 5.0 if next_due is None else min(5.0, max(0.05, next_due - time.time()))
+            except Exception as e:
+                logging.error(f"[CALLBACK_OUTBOX] Dispatcher error: {str(e)}")
+                wait = 5.0
+
+            self._wakeup.wait(wait)
+            self._wakeup.clear()
+
+    def _deliver(self, url, rows):
+        if len(rows) == 1:
+            body = rows[0][2]
+        else:
+            body = '[' + ','.join(row[2] for row in rows) + ']'
+        headers = {'Content-Type': 'application/json'}
+        if len(rows) > 1:
+            headers['X-Callback-Batch'] = str(len(rows))
+
+        start_time = time.time()
+        error = None
+        retry_after = None
+        retryable = True
+        try:
+            response = self._session(url).post(url, data=body.encode('utf-8'), headers=headers, timeout=self.timeout)
+            if not 200 <= response.status_code < 300:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                retry_after = _retry_after_seconds(response)
+                retryable = response.status_code in RETRYABLE_STATUS_CODES or response.status_code >= 500
+        except Exception as e:
+            error = f"{type(e).__name__}: {str(e)}"
+        finally:
+            with self._lock:
+                self._attempts += 1
+                self._busy -= 1
+            self._wakeup.set()
+
+        if error is None:
+            latency = time.time() - start_time
+            logging.info(f"[CALLBACK_OUTBOX] Delivered {len(rows)} callback(s) to {url} in {latency:.2f}s "
+                         f"(status {response.status_code})")
+            self._finish(rows, latency)
+            return
+
+        logging.warning(f"[CALLBACK_OUTBOX] Delivery of {len(rows)} callback(s) to {url} failed: {error}")
+        self._schedule_retry(rows, error, retry_after, retryable)
+
+    def _finish(self, rows, latency):
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE outbox SET state = 'delivered', attempts = attempts + 1, delivered_at = ?, "
+                "last_error = NULL WHERE id = ?",
+                [(time.time(), row[0]) for row in rows]
+            )
+        with self._lock:
+            self._delivered += len(rows)
+            self._latencies.append(latency)
+        self._report(rows, True)
+
+    def _schedule_retry(self, rows, error, retry_after, retryable):
+        dead_rows = []
+        with self._connect() as conn:
+            for row in rows:
+                attempts = row[4] + 1
+                if not retryable or attempts >= self.max_attempts:
+                    conn.execute("UPDATE outbox SET state = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                                 (attempts, error, row[0]))
+                    dead_rows.append(row)
+                    continue
+                # Full jitter keeps retries from many jobs to the same receiver from arriving in lockstep
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempts - 1)))
+                if retry_after is not None:
+                    delay = max(delay, min(retry_after, self.max_delay))
+                conn.execute(
+                    "UPDATE outbox SET state = 'pending', attempts = ?, next_attempt_at = ?, last_error = ? "
+                    "WHERE id = ?",
+                    (attempts, time.time() + delay, error, row[0])
+                )
+                logging.info(f"[CALLBACK_OUTBOX] Callback {row[0]} attempt {attempts} failed, retrying in {delay:.1f}s")
+
+        with self._lock:
+            self._failures += len(rows)
+            self._dead += len(dead_rows)
+        for row in dead_rows:
+            logging.error(f"[CALLBACK_OUTBOX] Giving up on callback {row[0]} to {row[1]}: {error}")
+        self._report(dead_rows, False)
+        self._wakeup.set()
+
+    def _report(self, rows, delivered):
+        if not self.on_result:
+            return
+        for row in rows:
+            if row[3]:
+                try:
+                    self.on_result(row[3], delivered)
+                except Exception as e:
+                    logging.error(f"[CALLBACK_OUTBOX] on_result failed for job {row[3]}: {str(e)}")
+
+    def shutdown(self):
+        self._stopping.set()
+        self._wakeup.set()
+        self._executor.shutdown(wait=False)
+
+    def stats(self):
+        with self._connect() as conn:
+            counts = dict(conn.execute("SELECT state, COUNT(*) FROM outbox GROUP BY state").fetchall())
+        with self._lock:
+            latencies = sorted(self._latencies)
+            return {
+                "pending": counts.get('pending', 0) + counts.get('sending', 0),
+                "dead": counts.get('dead', 0),
+                "attempts": self._attempts,
+                "delivered": self._delivered,
+                "failed_attempts": self._failures,
+                "given_up": self._dead,
+                "average_latency": sum(latencies) / len(latencies) if latencies else None,
+                "p95_latency": latencies[int(len(latencies) * 0.95)] if latencies else None
+            }
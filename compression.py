@@ -0,0 +1,152 @@
+import gzip
+import hashlib
+import logging
+import os
+import re
+import time
+import zipfile
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSED_EXTENSIONS = ('.gz', '.zst', '.zip')
+
+# Leading bytes of each container, used to spot files a transport layer already decoded
+_MAGIC = {
+    '.gz': b'\x1f\x8b',
+    '.zst': b'\x28\xb5\x2f\xfd',
+    '.zip': b'PK\x03\x04'
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+# Errors raised while reading truncated or damaged compressed data
+_CORRUPT_DATA_ERRORS = ((OSError, EOFError, zipfile.BadZipFile, ValueError)
+                        + ((zstandard.ZstdError,) if zstandard else ()))
+
+
+class DecompressionError(Exception):
+    """Raised when a compressed model cannot be unpacked"""
+
+
+class DecompressedTooLargeError(DecompressionError):
+    """Raised when a compressed model expands past the size cap"""
+
+
+def compression_of(filename):
+    """Return the compression extension of ``filename`` ('.gz', '.zst' or '.zip'), or None"""
+    extension = os.path.splitext(filename.lower())[1]
+    return extension if extension in COMPRESSED_EXTENSIONS else None
+
+
+def inner_filename(filename):
+    """Name of the model inside a .gz or .zst file, e.g. model.stl for model.stl.gz"""
+    if compression_of(filename) in ('.gz', '.zst'):
+        return os.path.splitext(filename)[0]
+    return filename
+
+
+def _open_member(path, compression, is_supported):
+    """Return ``(stream, name, declared_size)`` for the model inside ``path``"""
+    if compression == '.gz':
+        return gzip.open(path, 'rb'), inner_filename(os.path.basename(path)), None
+
+    if compression == '.zst':
+        if zstandard is None:
+            raise DecompressionError("zstd files need the zstandard package, which is not installed")
+        source = open(path, 'rb')
+        reader = zstandard.ZstdDecompressor().stream_reader(source, closefd=True)
+        return reader, inner_filename(os.path.basename(path)), None
+
+    try:
+        archive = zipfile.ZipFile(path)
+    except zipfile.BadZipFile as e:
+        raise DecompressionError(f"Invalid zip archive: {str(e)}")
+    members = [
+        info for info in archive.infolist()
+        if not info.is_dir() and not info.filename.startswith('__MACOSX/')
+        and (is_supported is None or is_supported(info.filename))
+    ]
+    if len(members) != 1:
+        archive.close()
+        if not members:
+            raise DecompressionError("Zip archive does not contain a supported 3D model")
+        names = ', '.join(info.filename for info in members[:5])
+        raise DecompressionError(f"Zip archive contains {len(members)} models ({names}), expected exactly one")
+    member = members[0]
+    # The member stream keeps the underlying file open after the archive is closed
+    stream = archive.open(member)
+    archive.close()
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', os.path.basename(member.filename))
+    return stream, f"{os.path.splitext(os.path.basename(path))[0]}_{name}", member.file_size
+
+
+def decompress(path, output_dir, max_bytes, is_supported=None):
+    """Stream the model in a .gz, .zst or .zip file at ``path`` into ``output_dir``
+
+    The output is hashed while it is written and aborted as soon as it grows
+    past ``max_bytes``. A zip archive must hold exactly one model accepted by
+    ``is_supported(filename)``. A file that is not actually compressed, e.g.
+    because the server sent it with Content-Encoding and it was decoded in
+    transit, is used as-is. The input file is left in place.
+    """
+    compression = compression_of(path)
+    start_time = time.time()
+    compressed_bytes = os.path.getsize(path)
+
+    with open(path, 'rb') as f:
+        magic = f.read(len(_MAGIC[compression]))
+
+    digest = hashlib.sha256()
+    written = 0
+
+    if magic != _MAGIC[compression]:
+        if compression == '.zip':
+            raise DecompressionError("File is not a zip archive")
+        logging.info(f"[DECOMPRESS] {path} is not {compression} compressed, using it as-is")
+        name = inner_filename(os.path.basename(path))
+        stream, declared_size = open(path, 'rb'), None
+    else:
+        stream, name, declared_size = _open_member(path, compression, is_supported)
+
+    output_path = os.path.join(output_dir, name)
+    try:
+        with stream:
+            if max_bytes and declared_size is not None and declared_size > max_bytes:
+                raise DecompressedTooLargeError(
+                    f"Decompressed model is {declared_size} bytes, over the {max_bytes / 1024 / 1024:.0f} MB limit"
+                )
+            with open(output_path, 'wb') as out:
+                while True:
+                    chunk = stream.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    written += len(chunk)
+                    if max_bytes and written > max_bytes:
+                        raise DecompressedTooLargeError(
+                            f"Decompressed model is over the {max_bytes / 1024 / 1024:.0f} MB limit"
+                        )
+                    digest.update(chunk)
+                    out.write(chunk)
+    except DecompressionError:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    except _CORRUPT_DATA_ERRORS as e:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise DecompressionError(f"Corrupt {compression} data: {str(e)}")
+
+    decompress_time = time.time() - start_time
+    logging.info(f"[DECOMPRESS] Unpacked {compressed_bytes} bytes to {written} bytes in {decompress_time:.2f}s: "
+                 f"{output_path}")
+    return {
+        "path": output_path,
+        "format": compression.lstrip('.'),
+        "compressed_bytes": compressed_bytes,
+        "decompressed_bytes": written,
+        "sha256": digest.hexdigest(),
+        "decompress_time": decompress_time
+    }
@@ -0,0 +1,192 @@
+import logging
+import os
+import queue
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection
+
+
+class ConversionTimeoutError(Exception):
+    """Raised when a conversion exceeds its hard timeout and its worker was killed"""
+
+
+class ConversionWorkerError(Exception):
+    """Raised when a conversion worker dies or fails outside the conversion function"""
+
+
+def _current_rss():
+    """Resident set size of the current process in bytes"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        # ru_maxrss is in kilobytes on Linux; peak RSS is good enough for recycling decisions
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _worker_main(conn):
+    """Conversion worker loop: receive (func, args), run it, reply with (status, value) and RSS"""
+    logging.basicConfig(
+        level=logging.INFO,
+        format=f'[%(asctime)s] %(levelname)s in conversion-worker-{os.getpid()}:%(funcName)s:%(lineno)d: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    logging.info(f"[CONVERSION_WORKER] Worker {os.getpid()} started")
+
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+
+        func, args = task
+        try:
+            result = ('ok', func(*args))
+        except Exception as e:
+            result = ('error', f"{type(e).__name__}: {e}")
+        conn.send((result, _current_rss()))
+
+    logging.info(f"[CONVERSION_WORKER] Worker {os.getpid()} exiting")
+
+
+class _Worker:
+    """A conversion worker process connected through a private socket pair.
+
+    Workers are started as ``python -m conversion_pool <fd>`` rather than via
+    multiprocessing so they never re-import the Flask app module.
+    """
+
+    def __init__(self):
+        parent_sock, child_sock = socket.socketpair()
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'conversion_pool', str(child_sock.fileno())],
+            pass_fds=(child_sock.fileno(),)
+        )
+        child_sock.close()
+        self.conn = Connection(parent_sock.detach())
+        self.jobs = 0
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        else:
+            try:
+                self.conn.send(None)
+            except OSError:
+                pass
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait(timeout=5)
+        self.conn.close()
+
+
+class ConversionPool:
+    """Runs mesh conversions in separate worker processes.
+
+    Each worker handles one conversion at a time. Workers are replaced after
+    ``max_jobs_per_worker`` conversions or once their RSS exceeds
+    ``max_rss_bytes``, and a conversion that overruns its timeout gets its
+    worker killed, so leaks and hangs in trimesh/pymeshlab never reach the
+    HTTP process.
+    """
+
+    def __init__(self, size, max_jobs_per_worker, max_rss_bytes, default_timeout):
+        self.size = max(1, int(size))
+        self.max_jobs_per_worker = max(1, int(max_jobs_per_worker))
+        self.max_rss_bytes = max_rss_bytes
+        self.default_timeout = default_timeout
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._recycled = 0
+        self._timeouts = 0
+        self._crashes = 0
+
+        logging.info(f"[CONVERSION_POOL] Pool configured: {self.size} workers, "
+                     f"recycle after {self.max_jobs_per_worker} jobs or {self.max_rss_bytes / 1024 / 1024:.0f} MB RSS, "
+                     f"timeout {self.default_timeout}s")
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            logging.info(f"[CONVERSION_POOL] Spawning new conversion worker")
+            return _Worker()
+
+    def run(self, func, *args, timeout=None):
+        """Run ``func(*args)`` in a worker process and return its result"""
+        timeout = timeout or self.default_timeout
+
+        with self._slots:
+            worker = self._checkout()
+            start_time = time.time()
+
+            try:
+                worker.conn.send((func, args))
+                if not worker.conn.poll(timeout):
+                    logging.error(f"[CONVERSION_POOL] {func.__name__} exceeded {timeout}s timeout, killing worker "
+                                  f"{worker.pid}")
+                    with self._lock:
+                        self._timeouts += 1
+                    worker.stop(kill=True)
+                    raise ConversionTimeoutError(f"{func.__name__} timed out after {timeout}s")
+                (status, value), rss = worker.conn.recv()
+            except (EOFError, OSError) as e:
+                logging.error(f"[CONVERSION_POOL] Worker {worker.pid} died during {func.__name__}: {e} "
+                              f"(exit code {worker.process.poll()})")
+                with self._lock:
+                    self._crashes += 1
+                worker.stop(kill=True)
+                raise ConversionWorkerError(f"Conversion worker died during {func.__name__}")
+
+            worker.jobs += 1
+            elapsed = time.time() - start_time
+            logging.info(f"[CONVERSION_POOL] {func.__name__} finished in {elapsed:.2f}s on worker {worker.pid} "
+                         f"(job {worker.jobs}, RSS {rss / 1024 / 1024:.0f} MB)")
+
+            if worker.jobs >= self.max_jobs_per_worker or rss > self.max_rss_bytes:
+                logging.info(f"[CONVERSION_POOL] Recycling worker {worker.pid} after {worker.jobs} jobs, RSS "
+                             f"{rss / 1024 / 1024:.0f} MB")
+                with self._lock:
+                    self._recycled += 1
+                worker.stop()
+            else:
+                self._idle.put(worker)
+
+        if status == 'error':
+            raise ConversionWorkerError(value)
+        return value
+
+    def shutdown(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            worker.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "idle_workers": self._idle.qsize(),
+                "recycled": self._recycled,
+                "timeouts": self._timeouts,
+                "crashes": self._crashes
+            }
+
+
+if __name__ == '__main__':
+    _worker_main(Connection(int(sys.argv[1])))
@@ -0,0 +1,508 @@
+import os
+import importlib.util
+import logging
+import signal
+import threading
+import time
+from contextlib import contextmanager
+import numpy as np
+import trimesh
+import pymeshlab
+import meshtools
+
+
+# CAD formats that are tessellated on load, so their mesh density depends on the tolerances used
+CAD_EXTENSIONS = ('.step', '.stp', '.iges', '.igs')
+
+# CAD formats the trimesh engine tessellates itself (through cascadio), so tolerances take effect
+TESSELLATED_EXTENSIONS = ('.step', '.stp')
+
+
+def default_tessellation(layer_height, nozzle_diameter):
+    """Tessellation tolerances matched to the printer settings
+    
+    A chord deviation of a quarter of the finer of layer height and nozzle
+    diameter is below what a slice can resolve; 0.5 rad is OpenCASCADE's
+    usual angular deflection.
+    """
+    return {"linear": min(layer_height, nozzle_diameter) / 4, "angular": 0.5}
+
+def can_convert(extension):
+    """Whether a conversion engine reads ``extension``: trimesh's loaders, or MeshLab for CAD files"""
+    return extension.lstrip('.') in trimesh.available_formats() or extension in CAD_EXTENSIONS
+
+def supports_tessellation(extension):
+    """Whether tessellation tolerances change the mesh for ``extension``: only STEP, and only with cascadio installed"""
+    return extension in TESSELLATED_EXTENSIONS and importlib.util.find_spec('cascadio') is not None
+
+# Faces per second a native pymeshlab repair step handles, set well below measured rates (hole filling
+# ~1.3M/s, the other steps 7M/s and up) so a step that is allowed to start finishes inside its budget
+NATIVE_REPAIR_FACES_PER_SECOND = {
+    'merge_duplicate_vertices': 700_000,
+    'remove_duplicate_faces': 700_000,
+    'remove_degenerate_faces': 4_000_000,
+    'fill_holes': 100_000
+}
+
+class RepairBudgetExceeded(Exception):
+    """Raised inside a repair step that ran past its time budget"""
+
+@contextmanager
+def repair_budget(seconds):
+    """Interrupt the block with RepairBudgetExceeded after ``seconds``
+    
+    Uses SIGALRM, so it only applies on the main thread (as in conversion
+    workers) and only interrupts Python code: a native call such as a
+    pymeshlab filter runs to completion first. ``run_repair`` therefore does
+    not use it for native steps.
+    """
+    if not seconds or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    
+    def on_alarm(signum, frame):
+        raise RepairBudgetExceeded(f"Repair step exceeded its {seconds}s budget")
+    
+    previous_handler = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+def inspect_mesh(vertices, faces):
+    """Vectorized health check of an indexed triangle mesh
+    
+    Returns ``(checks, unique_mask, nondegenerate_mask)``: counts of duplicate
+    and degenerate faces, boundary and non-manifold edges and whether the mesh
+    is watertight, plus boolean masks of the faces worth keeping.
+    """
+    start_time = time.time()
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    
+    # Faces with the same vertex set are duplicates regardless of winding
+    sorted_faces = np.ascontiguousarray(np.sort(faces, axis=1))
+    vertex_count = len(vertices)
+    if vertex_count < 2 ** 21:
+        # Three indices fit in one int64 key, which sorts far faster than row-wise unique
+        face_keys = (sorted_faces[:, 0] * vertex_count + sorted_faces[:, 1]) * vertex_count + sorted_faces[:, 2]
+    else:
+        face_keys = sorted_faces.view(np.dtype((np.void, 24))).ravel()
+    _, first_index = np.unique(face_keys, return_index=True)
+    unique_mask = np.zeros(len(faces), dtype=bool)
+    unique_mask[first_index] = True
+    
+    edge_a = vertices[faces[:, 1]] - vertices[faces[:, 0]]
+    edge_b = vertices[faces[:, 2]] - vertices[faces[:, 0]]
+    cross = np.cross(edge_a, edge_b)
+    nondegenerate_mask = ((np.einsum('ij,ij->i', cross, cross) > 1e-24)
+                          & (sorted_faces[:, 0] != sorted_faces[:, 1])
+                          & (sorted_faces[:, 1] != sorted_faces[:, 2]))
+    
+    # Every edge of a closed manifold mesh is shared by exactly two faces
+    kept = sorted_faces[unique_mask & nondegenerate_mask]
+    edges = np.concatenate([kept[:, [0, 1]], kept[:, [1, 2]], kept[:, [0, 2]]])
+    _, edge_counts = np.unique(edges[:, 0] * vertex_count + edges[:, 1], return_counts=True)
+    boundary_edges = int(np.count_nonzero(edge_counts == 1))
+    nonmanifold_edges = int(np.count_nonzero(edge_counts > 2))
+    
+    checks = {
+        "faces": len(faces),
+        "duplicate_faces": int(len(faces) - np.count_nonzero(unique_mask)),
+        "degenerate_faces": int(np.count_nonzero(~nondegenerate_mask)),
+        "boundary_edges": boundary_edges,
+        "nonmanifold_edges": nonmanifold_edges,
+        "watertight": len(kept) > 0 and boundary_edges == 0 and nonmanifold_edges == 0,
+        "check_time": time.time() - start_time
+    }
+    return checks, unique_mask, nondegenerate_mask
+
+def run_repair(report, step, budget, func, *args, faces=None):
+    """Run one repair step under ``budget`` seconds and record its status and time in ``report``
+    
+    Pass ``faces`` for a native step, which SIGALRM cannot interrupt: it is
+    skipped up front when that many faces would not fit in the budget at
+    ``NATIVE_REPAIR_FACES_PER_SECOND``, and otherwise runs until done, with
+    the conversion pool's hard timeout as the only limit.
+    """
+    if faces is not None:
+        max_faces = int(budget * NATIVE_REPAIR_FACES_PER_SECOND[step]) if budget else None
+        if max_faces is not None and faces > max_faces:
+            report['skipped'][step] = f"{faces} faces, more than the {max_faces} the {budget}s budget allows"
+            logging.warning(f"[REPAIR] Skipping {step}: {report['skipped'][step]}")
+            return
+    
+    start_time = time.time()
+    status = "ran"
+    try:
+        with repair_budget(budget if faces is None else None):
+            func(*args)
+    except RepairBudgetExceeded:
+        status = "budget_exceeded"
+        logging.warning(f"[REPAIR] {step} exceeded its {budget}s budget, continuing without it")
+    except Exception as e:
+        # A repair is an improvement, not a requirement; export the mesh as it is
+        status = "failed"
+        logging.warning(f"[REPAIR] {step} failed, continuing without it: {type(e).__name__}: {e}")
+    report['repairs'][step] = {"status": status, "time": time.time() - start_time}
+    logging.info(f"[REPAIR] {step}: {status} in {report['repairs'][step]['time']:.3f}s")
+
+def plan_repairs(checks):
+    """Repair steps a mesh needs according to ``inspect_mesh``, and the reasons others are skipped"""
+    needed = []
+    skipped = {}
+    for step, count_key in (('remove_duplicate_faces', 'duplicate_faces'),
+                            ('remove_degenerate_faces', 'degenerate_faces'),
+                            ('fill_holes', 'boundary_edges')):
+        if checks[count_key]:
+            needed.append(step)
+        else:
+            skipped[step] = f"no {count_key.replace('_', ' ')}"
+    return needed, skipped
+
+def repair_trimesh(mesh, budget):
+    """Check ``mesh`` and run only the repairs it needs, each under ``budget`` seconds
+    
+    Returns ``{"checks", "repairs", "skipped"}``; a watertight mesh skips fill_holes entirely.
+    """
+    checks, unique_mask, nondegenerate_mask = inspect_mesh(mesh.vertices, mesh.faces)
+    needed, skipped = plan_repairs(checks)
+    report = {"checks": checks, "repairs": {}, "skipped": skipped}
+    logging.info(f"[REPAIR] Mesh check in {checks['check_time']:.3f}s: {checks['duplicate_faces']} duplicate, "
+                 f"{checks['degenerate_faces']} degenerate faces, {checks['boundary_edges']} boundary edges, "
+                 f"watertight: {checks['watertight']}")
+    
+    if 'remove_duplicate_faces' in needed:
+        run_repair(report, 'remove_duplicate_faces', budget, mesh.update_faces, unique_mask)
+        if report['repairs']['remove_duplicate_faces']['status'] == 'ran':
+            nondegenerate_mask = nondegenerate_mask[unique_mask]
+    if 'remove_degenerate_faces' in needed:
+        if len(nondegenerate_mask) == len(mesh.faces):
+            run_repair(report, 'remove_degenerate_faces', budget, mesh.update_faces, nondegenerate_mask)
+        else:
+            # remove_duplicate_faces stopped partway, so the mask no longer lines up with the faces
+            report['skipped']['remove_degenerate_faces'] = "face mask out of date after remove_duplicate_faces"
+            logging.warning(f"[REPAIR] Skipping remove_degenerate_faces: "
+                            f"{report['skipped']['remove_degenerate_faces']}")
+    if 'fill_holes' in needed:
+        run_repair(report, 'fill_holes', budget, mesh.fill_holes)
+    return report
+
+def merge_repair_reports(total, part):
+    """Fold one scene part's ``repair_trimesh`` report into the report for the whole scene"""
+    if total is None:
+        return {
+            "checks": dict(part['checks']),
+            "repairs": {step: dict(repair, parts=1) for step, repair in part['repairs'].items()},
+            "skipped": dict(part['skipped'])
+        }
+    
+    checks = total['checks']
+    for key in ('faces', 'duplicate_faces', 'degenerate_faces', 'boundary_edges', 'nonmanifold_edges', 'check_time'):
+        checks[key] += part['checks'][key]
+    checks['watertight'] = checks['watertight'] and part['checks']['watertight']
+    
+    for step, repair in part['repairs'].items():
+        merged = total['repairs'].setdefault(step, {"status": "ran", "time": 0.0, "parts": 0})
+        # The scene keeps the worst outcome of any part
+        if repair['status'] != 'ran':
+            merged['status'] = repair['status']
+        merged['time'] += repair['time']
+        merged['parts'] += 1
+    # A step is only skipped for the scene when no part needed it
+    total['skipped'] = {step: reason for step, reason in total['skipped'].items() if step in part['skipped']}
+    return total
+
+def write_scene_stl(scene, output_path, budget):
+    """Write every geometry instance of ``scene`` into one binary STL without concatenating them
+    
+    Parts are checked and repaired one geometry at a time, written with their
+    scene transform applied, and dropped from the scene after their last
+    instance, so peak memory stays near the largest part rather than twice
+    the whole scene. Returns the merged repair report with a ``scene`` entry.
+    """
+    nodes = scene.graph.nodes_geometry
+    remaining_instances = {}
+    for node in nodes:
+        geometry_name = scene.graph[node][1]
+        remaining_instances[geometry_name] = remaining_instances.get(geometry_name, 0) + 1
+    
+    report = None
+    repaired = set()
+    instances = 0
+    skipped_geometries = 0
+    try:
+        with meshtools.BinaryStlWriter(output_path) as writer:
+            for node in nodes:
+                transform, geometry_name = scene.graph[node]
+                geometry = scene.geometry.get(geometry_name)
+                remaining_instances[geometry_name] -= 1
+                
+                if not isinstance(geometry, trimesh.Trimesh) or len(geometry.faces) == 0:
+                    # Paths, point clouds and empty meshes have no triangles to print
+                    if geometry is not None and geometry_name not in repaired:
+                        logging.info(f"[CONVERT_TRIMESH] Skipping {type(geometry).__name__} geometry {geometry_name}")
+                        skipped_geometries += 1
+                        repaired.add(geometry_name)
+                else:
+                    if geometry_name not in repaired:
+                        report = merge_repair_reports(report, repair_trimesh(geometry, budget))
+                        repaired.add(geometry_name)
+                    
+                    vertices = trimesh.transformations.transform_points(geometry.vertices, transform)
+                    faces = geometry.faces
+                    if np.linalg.det(transform[:3, :3]) < 0:
+                        # A mirroring transform turns the faces inside out
+                        faces = faces[:, ::-1]
+                    writer.write(vertices.astype(np.float32)[faces])
+                    instances += 1
+                
+                if remaining_instances[geometry_name] == 0:
+                    scene.geometry.pop(geometry_name, None)
+            
+            triangle_count = writer.count
+        
+        if report is None or triangle_count == 0:
+            raise ValueError("No triangle geometry found in the scene")
+    except Exception:
+        # Do not leave a partial STL behind for the next engine or a retry to trip over
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        raise
+    
+    report['scene'] = {
+        "instances": instances,
+        "geometries": len(repaired) - skipped_geometries,
+        "skipped_geometries": skipped_geometries
+    }
+    logging.info(f"[CONVERT_TRIMESH] Wrote {triangle_count} triangles from {instances} instances of "
+                 f"{report['scene']['geometries']} geometries")
+    return report
+
+def convert_to_stl_trimesh(input_path, output_path, options=None):
+    """Convert 3D file to STL using trimesh
+    
+    Returns a report of the mesh checks and repairs on success, False on failure.
+    ``options['repair_budget']`` caps each repair step in seconds, and
+    ``options['tessellation']`` sets the ``linear`` (mm) and ``angular``
+    (radians) deflection used to tessellate STEP files.
+    """
+    logging.info(f"[CONVERT_TRIMESH] Starting conversion: {input_path} -> {output_path}")
+    
+    start_time = time.time()
+    
+    try:
+        # Check input file exists and size
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Input file does not exist: {input_path}")
+        
+        file_size = os.path.getsize(input_path)
+        logging.info(f"[CONVERT_TRIMESH] Input file size: {file_size} bytes")
+        
+        # Load mesh with trimesh
+        logging.info(f"[CONVERT_TRIMESH] Loading mesh with trimesh...")
+        load_kwargs = {}
+        tessellation = (options or {}).get('tessellation')
+        if tessellation and os.path.splitext(input_path.lower())[1] in TESSELLATED_EXTENSIONS:
+            logging.info(f"[CONVERT_TRIMESH] Tessellating with {tessellation['linear']}mm linear, "
+                         f"{tessellation['angular']} rad angular tolerance")
+            load_kwargs = {"tol_linear": tessellation['linear'], "tol_angular": tessellation['angular']}
+        mesh = trimesh.load(input_path, **load_kwargs)
+        logging.info(f"[CONVERT_TRIMESH] Mesh loaded successfully, type: {type(mesh).__name__}")
+        budget = (options or {}).get('repair_budget')
+        
+        # Scenes (GLTF, 3MF, multi-object OBJ) are written part by part instead of concatenated in memory
+        if hasattr(mesh, 'geometry'):
+            logging.info(f"[CONVERT_TRIMESH] Scene detected with {len(mesh.geometry)} geometries")
+            if len(mesh.geometry) == 0:
+                raise ValueError("No geometry found in the file")
+            report = write_scene_stl(mesh, output_path, budget)
+            report['engine'] = "trimesh"
+            if load_kwargs:
+                report['tessellation'] = tessellation
+        else:
+            logging.info(f"[CONVERT_TRIMESH] Single mesh object loaded")
+            
+            # Ensure it's a valid mesh
+            if not hasattr(mesh, 'vertices') or len(mesh.vertices) == 0:
+                raise ValueError("Invalid or empty mesh")
+            
+            logging.info(f"[CONVERT_TRIMESH] Mesh info: {len(mesh.vertices)} vertices, {len(mesh.faces)} faces")
+            
+            report = dict(repair_trimesh(mesh, budget), engine="trimesh")
+            if load_kwargs:
+                report['tessellation'] = tessellation
+            
+            logging.info(f"[CONVERT_TRIMESH] Final mesh: {len(mesh.vertices)} vertices, {len(mesh.faces)} faces")
+            
+            # Export as STL
+            logging.info(f"[CONVERT_TRIMESH] Exporting to STL: {output_path}")
+            mesh.export(output_path)
+        
+        # Verify output file was created
+        if os.path.exists(output_path):
+            output_size = os.path.getsize(output_path)
+            conversion_time = time.time() - start_time
+            logging.info(f"[CONVERT_TRIMESH] Conversion successful in {conversion_time:.2f}s")
+            logging.info(f"[CONVERT_TRIMESH] Output file size: {output_size} bytes")
+            return report
+        else:
+            raise Exception("Output file was not created")
+        
+    except Exception as e:
+        conversion_time = time.time() - start_time
+        logging.error(f"[CONVERT_TRIMESH] Conversion failed after {conversion_time:.2f}s: {str(e)}")
+        logging.error(f"[CONVERT_TRIMESH] Exception type: {type(e).__name__}")
+        return False
+
+def convert_to_stl_pymeshlab(input_path, output_path, options=None):
+    """Convert 3D file to STL using PyMeshLab (fallback for STEP/complex formats)
+    
+    Returns a report of the mesh checks and repairs on success, False on failure.
+    """
+    logging.info(f"[CONVERT_PYMESHLAB] Starting conversion: {input_path} -> {output_path}")
+    
+    start_time = time.time()
+    
+    try:
+        # Check input file exists and size
+        if not os.path.exists(input_path):
+            raise FileNotFoundError(f"Input file does not exist: {input_path}")
+        
+        file_size = os.path.getsize(input_path)
+        logging.info(f"[CONVERT_PYMESHLAB] Input file size: {file_size} bytes")
+        
+        logging.info(f"[CONVERT_PYMESHLAB] Initializing PyMeshLab MeshSet...")
+        ms = pymeshlab.MeshSet()
+        
+        logging.info(f"[CONVERT_PYMESHLAB] Loading mesh from: {input_path}")
+        if (options or {}).get('tessellation') and os.path.splitext(input_path.lower())[1] in CAD_EXTENSIONS:
+            # MeshLab's CAD importers take no deflection settings; this only runs once trimesh has failed
+            logging.warning("[CONVERT_PYMESHLAB] Tessellation tolerances are not supported by PyMeshLab, using its "
+                            "defaults")
+        ms.load_new_mesh(input_path)
+        
+        current_mesh = ms.current_mesh()
+        vertex_count = current_mesh.vertex_number()
+        face_count = current_mesh.face_number()
+        
+        logging.info(f"[CONVERT_PYMESHLAB] Loaded mesh: {vertex_count} vertices, {face_count} faces")
+        
+        # Apply only the cleaning the mesh needs
+        report = {"engine": "pymeshlab", "repairs": {}, "skipped": {}}
+        if vertex_count > 0:
+            budget = (options or {}).get('repair_budget')
+            # Merging vertices is needed for the edge checks to see shared edges at all
+            run_repair(report, 'merge_duplicate_vertices', budget, ms.meshing_remove_duplicate_vertices,
+                       faces=face_count)
+            
+            current_mesh = ms.current_mesh()
+            checks, _, _ = inspect_mesh(current_mesh.vertex_matrix(), current_mesh.face_matrix())
+            needed, skipped = plan_repairs(checks)
+            report['skipped'].update(skipped)
+            report['checks'] = checks
+            logging.info(f"[CONVERT_PYMESHLAB] Mesh check in {checks['check_time']:.3f}s: "
+                         f"{checks['duplicate_faces']} duplicate, {checks['degenerate_faces']} degenerate faces, "
+                         f"{checks['boundary_edges']} boundary edges, watertight: {checks['watertight']}")
+            
+            # pymeshlab filters are native calls, so the budget is enforced on face count before each one
+            if 'remove_duplicate_faces' in needed:
+                run_repair(report, 'remove_duplicate_faces', budget, ms.meshing_remove_duplicate_faces,
+                           faces=ms.current_mesh().face_number())
+            if 'remove_degenerate_faces' in needed:
+                run_repair(report, 'remove_degenerate_faces', budget, ms.meshing_remove_null_faces,
+                           faces=ms.current_mesh().face_number())
+            if 'fill_holes' in needed:
+                run_repair(report, 'fill_holes', budget, lambda: ms.meshing_close_holes(maxholesize=30),
+                           faces=ms.current_mesh().face_number())
+            
+            # Log final mesh stats
+            final_mesh = ms.current_mesh()
+            final_vertices = final_mesh.vertex_number()
+            final_faces = final_mesh.face_number()
+            logging.info(f"[CONVERT_PYMESHLAB] Final mesh: {final_vertices} vertices, {final_faces} faces")
+        else:
+            logging.warning(f"[CONVERT_PYMESHLAB] Mesh has no vertices, skipping cleanup")
+        
+        # Save as STL
+        logging.info(f"[CONVERT_PYMESHLAB] Saving mesh as STL: {output_path}")
+        ms.save_current_mesh(output_path)
+        
+        # Verify output file was created
+        if os.path.exists(output_path):
+            output_size = os.path.getsize(output_path)
+            conversion_time = time.time() - start_time
+            logging.info(f"[CONVERT_PYMESHLAB] Conversion successful in {conversion_time:.2f}s")
+            logging.info(f"[CONVERT_PYMESHLAB] Output file size: {output_size} bytes")
+            return report
+        else:
+            raise Exception("Output file was not created")
+        
+    except Exception as e:
+        conversion_time = time.time() - start_time
+        logging.error(f"[CONVERT_PYMESHLAB] Conversion failed after {conversion_time:.2f}s: {str(e)}")
+        logging.error(f"[CONVERT_PYMESHLAB] Exception type: {type(e).__name__}")
+        return False
+
+# Conversion engines by name, in their default order
+ENGINES = {
+    'trimesh': convert_to_stl_trimesh,
+    'pymeshlab': convert_to_stl_pymeshlab
+}
+
+# Default engine order per extension where it differs from ENGINES: MeshLab reads IGES and, without cascadio, STEP
+PREFERRED_ENGINES = {extension: ['pymeshlab'] for extension in CAD_EXTENSIONS}
+
+# Engines that apply ``options['tessellation']``
+TESSELLATING_ENGINES = ('trimesh',)
+
+def tessellating_first(engines, options):
+    """Move the engines that honor tessellation tolerances to the front when ``options`` set them"""
+    if not (options or {}).get('tessellation'):
+        return list(engines)
+    return sorted(engines, key=lambda engine: engine not in TESSELLATING_ENGINES)
+
+def decimate_stl(input_path, output_path, target_faces, max_volume_deviation, max_bbox_deviation):
+    """Simplify an STL to about ``target_faces`` triangles with PyMeshLab's quadric edge collapse
+    
+    The result is only written when its volume is within ``max_volume_deviation``
+    (relative) and every bounding box face within ``max_bbox_deviation`` mm of
+    the original. Returns a report with ``accepted`` and the measured deviations.
+    """
+    logging.info(f"[DECIMATE] Simplifying {input_path} to {target_faces} faces")
+    start_time = time.time()
+    
+    ms = pymeshlab.MeshSet()
+    ms.load_new_mesh(input_path)
+    before = ms.current_mesh()
+    before_stats = meshtools.mesh_stats(before.vertex_matrix()[before.face_matrix()])
+    
+    ms.meshing_decimation_quadric_edge_collapse(targetfacenum=int(target_faces), preservetopology=True,
+                                                preserveboundary=True, preservenormal=True, planarquadric=True,
+                                                optimalplacement=True)
+    after = ms.current_mesh()
+    after_stats = meshtools.mesh_stats(after.vertex_matrix()[after.face_matrix()])
+    
+    volume_deviation = abs(after_stats['volume'] - before_stats['volume']) / max(before_stats['volume'], 1e-9)
+    bbox_deviation = float(max(
+        np.abs(np.subtract(after_stats['bbox_min'], before_stats['bbox_min'])).max(),
+        np.abs(np.subtract(after_stats['bbox_max'], before_stats['bbox_max'])).max()
+    ))
+    accepted = volume_deviation <= max_volume_deviation and bbox_deviation <= max_bbox_deviation
+    if accepted:
+        ms.save_current_mesh(output_path)
+    
+    report = {
+        "original_faces": before_stats['triangle_count'],
+        "faces": after_stats['triangle_count'],
+        "volume_deviation": volume_deviation,
+        "bbox_deviation_mm": bbox_deviation,
+        "accepted": accepted,
+        "time": time.time() - start_time
+    }
+    logging.info(f"[DECIMATE] {report['original_faces']} -> {report['faces']} faces in {report['time']:.2f}s, "
+                 f"volume deviation {volume_deviation * 100:.3f}%, bbox deviation {bbox_deviation:.4f}mm, "
+                 f"{'accepted' if accepted else 'rejected'}")
+    return report
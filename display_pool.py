@@ -0,0 +1,258 @@
+import logging
+import os
+import queue
+import select
+import shutil
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+DISPLAY_MODES = ('auto', 'pool', 'xvfb-run', 'headless')
+
+# Messages GTK/wx print when the X connection is missing or lost
+DISPLAY_ERRORS = ('cannot open display', 'Unable to init server', 'Gtk-WARNING **: cannot open display')
+
+
+class DisplayStartError(Exception):
+    """Raised when an Xvfb server fails to come up"""
+
+
+class _XvfbDisplay:
+    """A long-lived Xvfb server on a display number it picks itself"""
+
+    def __init__(self, screen='1280x1024x24', start_timeout=10):
+        read_fd, write_fd = os.pipe()
+        self.process = subprocess.Popen(
+            ['Xvfb', '-displayfd', str(write_fd), '-screen', '0', screen, '-nolisten', 'tcp', '-noreset'],
+            pass_fds=(write_fd,),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        os.close(write_fd)
+
+        # Xvfb writes the display number followed by a newline once it accepts connections
+        number = b''
+        deadline = time.time() + start_timeout
+        try:
+            while not number.endswith(b'\n'):
+                # Wait with a timeout so an Xvfb that hangs before writing cannot block the caller
+                remaining = deadline - time.time()
+                if remaining <= 0 or not select.select([read_fd], [], [], remaining)[0]:
+                    break
+                chunk = os.read(read_fd, 16)
+                if not chunk:
+                    break
+                number += chunk
+        finally:
+            os.close(read_fd)
+
+        if not number.strip().isdigit():
+            self.stop()
+            raise DisplayStartError(f"Xvfb did not report a display number (exit code {self.process.poll()})")
+
+        self.number = int(number)
+        self.display = f":{self.number}"
+        self.runs = 0
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def healthy(self):
+        return self.process.poll() is None and os.path.exists(f"/tmp/.X11-unix/X{self.number}")
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+                self.process.wait(timeout=5)
+
+
+class DisplayPool:
+    """Hands out X displays to slicer invocations.
+
+    In ``pool`` mode up to ``size`` Xvfb servers are started once and reused,
+    each one lent to a single slicer run at a time. A display whose server has
+    died, or whose slicer run reported a display error, is replaced on the
+    next checkout. ``xvfb-run`` mode keeps the old per-run wrapper and
+    ``headless`` runs the slicer without any X server. ``auto`` uses
+    ``xvfb-run`` until ``detect()`` has run, which picks ``headless`` when a
+    probe command succeeds without a display, otherwise ``pool`` when Xvfb
+    is installed, otherwise ``xvfb-run``.
+    """
+
+    def __init__(self, size, mode='auto'):
+        if mode not in DISPLAY_MODES:
+            raise ValueError(f"Unknown display mode '{mode}', expected one of {', '.join(DISPLAY_MODES)}")
+
+        self.size = max(1, int(size))
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._started = 0
+        self._restarts = 0
+        self._displays = 0
+        self.detecting = mode == 'auto'
+
+        if self.detecting:
+            self.mode = 'xvfb-run'
+            logging.info(f"[DISPLAY_POOL] Display mode: auto, using xvfb-run until detection finishes")
+        else:
+            self._set_mode(mode)
+
+    def _set_mode(self, mode):
+        if mode == 'pool':
+            # Start one display up front so a broken Xvfb install shows up at once, not on the first job
+            try:
+                self._idle.put(self._start_display())
+            except (OSError, DisplayStartError) as e:
+                logging.error(f"[DISPLAY_POOL] Could not start Xvfb, falling back to xvfb-run: {str(e)}")
+                mode = 'xvfb-run'
+        # command() reads the mode once per run, so runs already started keep the mode they began with
+        self.mode = mode
+
+        logging.info(f"[DISPLAY_POOL] Display mode: {self.mode}"
+                     + (f", up to {self.size} Xvfb displays" if self.mode == 'pool' else ""))
+
+    def detect(self, probe_command=None):
+        """Pick the display mode for ``auto``; slow when the probe slices, so call it off the startup path"""
+        try:
+            self._set_mode(self._detect_mode(probe_command))
+        finally:
+            self.detecting = False
+
+    def _detect_mode(self, probe_command):
+        if probe_command:
+            env = {key: value for key, value in os.environ.items() if key not in ('DISPLAY', 'WAYLAND_DISPLAY')}
+            try:
+                result = subprocess.run(probe_command, capture_output=True, text=True, timeout=120, env=env)
+                output = result.stdout + result.stderr
+                if result.returncode == 0 and not any(error in output for error in DISPLAY_ERRORS):
+                    logging.info(f"[DISPLAY_POOL] Probe succeeded without a display, running the slicer headless")
+                    return 'headless'
+                logging.info(f"[DISPLAY_POOL] Probe needs a display (return code {result.returncode})")
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logging.info(f"[DISPLAY_POOL] Headless probe failed: {str(e)}")
+
+        if shutil.which('Xvfb'):
+            return 'pool'
+        logging.warning(f"[DISPLAY_POOL] Xvfb not found on PATH, using xvfb-run")
+        return 'xvfb-run'
+
+    def _start_display(self, reserved=False):
+        display = _XvfbDisplay()
+        with self._lock:
+            self._started += 1
+            if not reserved:
+                self._displays += 1
+        logging.info(f"[DISPLAY_POOL] Started Xvfb on {display.display} (pid {display.pid})")
+        return display
+
+    def _checkout(self):
+        while True:
+            try:
+                display = self._idle.get_nowait()
+                break
+            except queue.Empty:
+                pass
+            with self._lock:
+                can_start = self._displays < self.size
+                if can_start:
+                    # Reserve the slot before starting so concurrent checkouts cannot overshoot size
+                    self._displays += 1
+            if can_start:
+                try:
+                    return self._start_display(reserved=True)
+                except Exception:
+                    with self._lock:
+                        self._displays -= 1
+                    raise
+            try:
+                display = self._idle.get(timeout=1)
+                break
+            except queue.Empty:
+                continue
+
+        if display.healthy():
+            return display
+        logging.warning(f"[DISPLAY_POOL] Xvfb on {display.display} (pid {display.pid}) is not healthy, restarting")
+        self._discard(display)
+        with self._lock:
+            self._restarts += 1
+            self._displays += 1
+        try:
+            return self._start_display(reserved=True)
+        except Exception:
+            with self._lock:
+                self._displays -= 1
+            raise
+
+    def _discard(self, display):
+        display.stop()
+        with self._lock:
+            self._displays -= 1
+
+    @contextmanager
+    def command(self, args):
+        """Yield ``(command, env, report)`` for running ``args`` under this pool's display mode.
+
+        Call ``report(output)`` with the slicer's output so a display that
+        produced X errors is restarted instead of being handed out again.
+        """
+        if self.mode == 'xvfb-run':
+            yield ['xvfb-run', '-a'] + list(args), None, lambda output: None
+            return
+
+        env = {key: value for key, value in os.environ.items() if key not in ('DISPLAY', 'WAYLAND_DISPLAY')}
+        if self.mode == 'headless':
+            yield list(args), env, lambda output: None
+            return
+
+        try:
+            display = self._checkout()
+        except (OSError, DisplayStartError) as e:
+            # Same fallback as at startup, but only for this run; the next checkout tries Xvfb again
+            logging.error(f"[DISPLAY_POOL] Could not start Xvfb, using xvfb-run for this run: {str(e)}")
+            yield ['xvfb-run', '-a'] + list(args), None, lambda output: None
+            return
+        broken = []
+
+        def report(output):
+            if output and any(error in output for error in DISPLAY_ERRORS):
+                logging.warning(f"[DISPLAY_POOL] Slicer reported a display error on {display.display}")
+                broken.append(True)
+
+        env['DISPLAY'] = display.display
+        try:
+            yield list(args), env, report
+        finally:
+            display.runs += 1
+            if broken or not display.healthy():
+                self._discard(display)
+                with self._lock:
+                    self._restarts += 1
+            else:
+                self._idle.put(display)
+
+    def shutdown(self):
+        while True:
+            try:
+                display = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(display)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "detecting": self.detecting,
+                "size": self.size,
+                "displays": self._displays,
+                "idle_displays": self._idle.qsize(),
+                "started": self._started,
+                "restarts": self._restarts
+            }
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import os
+import re
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+CONTENT_RANGE_PATTERN = re.compile(r'^\s*bytes\s+(\d+)-(\d+)/(\d+|\*)\s*$', re.IGNORECASE)
+
+
+class DownloadError(Exception):
+    """Raised when a download fails"""
+
+
+class DownloadTooLargeError(DownloadError):
+    """Raised when a download exceeds the byte cap"""
+
+
+def chunk_size_for(content_length):
+    """Read size for a body of ``content_length`` bytes: about 1/64th of it, between 64 KB and 4 MB"""
+    if not content_length:
+        return 256 * 1024
+    return min(MAX_CHUNK_SIZE, max(MIN_CHUNK_SIZE, content_length // 64))
+
+
+def content_range_start(value):
+    """First byte offset of a ``Content-Range: bytes START-END/TOTAL`` header, or None if it cannot be parsed"""
+    match = CONTENT_RANGE_PATTERN.match(value or '')
+    return int(match.group(1)) if match else None
+
+
+class Downloader:
+    """Streams URLs to disk over a shared pooled session.
+
+    Downloads are aborted as soon as they pass ``max_bytes`` (checked against
+    Content-Length up front and against the bytes received), and hashed with
+    SHA-256 while they are written so the file never has to be read again.
+    A transfer that drops mid-body is resumed with a Range request, up to
+    ``max_retries`` times, when the server supports it; otherwise it restarts.
+    A 206 whose Content-Range does not start at the partial size also restarts.
+    """
+
+    def __init__(self, max_bytes, connect_timeout=10.0, read_timeout=60.0, max_retries=3, pool_size=10):
+        self.max_bytes = max_bytes
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max(0, int(max_retries))
+
+        self.session = requests.Session()
+        # Connection-level retries only; body retries are handled with Range requests below
+        retry = Retry(total=self.max_retries, connect=self.max_retries, read=0, status=0,
+                      backoff_factor=0.5, allowed_methods=frozenset(['GET']))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        logging.info(f"[DOWNLOAD] Downloader ready: max {max_bytes / 1024 / 1024:.0f} MB, "
+                     f"timeouts {connect_timeout}s/{read_timeout}s, {self.max_retries} retries")
+
+    def _check_size(self, size, url):
+        if self.max_bytes and size > self.max_bytes:
+            raise DownloadTooLargeError(
+                f"File at {url} is larger than the {self.max_bytes / 1024 / 1024:.0f} MB download limit"
+            )
+
+    def fetch(self, url, path, headers=None):
+        """Download ``url`` to ``path`` and return size, SHA-256, validators and timing details
+
+        ``headers`` are sent with the first request only, e.g. If-None-Match
+        for a conditional GET; a 304 answer returns ``not_modified`` without
+        writing a file. Partial output is removed when the download fails.
+        """
+        start_time = time.time()
+        digest = hashlib.sha256()
+        written = 0
+        resumes = 0
+        validator = None
+        attempt = 0
+        etag = None
+        last_modified = None
+
+        try:
+            with open(path, 'wb') as f:
+                while True:
+                    # Conditional headers only make sense on the first request; a resumed range must not get a 304
+                    request_headers = dict(headers or {}) if not written else {}
+                    if written:
+                        request_headers['Range'] = f'bytes={written}-'
+                        if validator:
+                            request_headers['If-Range'] = validator
+
+                    try:
+                        with self.session.get(url, stream=True, timeout=self.timeout,
+                                              headers=request_headers) as response:
+                            if response.status_code == 304 and not written and headers:
+                                logging.info(f"[DOWNLOAD] {url} not modified since the stored copy")
+                                break
+                            if written and response.status_code == 206:
+                                range_start = content_range_start(response.headers.get('Content-Range'))
+                                if range_start != written:
+                                    # Appending any other range would corrupt the file and its hash
+                                    logging.warning(f"[DOWNLOAD] Server returned range starting at {range_start} "
+                                                    f"instead of {written}, restarting download")
+                                    f.seek(0)
+                                    f.truncate()
+                                    digest = hashlib.sha256()
+                                    written = 0
+                                    validator = None
+                                    continue
+                                logging.info(f"[DOWNLOAD] Resuming at byte {written}")
+                                resumes += 1
+                            elif response.status_code == 200:
+                                if written:
+                                    logging.info(f"[DOWNLOAD] Server ignored the range request, restarting download")
+                                    f.seek(0)
+                                    f.truncate()
+                                    digest = hashlib.sha256()
+                                    written = 0
+                            else:
+                                raise DownloadError(f"HTTP {response.status_code} from {url}")
+
+                            if response.status_code == 200:
+                                etag = response.headers.get('ETag')
+                                last_modified = response.headers.get('Last-Modified')
+                                validator = response.headers.get('ETag') or response.headers.get('Last-Modified')
+                                # Ranges address the encoded body, so compressed transfers restart instead of resuming
+                                if (response.headers.get('Accept-Ranges') != 'bytes'
+                                        or response.headers.get('Content-Encoding')):
+                                    validator = None
+
+                            remaining = int(response.headers.get('Content-Length') or 0)
+                            self._check_size(written + remaining, url)
+                            chunk_size = chunk_size_for(written + remaining)
+
+                            for chunk in response.iter_content(chunk_size=chunk_size):
+                                written += len(chunk)
+                                self._check_size(written, url)
+                                digest.update(chunk)
+                                f.write(chunk)
+                        break
+                    except (requests.exceptions.ChunkedEncodingError,
+                            requests.exceptions.ConnectionError,
+                            requests.exceptions.Timeout) as e:
+                        attempt += 1
+                        if attempt > self.max_retries:
+                            raise DownloadError(f"Download of {url} failed after {attempt} attempts: {str(e)}")
+                        if not validator:
+                            # Without a validator a resumed body could mix two versions of the file
+                            f.seek(0)
+                            f.truncate()
+                            digest = hashlib.sha256()
+                            written = 0
+                        logging.warning(f"[DOWNLOAD] Transfer interrupted after {written} bytes ({type(e).__name__}), "
+                                        f"retry {attempt}/{self.max_retries}")
+                        time.sleep(min(2 ** attempt * 0.25, 5))
+        except Exception:
+            if os.path.exists(path):
+                os.remove(path)
+            raise
+
+        download_time = time.time() - start_time
+        if response.status_code == 304:
+            os.remove(path)
+            return {"path": None, "not_modified": True, "download_time": download_time}
+
+        logging.info(f"[DOWNLOAD] Downloaded {written} bytes in {download_time:.2f}s "
+                     f"({written / max(download_time, 1e-6) / 1024 / 1024:.1f} MB/s, {resumes} resumes)")
+        return {
+            "path": path,
+            "bytes": written,
+            "sha256": digest.hexdigest(),
+            "download_time": download_time,
+            "resumes": resumes,
+            "etag": etag,
+            "last_modified": last_modified,
+            "not_modified": False
+        }
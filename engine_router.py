@@ -0,0 +1,121 @@
+import logging
+import random
+import sqlite3
+import time
+
+# Weight of the newest attempt in the moving averages, so the order follows library upgrades
+SMOOTHING = 0.1
+
+
+class EngineRouter:
+    """Chooses the order in which conversion engines are tried for each file format.
+
+    Every attempt is recorded in SQLite per (extension, engine) as a moving
+    average of its success rate and time. Engines with at least
+    ``min_samples`` attempts for a format are tried first, ordered by
+    expected time to a successful conversion, i.e. average time divided by
+    success rate; the rest follow in the format's ``preferred`` (or the
+    ``engines``) order. Fallback engines are otherwise only attempted when
+    the ones before them fail, so while any engine lacks samples, a fraction
+    ``exploration`` of calls puts the least-tried engine first. Stats not
+    updated for ``max_age`` seconds count as missing, so a demoted engine is
+    eventually explored again.
+    """
+
+    def __init__(self, db_path, engines, preferred=None, min_samples=5, max_age=7 * 86400, exploration=0.1):
+        self.db_path = db_path
+        self.engines = list(engines)
+        self.preferred = preferred or {}
+        self.min_samples = max(1, int(min_samples))
+        self.max_age = max_age
+        self.exploration = min(max(float(exploration), 0.0), 1.0)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS conversion_stats (
+                    extension TEXT NOT NULL,
+                    engine TEXT NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    successes INTEGER NOT NULL,
+                    success_rate REAL NOT NULL,
+                    average_time REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (extension, engine)
+                )
+            """)
+
+        logging.info(f"[ENGINE_ROUTER] Routing conversions across {', '.join(self.engines)} "
+                     f"(learned order after {self.min_samples} attempts per engine, "
+                     f"exploring {self.exploration:.0%} of the time), stats in {db_path}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _default_order(self, extension):
+        preferred = [engine for engine in self.preferred.get(extension, []) if engine in self.engines]
+        return preferred + [engine for engine in self.engines if engine not in preferred]
+
+    def order(self, extension, explore=True):
+        """Engines to try for ``extension``, best first; ``explore=False`` gives the learned order only"""
+        default = self._default_order(extension)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT engine, attempts, success_rate, average_time FROM conversion_stats "
+                "WHERE extension = ? AND updated_at >= ?",
+                (extension, time.time() - self.max_age)
+            ).fetchall()
+        stats = {row[0]: row[1:] for row in rows}
+        attempts = {engine: stats.get(engine, (0,))[0] for engine in default}
+        sampled = [engine for engine in default if attempts[engine] >= self.min_samples]
+        unsampled = [engine for engine in default if attempts[engine] < self.min_samples]
+
+        def expected_time(engine):
+            _, success_rate, average_time = stats[engine]
+            if success_rate <= 0:
+                return float('inf')
+            return average_time / success_rate
+
+        # sorted() is stable, so ties keep the default order
+        order = sorted(sampled, key=expected_time) + unsampled
+        if explore and unsampled and len(order) > 1 and random.random() < self.exploration:
+            explored = min(order, key=lambda engine: attempts[engine])
+            order.remove(explored)
+            order.insert(0, explored)
+            logging.info(f"[ENGINE_ROUTER] Exploring {explored} first for {extension} "
+                         f"({attempts[explored]}/{self.min_samples} attempts)")
+        return order
+
+    def record(self, extension, engine, success, elapsed):
+        """Fold one conversion attempt into the engine's stats for ``extension``"""
+        outcome = 1.0 if success else 0.0
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO conversion_stats "
+                "(extension, engine, attempts, successes, success_rate, average_time, updated_at) "
+                "VALUES (?, ?, 1, ?, ?, ?, ?) "
+                "ON CONFLICT (extension, engine) DO UPDATE SET "
+                "attempts = attempts + 1, successes = successes + excluded.successes, "
+                "success_rate = success_rate + ? * (excluded.success_rate - success_rate), "
+                "average_time = average_time + ? * (excluded.average_time - average_time), "
+                "updated_at = excluded.updated_at",
+                (extension, engine, int(success), outcome, elapsed, time.time(), SMOOTHING, SMOOTHING)
+            )
+
+    def stats(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT extension, engine, attempts, successes, success_rate, average_time FROM conversion_stats "
+                "ORDER BY extension, engine"
+            ).fetchall()
+        formats = {}
+        for extension, engine, attempts, successes, success_rate, average_time in rows:
+            entry = formats.setdefault(extension, {"order": self.order(extension, explore=False), "engines": {}})
+            entry["engines"][engine] = {
+                "attempts": attempts,
+                "successes": successes,
+                "success_rate": round(success_rate, 3),
+                "average_time": round(average_time, 3)
+            }
+        return formats
@@ -0,0 +1,270 @@
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+
+JOB_STATES = ('queued', 'processing', 'completed', 'failed')
+
+# Jobs created after this process started are never orphans of an earlier process
+_PROCESS_START = time.time()
+
+# Columns returned by the API; file_path is internal
+_PUBLIC_COLUMNS = ('job_id', 'file_id', 'state', 'mode', 'callback_url', 'callback_delivered',
+                   'attempts', 'error', 'result', 'created_at', 'started_at', 'finished_at')
+
+
+def pid_alive(pid):
+    """Whether ``pid`` belongs to another running process"""
+    if not pid or pid == os.getpid():
+        # Our own pid on a record means it was written by a previous process that had the same pid
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """Persistent SQLite record of slicing jobs and their results.
+
+    Jobs move from ``queued`` to ``processing`` to ``completed`` or
+    ``failed``. The finished result payload is kept so clients can poll for
+    it when a callback was missed, and jobs left queued or processing by a
+    process that has exited can be claimed and resumed. Batches are stored
+    with their callback URL and members so their aggregated callback can be
+    sent after a restart. Finished jobs and batches older than ``retention``
+    seconds are pruned.
+    """
+
+    def __init__(self, db_path, retention):
+        self.db_path = db_path
+        self.retention = retention
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    file_id TEXT,
+                    state TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    file_path TEXT,
+                    callback_url TEXT,
+                    max_dimensions TEXT,
+                    options TEXT,
+                    callback_delivered INTEGER,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    owner_pid INTEGER,
+                    error TEXT,
+                    result TEXT,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL
+                )
+            """)
+            # Databases created before conversion options were stored lack the column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if 'options' not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN options TEXT")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS batches (
+                    batch_id TEXT PRIMARY KEY,
+                    callback_url TEXT,
+                    members TEXT NOT NULL,
+                    state TEXT NOT NULL,
+                    owner_pid INTEGER,
+                    created_at REAL NOT NULL,
+                    finished_at REAL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_file_id ON jobs (file_id)")
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_created_at ON jobs (created_at)")
+
+        logging.info(f"[JOB_STORE] Job store ready at {db_path} (retention {retention / 86400:.1f} days)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, file_path, callback_url, file_id=None, max_dimensions=None, mode='full', options=None):
+        """Record a new queued job and return its id; ``options`` are the requested conversion options"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, file_id, state, mode, file_path, callback_url, max_dimensions, options, "
+                "owner_pid, created_at) VALUES (?, ?, 'queued', ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, file_id, mode, file_path, callback_url, json.dumps(max_dimensions),
+                 json.dumps(options) if options else None, os.getpid(), now)
+            )
+            conn.execute("DELETE FROM jobs WHERE state IN ('completed', 'failed') AND finished_at < ?",
+                         (now - self.retention,))
+        logging.info(f"[JOB_STORE] Created job {job_id} for file_id {file_id}")
+        return job_id
+
+    def delete(self, job_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def set_file_path(self, job_id, file_path):
+        """Point the job at an intermediate file, e.g. the converted STL, before its previous input is deleted"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET file_path = ? WHERE job_id = ?", (file_path, job_id))
+
+    def mark_processing(self, job_id):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = 'processing', started_at = ?, attempts = attempts + 1, owner_pid = ? "
+                "WHERE job_id = ?",
+                (time.time(), os.getpid(), job_id)
+            )
+        logging.info(f"[JOB_STORE] Job {job_id} is processing")
+
+    def finish(self, job_id, result_data):
+        """Store the result payload; the job is completed when it succeeded and failed otherwise"""
+        state = 'completed' if result_data.get('status') == 'success' else 'failed'
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ? WHERE job_id = ?",
+                (state, json.dumps(result_data), result_data.get('error'), time.time(), job_id)
+            )
+        logging.info(f"[JOB_STORE] Job {job_id} {state}")
+
+    def set_callback_delivered(self, job_id, delivered):
+        """Record the callback outcome; None means the job had no callback URL"""
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET callback_delivered = ? WHERE job_id = ?",
+                         (None if delivered is None else int(bool(delivered)), job_id))
+
+    def _to_dict(self, row):
+        job = {column: row[column] for column in _PUBLIC_COLUMNS}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        if job['callback_delivered'] is not None:
+            job['callback_delivered'] = bool(job['callback_delivered'])
+        return job
+
+    def get(self, job_id):
+        """Return the job as a dict, or None if it is unknown"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    def list(self, state=None, file_id=None, limit=50, offset=0):
+        """Return jobs newest first, optionally filtered by state and file_id"""
+        clauses, params = [], []
+        if state:
+            clauses.append("state = ?")
+            params.append(state)
+        if file_id:
+            clauses.append("file_id = ?")
+            params.append(file_id)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                params + [limit, offset]
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def claim_orphaned(self):
+        """Claim queued/processing jobs whose owning process has exited and return them for resumption"""
+        claimed = []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE state IN ('queued', 'processing') AND created_at < ? ORDER BY created_at",
+                (_PROCESS_START,)
+            ).fetchall()
+            for row in rows:
+                if pid_alive(row['owner_pid']):
+                    continue
+                # Conditional update so that only one process claims a job when several start together
+                cursor = conn.execute(
+                    "UPDATE jobs SET state = 'queued', owner_pid = ? WHERE job_id = ? AND owner_pid IS ?",
+                    (os.getpid(), row['job_id'], row['owner_pid'])
+                )
+                if cursor.rowcount:
+                    claimed.append({
+                        "job_id": row['job_id'],
+                        "file_id": row['file_id'],
+                        "mode": row['mode'],
+                        "attempts": row['attempts'],
+                        "file_path": row['file_path'],
+                        "callback_url": row['callback_url'],
+                        "max_dimensions": json.loads(row['max_dimensions']) if row['max_dimensions'] else None,
+                        "options": json.loads(row['options']) if row['options'] else None
+                    })
+        if claimed:
+            logging.info(f"[JOB_STORE] Claimed {len(claimed)} unfinished jobs from previous processes")
+        return claimed
+
+    def create_batch(self, batch_id, callback_url, file_ids):
+        """Record a running batch and return True, or False if ``batch_id`` is already taken
+        
+        Each member starts as ``{"file_id": ...}`` until it is queued.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            # Pruned first, so the id of a batch past retention can be used again
+            conn.execute("DELETE FROM batches WHERE state = 'completed' AND finished_at < ?", (now - self.retention,))
+            try:
+                conn.execute(
+                    "INSERT INTO batches (batch_id, callback_url, members, state, owner_pid, created_at) "
+                    "VALUES (?, ?, ?, 'running', ?, ?)",
+                    (batch_id, callback_url, json.dumps([{"file_id": file_id} for file_id in file_ids]),
+                     os.getpid(), now)
+                )
+            except sqlite3.IntegrityError:
+                return False
+        logging.info(f"[JOB_STORE] Created batch {batch_id} with {len(file_ids)} files")
+        return True
+
+    def set_batch_members(self, batch_id, members):
+        """Store the members of a batch: each has its ``job_id``, a ``duplicate_of`` index or an inline ``result``"""
+        with self._connect() as conn:
+            conn.execute("UPDATE batches SET members = ? WHERE batch_id = ?", (json.dumps(members), batch_id))
+
+    def finish_batch(self, batch_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE batches SET state = 'completed', finished_at = ? WHERE batch_id = ?",
+                         (time.time(), batch_id))
+        logging.info(f"[JOB_STORE] Batch {batch_id} completed")
+
+    def claim_orphaned_batches(self):
+        """Claim running batches whose owning process has exited and return them for completion"""
+        claimed = []
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM batches WHERE state = 'running' AND created_at < ? ORDER BY created_at",
+                (_PROCESS_START,)
+            ).fetchall()
+            for row in rows:
+                if pid_alive(row['owner_pid']):
+                    continue
+                cursor = conn.execute(
+                    "UPDATE batches SET owner_pid = ? WHERE batch_id = ? AND owner_pid IS ?",
+                    (os.getpid(), row['batch_id'], row['owner_pid'])
+                )
+                if cursor.rowcount:
+                    claimed.append({
+                        "batch_id": row['batch_id'],
+                        "callback_url": row['callback_url'],
+                        "members": json.loads(row['members']),
+                        "created_at": row['created_at']
+                    })
+        if claimed:
+            logging.info(f"[JOB_STORE] Claimed {len(claimed)} unfinished batches from previous processes")
+        return claimed
+
+    def stats(self):
+        with self._connect() as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update({row[0]: row[1] for row in rows})
+        return counts
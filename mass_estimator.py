@@ -0,0 +1,227 @@
+"""Print mass estimation from mesh measurements and config.ini, without slicing.
+
+Calibrate against real SuperSlicer runs with:
+
+    python mass_estimator.py calibrate <corpus_dir> [--output data/mass_estimator.json]
+    python mass_estimator.py calibrate --measurements runs.csv
+
+The CSV form takes ``path,filament_mm3`` rows from earlier slicer runs so the
+fit can be repeated without re-slicing the corpus.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import time
+import numpy as np
+import meshtools
+import printslicer as ps
+import result_cache
+
+# Density of PLA in g/cm³, same as the slicer path
+PLA_DENSITY = 1.25
+
+DEFAULT_COEFFICIENTS = {"shell": 1.0, "infill": 1.0, "intercept": 0.0}
+
+
+def _parse_percent(raw, default):
+    raw = (raw or '').strip()
+    if not raw:
+        return default
+    if raw.endswith('%'):
+        return float(raw[:-1]) / 100
+    return float(raw)
+
+
+def load_print_settings(config_path='config.ini'):
+    """Read the settings that drive filament usage from a SuperSlicer config.ini"""
+    values = {}
+    with open(config_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#') or '=' not in line:
+                continue
+            key, value = line.split('=', 1)
+            values[key.strip()] = value.strip()
+
+    nozzle_diameter = float(values.get('nozzle_diameter', '0.4').split(',')[0])
+    layer_height = float(values.get('layer_height', '0.2'))
+
+    def extrusion_width(key):
+        # Widths may be absolute mm or a percentage of the nozzle diameter; empty/0 means auto
+        raw = values.get(key, '')
+        if not raw or raw in ('0', '0%'):
+            return None
+        if raw.endswith('%'):
+            return nozzle_diameter * float(raw[:-1]) / 100
+        return float(raw)
+
+    perimeter_width = (extrusion_width('perimeter_extrusion_width') or extrusion_width('extrusion_width')
+                       or 1.125 * nozzle_diameter)
+    external_width = extrusion_width('external_perimeter_extrusion_width') or perimeter_width
+
+    return {
+        "nozzle_diameter": nozzle_diameter,
+        "layer_height": layer_height,
+        "perimeters": int(values.get('perimeters', '3')),
+        "top_solid_layers": int(values.get('top_solid_layers', '3')),
+        "bottom_solid_layers": int(values.get('bottom_solid_layers', '3')),
+        "fill_density": _parse_percent(values.get('fill_density'), 0.2),
+        "perimeter_width": perimeter_width,
+        "external_perimeter_width": external_width
+    }
+
+
+class MassEstimator:
+    """Shell + infill model of extruded volume.
+
+    The shell is the wall area times the perimeter thickness plus the top and
+    bottom projected areas times their solid layer thickness, capped at the
+    mesh volume. The rest of the volume is filled at ``fill_density``. A
+    linear fit against real slicer runs corrects both terms.
+    """
+
+    def __init__(self, settings, coefficients=None, calibration=None):
+        self.settings = settings
+        self.coefficients = dict(coefficients or DEFAULT_COEFFICIENTS)
+        self.calibration = calibration
+
+    @classmethod
+    def load(cls, config_path, coefficients_path):
+        """Build an estimator for ``config_path``, using fitted coefficients when they match the config"""
+        settings = load_print_settings(config_path)
+        if not os.path.exists(coefficients_path):
+            logging.info(f"[MASS_ESTIMATOR] No calibration at {coefficients_path}, using default coefficients")
+            return cls(settings)
+
+        with open(coefficients_path, 'r') as f:
+            saved = json.load(f)
+        config_hash = result_cache.hash_file(config_path)
+        if saved.get('config_hash') != config_hash:
+            logging.warning(f"[MASS_ESTIMATOR] Calibration in {coefficients_path} was fitted for another config.ini, "
+                            "using default coefficients")
+            return cls(settings)
+
+        logging.info(f"[MASS_ESTIMATOR] Loaded calibration from {coefficients_path}: {saved['coefficients']}")
+        return cls(settings, saved['coefficients'], saved.get('calibration'))
+
+    @property
+    def calibrated(self):
+        return self.calibration is not None
+
+    def features(self, stats):
+        """Split a mesh's volume into shell and infill volume"""
+        settings = self.settings
+        wall_thickness = (settings['external_perimeter_width']
+                          + (settings['perimeters'] - 1) * settings['perimeter_width'])
+        top_thickness = settings['top_solid_layers'] * settings['layer_height']
+        bottom_thickness = settings['bottom_solid_layers'] * settings['layer_height']
+
+        shell = (stats['side_area'] * wall_thickness
+                 + stats['top_area'] * top_thickness
+                 + stats['bottom_area'] * bottom_thickness)
+        shell = min(shell, stats['volume'])
+        infill = (stats['volume'] - shell) * settings['fill_density']
+        return shell, infill
+
+    def estimate(self, stats):
+        """Estimate extruded volume (mm³) and mass (g) from mesh_stats-style measurements"""
+        shell, infill = self.features(stats)
+        c = self.coefficients
+        extruded_volume = max(c['shell'] * shell + c['infill'] * infill + c['intercept'], 0.0)
+        return {
+            "shell_volume": shell,
+            "infill_volume": infill,
+            "extruded_volume": extruded_volume,
+            "mass": extruded_volume / 1000 * PLA_DENSITY
+        }
+
+    def fit(self, samples):
+        """Least-squares fit of the coefficients to (stats, filament_volume) samples and report the error"""
+        if len(samples) < 3:
+            raise ValueError(f"Need at least 3 samples to calibrate, got {len(samples)}")
+
+        rows = np.array([self.features(stats) + (1.0,) for stats, _ in samples])
+        actual = np.array([volume for _, volume in samples])
+        solution, _, _, _ = np.linalg.lstsq(rows, actual, rcond=None)
+        self.coefficients = {"shell": float(solution[0]), "infill": float(solution[1]), "intercept": float(solution[2])}
+
+        predicted = np.maximum(rows @ solution, 0.0)
+        relative_error = np.abs(predicted - actual) / np.maximum(actual, 1e-9)
+        self.calibration = {
+            "samples": len(samples),
+            "mean_absolute_error_mm3": float(np.mean(np.abs(predicted - actual))),
+            "mean_relative_error": float(np.mean(relative_error)),
+            "max_relative_error": float(np.max(relative_error)),
+            "within_10_percent": float(np.mean(relative_error <= 0.10)),
+            "fitted_at": time.time()
+        }
+        return self.calibration
+
+    def save(self, coefficients_path, config_path):
+        with open(coefficients_path, 'w') as f:
+            json.dump({
+                "config_hash": result_cache.hash_file(config_path),
+                "coefficients": self.coefficients,
+                "calibration": self.calibration
+            }, f, indent=2)
+
+
+def _collect_samples(args):
+    samples = []
+    if args.measurements:
+        with open(args.measurements, newline='') as f:
+            for row in csv.reader(f):
+                if not row or row[0].startswith('#') or row[0] == 'path':
+                    continue
+                stats = meshtools.mesh_stats(meshtools.load_triangles(row[0]))
+                samples.append((stats, float(row[1])))
+        return samples
+
+    paths = sorted(
+        os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+        if name.lower().endswith('.stl')
+    )
+    for path in paths:
+        measured = ps.measure_filament_volume(os.path.abspath(path), os.path.abspath(args.config))
+        if measured['status'] != 200:
+            print(f"skip {path}: {measured.get('error')}")
+            continue
+        stats = meshtools.mesh_stats(meshtools.load_triangles(path))
+        samples.append((stats, measured['filament_volume']))
+        print(f"{path}: {measured['filament_volume']:.1f} mm3 filament, {stats['volume']:.1f} mm3 solid")
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate the print mass estimator against SuperSlicer runs")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    calibrate = subparsers.add_parser('calibrate', help="Fit estimator coefficients to a corpus of STL files")
+    calibrate.add_argument('corpus', nargs='?', help="Directory of STL files to slice")
+    calibrate.add_argument('--measurements', help="CSV of path,filament_mm3 rows from earlier slicer runs")
+    calibrate.add_argument('--config', default='config.ini')
+    calibrate.add_argument('--output', default=os.path.join(os.getenv('DATA_DIR', 'data'), 'mass_estimator.json'))
+    args = parser.parse_args()
+
+    if not args.corpus and not args.measurements:
+        parser.error("calibrate needs a corpus directory or --measurements")
+
+    estimator = MassEstimator(load_print_settings(args.config))
+    samples = _collect_samples(args)
+    report = estimator.fit(samples)
+
+    os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+    estimator.save(args.output, args.config)
+
+    print(f"coefficients: {json.dumps(estimator.coefficients)}")
+    print(f"samples: {report['samples']}")
+    print(f"mean absolute error: {report['mean_absolute_error_mm3']:.1f} mm3")
+    print(f"mean relative error: {report['mean_relative_error'] * 100:.1f}%")
+    print(f"max relative error: {report['max_relative_error'] * 100:.1f}%")
+    print(f"within 10%: {report['within_10_percent'] * 100:.0f}% of samples")
+    print(f"saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+import hashlib
+import logging
+import os
+import re
+import time
+import warnings
+from stl import mesh
+import numpy as np
+
+# Binary STL layout: 80 byte header, uint32 facet count, then 50 byte facet records
+BINARY_STL_HEADER_SIZE = 84
+BINARY_STL_DTYPE = np.dtype([
+    ('normal', '<f4', (3,)),
+    ('vectors', '<f4', (3, 3)),
+    ('attr', '<u2')
+])
+
+# Facets per chunk when streaming; 1M facets is ~50 MB of file and ~72 MB as float64
+DEFAULT_CHUNK_SIZE = 1_000_000
+
+
+def binary_stl_facet_count(filename):
+    """Facet count of a binary STL, or None if the file is not a well-formed binary STL"""
+    file_size = os.path.getsize(filename)
+    if file_size < BINARY_STL_HEADER_SIZE:
+        return None
+    with open(filename, 'rb') as f:
+        f.seek(80)
+        count = int(np.frombuffer(f.read(4), dtype='<u4')[0])
+    # ASCII files can start with anything, so the size check is what identifies binary STLs
+    if file_size != BINARY_STL_HEADER_SIZE + count * BINARY_STL_DTYPE.itemsize:
+        return None
+    return count
+
+
+def is_binary_stl(filename):
+    return binary_stl_facet_count(filename) is not None
+
+
+def open_binary_stl(filename, mode='r'):
+    """Memory-map the facet records of a binary STL as a structured array"""
+    count = binary_stl_facet_count(filename)
+    if count is None:
+        raise ValueError(f"Not a binary STL file: {filename}")
+    if count == 0:
+        return np.zeros(0, dtype=BINARY_STL_DTYPE)
+    return np.memmap(filename, dtype=BINARY_STL_DTYPE, mode=mode, offset=BINARY_STL_HEADER_SIZE, shape=(count,))
+
+
+def iter_triangle_chunks(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yield (n, 3, 3) vertex arrays of at most ``chunk_size`` facets from an STL file"""
+    if is_binary_stl(filename):
+        facets = open_binary_stl(filename)
+        for start in range(0, len(facets), chunk_size):
+            yield facets['vectors'][start:start + chunk_size]
+    else:
+        yield load_triangles(filename)
+
+
+def load_triangles(filename):
+    """Load an STL file as a (n, 3, 3) float array of triangle vertices
+
+    Binary STLs are memory-mapped instead of parsed, so no copy is made until
+    the caller touches the data.
+    """
+    if is_binary_stl(filename):
+        return open_binary_stl(filename)['vectors']
+    return mesh.Mesh.from_file(filename).vectors
+
+
+# Facets per chunk when fingerprinting; each facet takes ~250 bytes of temporaries while it is keyed
+FINGERPRINT_CHUNK_SIZE = 250_000
+
+_KEY_MULTIPLIER = np.uint64(0x100000001b3)
+_KEY_SEED = np.uint64(0xcbf29ce484222325)
+
+
+def _less(a, b):
+    """Row-wise lexicographic a < b for (n, 3) integer arrays"""
+    return (a[:, 0] < b[:, 0]) | ((a[:, 0] == b[:, 0]) & (
+        (a[:, 1] < b[:, 1]) | ((a[:, 1] == b[:, 1]) & (a[:, 2] < b[:, 2]))))
+
+
+def _triangle_keys(vectors, origin, quantum):
+    """64-bit key per triangle of quantized geometry, independent of which vertex the triangle starts at"""
+    quantized = np.round((np.asarray(vectors, dtype=np.float64).reshape(-1, 3, 3) - origin) / quantum).astype(np.int64)
+
+    # Rotate each triangle to start at its lexicographically smallest vertex, keeping its winding
+    first = np.zeros(len(quantized), dtype=np.int64)
+    for index in (1, 2):
+        smaller = _less(quantized[:, index], quantized[np.arange(len(quantized)), first])
+        first[smaller] = index
+    rotation = (first[:, None] + np.arange(3)) % 3
+    rotated = quantized[np.arange(len(quantized))[:, None], rotation].reshape(-1, 9).view(np.uint64)
+
+    # FNV-style multiply/xor over the nine coordinates, then a splitmix64 finalizer to spread the bits
+    keys = np.full(len(rotated), _KEY_SEED, dtype=np.uint64)
+    for column in range(9):
+        keys ^= rotated[:, column]
+        keys *= _KEY_MULTIPLIER
+    keys ^= keys >> np.uint64(31)
+    keys *= np.uint64(0xbf58476d1ce4e5b9)
+    keys ^= keys >> np.uint64(27)
+    return keys
+
+
+def _fingerprint_keys(keys, quantum):
+    keys.sort()
+    digest = hashlib.sha256()
+    digest.update(f"{len(keys)}:{quantum}".encode())
+    digest.update(keys.tobytes())
+    return digest.hexdigest()
+
+
+def geometry_fingerprint(vectors, quantum=0.01):
+    """Hash triangle geometry independently of file encoding, facet order and placement.
+
+    Coordinates are translated so the bounding box starts at the origin and
+    quantized to ``quantum`` mm. Each triangle is rotated to start at its
+    lexicographically smallest vertex (keeping its winding) and reduced to a
+    64-bit key, and the sorted keys are hashed, so ASCII/binary re-exports,
+    different headers, shuffled facets and moved models all hash the same.
+    """
+    start_time = time.time()
+    triangles = np.asarray(vectors).reshape(-1, 3, 3)
+    if len(triangles) == 0:
+        raise ValueError("Mesh has no triangles")
+
+    origin = triangles.reshape(-1, 3).min(axis=0).astype(np.float64)
+    fingerprint = _fingerprint_keys(_triangle_keys(triangles, origin, quantum), quantum)
+    logging.info(f"[GEOMETRY_HASH] Fingerprinted {len(triangles)} triangles in {time.time() - start_time:.3f}s: "
+                 f"{fingerprint[:16]}...")
+    return fingerprint
+
+
+def file_geometry_fingerprint(filename, quantum=0.01, chunk_size=FINGERPRINT_CHUNK_SIZE):
+    """geometry_fingerprint of an STL file, keyed chunk by chunk so only 8 bytes per facet stay in memory"""
+    start_time = time.time()
+    origin = None
+    for chunk in iter_triangle_chunks(filename, chunk_size):
+        if len(chunk):
+            chunk_min = chunk.reshape(-1, 3).min(axis=0).astype(np.float64)
+            origin = chunk_min if origin is None else np.minimum(origin, chunk_min)
+    if origin is None:
+        raise ValueError("Mesh has no triangles")
+
+    keys = np.concatenate([_triangle_keys(chunk, origin, quantum)
+                           for chunk in iter_triangle_chunks(filename, chunk_size)])
+    fingerprint = _fingerprint_keys(keys, quantum)
+    logging.info(f"[GEOMETRY_HASH] Fingerprinted {len(keys)} triangles from {filename} "
+                 f"in {time.time() - start_time:.3f}s: {fingerprint[:16]}...")
+    return fingerprint
+
+
+class _MeshStatsAccumulator:
+    """Running totals for mesh_stats, so large meshes can be measured chunk by chunk"""
+
+    def __init__(self):
+        self.triangle_count = 0
+        self.nonfinite_triangles = 0
+        self.degenerate_triangles = 0
+        self.signed_volume = 0.0
+        self.surface_area = 0.0
+        self.top_area = 0.0
+        self.bottom_area = 0.0
+        self.side_area = 0.0
+        self.bbox_min = np.full(3, np.inf)
+        self.bbox_max = np.full(3, -np.inf)
+
+    def add(self, vectors):
+        triangles = np.asarray(vectors, dtype=np.float64).reshape(-1, 3, 3)
+        self.triangle_count += len(triangles)
+
+        finite = np.isfinite(triangles).all(axis=(1, 2))
+        if not finite.all():
+            self.nonfinite_triangles += int((~finite).sum())
+            triangles = triangles[finite]
+        if len(triangles) == 0:
+            return
+
+        v0, v1, v2 = triangles[:, 0], triangles[:, 1], triangles[:, 2]
+        self.signed_volume += np.einsum('ij,ij->', v0, np.cross(v1, v2)) / 6.0
+        face_normals = np.cross(v1 - v0, v2 - v0)
+        face_areas = 0.5 * np.linalg.norm(face_normals, axis=1)
+        self.surface_area += face_areas.sum()
+        self.degenerate_triangles += int((face_areas <= 1e-12).sum())
+
+        # Split the area by facet orientation: the z component of the area vector is the
+        # horizontally projected area (top/bottom skins), the rest is wall area for perimeters
+        projected_z = 0.5 * face_normals[:, 2]
+        self.top_area += projected_z[projected_z > 0].sum()
+        self.bottom_area += -projected_z[projected_z < 0].sum()
+        self.side_area += np.sqrt(np.maximum(face_areas ** 2 - projected_z ** 2, 0)).sum()
+
+        points = triangles.reshape(-1, 3)
+        self.bbox_min = np.minimum(self.bbox_min, points.min(axis=0))
+        self.bbox_max = np.maximum(self.bbox_max, points.max(axis=0))
+
+    def result(self):
+        if self.triangle_count - self.nonfinite_triangles == 0:
+            raise ValueError("Mesh has no triangles")
+
+        size = self.bbox_max - self.bbox_min
+        return {
+            "triangle_count": self.triangle_count,
+            "volume": abs(float(self.signed_volume)),
+            "signed_volume": float(self.signed_volume),
+            "surface_area": float(self.surface_area),
+            "top_area": float(self.top_area),
+            "bottom_area": float(self.bottom_area),
+            "side_area": float(self.side_area),
+            "bbox_min": self.bbox_min.tolist(),
+            "bbox_max": self.bbox_max.tolist(),
+            "size_x": float(size[0]),
+            "size_y": float(size[1]),
+            "size_z": float(size[2]),
+            "nonfinite_triangles": self.nonfinite_triangles,
+            "degenerate_triangles": self.degenerate_triangles,
+            "valid": self.nonfinite_triangles == 0
+        }
+
+
+def mesh_stats(vectors):
+    """Vectorized volume, surface area, bounding box and triangle count of a triangle soup.
+
+    Volume is the sum of signed tetrahedra spanned by each facet and the
+    origin, which is exact for closed meshes regardless of placement.
+    """
+    accumulator = _MeshStatsAccumulator()
+    accumulator.add(vectors)
+    return accumulator.result()
+
+
+def read_mesh_stats(filename, chunk_size=DEFAULT_CHUNK_SIZE):
+    """mesh_stats for an STL file, streaming binary STLs in fixed-size chunks so memory stays flat"""
+    start_time = time.time()
+    accumulator = _MeshStatsAccumulator()
+    for chunk in iter_triangle_chunks(filename, chunk_size):
+        accumulator.add(chunk)
+    stats = accumulator.result()
+    logging.info(f"[MESH_STATS] Measured {stats['triangle_count']} triangles from {filename} in "
+                 f"{time.time() - start_time:.3f}s")
+    return stats
+
+
+def scale_binary_stl_in_place(filename, scale_factor, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Uniformly scale a binary STL by rewriting its vertex floats through a writable memory map
+
+    A uniform positive scale leaves unit normals unchanged, so normals are
+    only touched when they are missing (all zero), in which case they are
+    recomputed from the scaled vertices.
+    """
+    if scale_factor <= 0:
+        raise ValueError(f"Scale factor must be positive, got {scale_factor}")
+
+    facets = open_binary_stl(filename, mode='r+')
+    for start in range(0, len(facets), chunk_size):
+        chunk = facets[start:start + chunk_size]
+        vectors = chunk['vectors']
+        vectors *= np.float32(scale_factor)
+        chunk['vectors'] = vectors
+
+        normals = chunk['normal']
+        missing = ~normals.any(axis=1)
+        if missing.any():
+            v = vectors[missing].astype(np.float64)
+            computed = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+            lengths = np.linalg.norm(computed, axis=1, keepdims=True)
+            normals[missing] = (computed / np.where(lengths > 0, lengths, 1)).astype(np.float32)
+            chunk['normal'] = normals
+
+    if isinstance(facets, np.memmap):
+        facets.flush()
+    del facets
+
+
+class BinaryStlWriter:
+    """Write a binary STL incrementally; the facet count is patched into the header on close"""
+
+    def __init__(self, filename, header=b'Binary STL written by mandarin3d-slicing-service'):
+        self.filename = filename
+        self.count = 0
+        self._file = open(filename, 'wb')
+        self._file.write(header[:80].ljust(80, b' '))
+        self._file.write(np.zeros(1, dtype='<u4').tobytes())
+
+    def write(self, vectors, normals=None):
+        """Append (n, 3, 3) triangles, computing unit normals when none are given"""
+        vectors = np.asarray(vectors).reshape(-1, 3, 3)
+        if len(vectors) == 0:
+            return
+        if normals is None:
+            v = vectors.astype(np.float64)
+            normals = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+            lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+            normals = normals / np.where(lengths > 0, lengths, 1)
+
+        records = np.zeros(len(vectors), dtype=BINARY_STL_DTYPE)
+        records['normal'] = normals
+        records['vectors'] = vectors
+        self._file.write(records.tobytes())
+        self.count += len(vectors)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.seek(80)
+        self._file.write(np.array([self.count], dtype='<u4').tobytes())
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Everything in an ASCII STL facet except the 12 numbers (normal + 3 vertices). The
+# solid/endsolid lines (which may carry a name) are cut first, leaving the 'end' of
+# 'endsolid' for the keyword pass; a literal-prefix pattern keeps the regex scan fast
+_ASCII_STL_SOLID_LINE = re.compile(rb'solid[^\n]*')
+_ASCII_STL_KEYWORDS = (b'endfacet', b'endloop', b'facet', b'normal', b'outer', b'loop', b'vertex', b'end')
+
+
+def _parse_ascii_facets(text):
+    """Parse a block of complete ASCII STL facets into (normals, vectors) without per-line Python objects"""
+    text = _ASCII_STL_SOLID_LINE.sub(b' ', text.lower().replace(b'\x00', b' '))
+    for keyword in _ASCII_STL_KEYWORDS:
+        text = text.replace(keyword, b' ')
+    text = text.strip()
+    if not text:
+        return np.zeros((0, 3), dtype=np.float32), np.zeros((0, 3, 3), dtype=np.float32)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        values = np.fromstring(text, dtype=np.float32, sep=' ')
+    if len(values) % 12:
+        raise ValueError(f"Malformed ASCII STL: {len(values)} numbers is not a whole number of facets")
+
+    facets = values.reshape(-1, 12)
+    return facets[:, :3], facets[:, 3:].reshape(-1, 3, 3)
+
+
+def ascii_stl_to_binary(filename, output_filename, block_size=16 * 1024 * 1024):
+    """Convert an ASCII STL to binary, streaming the input in blocks of whole facets
+
+    Returns the facet count, input/output sizes and parse time.
+    """
+    start_time = time.time()
+    try:
+        with open(filename, 'rb') as src, BinaryStlWriter(output_filename) as writer:
+            carry = b''
+            while True:
+                block = src.read(block_size)
+                data = carry + block
+                if not block:
+                    if data.strip():
+                        normals, vectors = _parse_ascii_facets(data)
+                        writer.write(vectors, normals)
+                    break
+
+                # Only parse up to the last complete facet, keep the remainder for the next block
+                end = data.lower().rfind(b'endfacet')
+                if end < 0:
+                    carry = data
+                    continue
+                end += len(b'endfacet')
+                normals, vectors = _parse_ascii_facets(data[:end])
+                writer.write(vectors, normals)
+                carry = data[end:]
+
+        if writer.count == 0:
+            raise ValueError("No facets found in ASCII STL")
+    except Exception:
+        if os.path.exists(output_filename):
+            os.remove(output_filename)
+        raise
+
+    input_bytes = os.path.getsize(filename)
+    output_bytes = os.path.getsize(output_filename)
+    parse_time = time.time() - start_time
+    logging.info(f"[ASCII_STL] Converted {writer.count} facets to binary in {parse_time:.3f}s: {input_bytes} -> "
+                 f"{output_bytes} bytes")
+    return {
+        "triangle_count": writer.count,
+        "input_bytes": input_bytes,
+        "output_bytes": output_bytes,
+        "bytes_saved": input_bytes - output_bytes,
+        "parse_time": parse_time
+    }
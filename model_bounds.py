@@ -0,0 +1,142 @@
+import logging
+import re
+import time
+import zipfile
+import numpy as np
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+# Millimeters per model unit, as declared by 3MF <model unit> and AMF <amf unit>
+UNIT_SCALE = {
+    'micron': 0.001,
+    'millimeter': 1.0,
+    'centimeter': 10.0,
+    'inch': 25.4,
+    'foot': 304.8,
+    'meter': 1000.0
+}
+
+_OBJ_VERTEX = re.compile(rb'^[ \t]*v[ \t]+(\S+)[ \t]+(\S+)[ \t]+(\S+)', re.M)
+_OBJ_FACE = re.compile(rb'^[ \t]*f[ \t]+([^\r\n]*)', re.M)
+_XML_UNIT = re.compile(rb'<(?:\w+:)?(?:model|amf)\b[^>]*\bunit="([^"]+)"')
+_3MF_VERTEX = re.compile(rb'<(?:\w+:)?vertex\b[^>]*>')
+_3MF_ATTRIBUTES = tuple(re.compile(rb'\b' + axis + rb'="([^"]+)"') for axis in (b'x', b'y', b'z'))
+_AMF_COORDINATES = tuple(re.compile(rb'<' + axis + rb'>([^<]+)</' + axis + rb'>') for axis in (b'x', b'y', b'z'))
+_TRIANGLE = re.compile(rb'<(?:\w+:)?triangle\b')
+
+
+class _BoundsAccumulator:
+    """Running bounding box and triangle count over blocks of vertex coordinates"""
+
+    def __init__(self):
+        self.bbox_min = np.full(3, np.inf)
+        self.bbox_max = np.full(3, -np.inf)
+        self.triangle_count = 0
+
+    def add(self, xs, ys, zs):
+        if not xs:
+            return
+        points = np.column_stack([np.array(column, dtype=np.float64) for column in (xs, ys, zs)])
+        points = points[np.isfinite(points).all(axis=1)]
+        if len(points):
+            self.bbox_min = np.minimum(self.bbox_min, points.min(axis=0))
+            self.bbox_max = np.maximum(self.bbox_max, points.max(axis=0))
+
+
+def _blocks(stream, delimiters):
+    """Yield chunks of ``stream`` ending right after one of ``delimiters``, so no record spans two chunks"""
+    carry = b''
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            if carry:
+                yield carry
+            return
+        data = carry + chunk
+        cut = max(data.rfind(delimiter) + len(delimiter) if delimiter in data else 0 for delimiter in delimiters)
+        if cut == 0:
+            carry = data
+            continue
+        carry = data[cut:]
+        yield data[:cut]
+
+
+def _scan_obj(stream, bounds):
+    for block in _blocks(stream, (b'\n',)):
+        vertices = _OBJ_VERTEX.findall(block)
+        bounds.add([v[0] for v in vertices], [v[1] for v in vertices], [v[2] for v in vertices])
+        # Polygons are fanned into len - 2 triangles, so the count is the total corners less two per face
+        faces = _OBJ_FACE.findall(block)
+        bounds.triangle_count += len(b' '.join(faces).split()) - 2 * len(faces)
+    return 1.0
+
+
+def _scan_xml(stream, bounds, amf):
+    unit = None
+    # An AMF vertex spans several elements, a 3MF vertex is one tag
+    for block in _blocks(stream, (b'</vertex>', b'</triangle>') if amf else (b'>',)):
+        if unit is None:
+            match = _XML_UNIT.search(block)
+            if match:
+                unit = match.group(1).decode('ascii', 'replace').lower()
+        if amf:
+            coordinates = [pattern.findall(block) for pattern in _AMF_COORDINATES]
+        else:
+            tags = b' '.join(_3MF_VERTEX.findall(block))
+            coordinates = [pattern.findall(tags) for pattern in _3MF_ATTRIBUTES]
+        if len({len(column) for column in coordinates}) != 1:
+            raise ValueError("Vertex with missing coordinates")
+        bounds.add(*coordinates)
+        bounds.triangle_count += len(_TRIANGLE.findall(block))
+    if unit is not None and unit not in UNIT_SCALE:
+        raise ValueError(f"Unknown model unit: {unit}")
+    return UNIT_SCALE.get(unit, 1.0)
+
+
+def read_bounds(filename):
+    """Bounding box size in mm and triangle count of an OBJ, 3MF or AMF file, read without building a mesh
+
+    Coordinates are scanned with regular expressions in fixed-size chunks and
+    converted with the file's declared unit. 3MF component and build
+    transforms are not applied, so the size is that of the untransformed
+    vertices. Raises ValueError when no vertices are found.
+    """
+    start_time = time.time()
+    extension = filename.lower().rsplit('.', 1)[-1]
+    bounds = _BoundsAccumulator()
+
+    if extension == 'obj':
+        with open(filename, 'rb') as f:
+            unit_scale = _scan_obj(f, bounds)
+    elif extension in ('3mf', 'amf'):
+        unit_scale = 1.0
+        if zipfile.is_zipfile(filename):
+            with zipfile.ZipFile(filename) as archive:
+                if extension == '3mf':
+                    members = [name for name in archive.namelist() if name.lower().endswith('.model')]
+                else:
+                    members = [info.filename for info in archive.infolist() if not info.is_dir()][:1]
+                for member in members:
+                    with archive.open(member) as stream:
+                        unit_scale = _scan_xml(stream, bounds, amf=extension == 'amf')
+        elif extension == 'amf':
+            with open(filename, 'rb') as f:
+                unit_scale = _scan_xml(f, bounds, amf=True)
+        else:
+            raise ValueError("3MF file is not a zip archive")
+    else:
+        raise ValueError(f"Unsupported format for bounds: .{extension}")
+
+    if not np.isfinite(bounds.bbox_min).all():
+        raise ValueError("No vertices found")
+
+    size = ((bounds.bbox_max - bounds.bbox_min) * unit_scale).tolist()
+    logging.info(f"[MODEL_BOUNDS] {filename}: {size[0]:.4f}x{size[1]:.4f}x{size[2]:.4f}mm, "
+                 f"{bounds.triangle_count} triangles, read in {time.time() - start_time:.3f}s")
+    return {
+        "size_x": size[0],
+        "size_y": size[1],
+        "size_z": size[2],
+        "unit_scale": unit_scale,
+        "triangle_count": bounds.triangle_count
+    }
@@ -3,9 +3,11 @@ import re
 import os
 import logging
 import random
+import shutil
 import time
 from stl import mesh
 import numpy as np
+import meshtools
 
 # Configure logging for printslicer module if not already configured
 if not logging.getLogger().handlers:
@@ -15,6 +17,34 @@ if not logging.getLogger().handlers:
         datefmt='%Y-%m-%d %H:%M:%S'
     )
 
+# Set by the service to a display_pool.DisplayPool; without one SuperSlicer runs under xvfb-run
+display_pool = None
+
+def run_superslicer(args, timeout=240):
+    """Run ./slicersuper with ``args`` on an X display from ``display_pool`` and return the CompletedProcess"""
+    command = ['./slicersuper'] + list(args)
+    if display_pool is None:
+        return subprocess.run(['xvfb-run', '-a'] + command, capture_output=True, text=True, timeout=timeout)
+    
+    with display_pool.command(command) as (wrapped_command, env, report):
+        if env is not None:
+            logging.info(f"[SLICER] Running with DISPLAY={env.get('DISPLAY', '(headless)')}")
+        result = subprocess.run(wrapped_command, capture_output=True, text=True, timeout=timeout, env=env)
+        report(result.stderr)
+    return result
+
+def write_test_cube(filename, size=10.0):
+    """Write a closed ``size`` mm cube as binary STL, used to probe the slicer"""
+    corners = np.array([[x, y, z] for x in (0, size) for y in (0, size) for z in (0, size)], dtype=np.float32)
+    faces = np.array([
+        [0, 2, 1], [1, 2, 3], [4, 5, 6], [5, 7, 6],
+        [0, 1, 4], [1, 5, 4], [2, 6, 3], [3, 6, 7],
+        [0, 4, 2], [2, 4, 6], [1, 3, 5], [3, 7, 5]
+    ])
+    with meshtools.BinaryStlWriter(filename) as writer:
+        writer.write(corners[faces[:, ::-1]])
+    return filename
+
 def scale_stl(filename, scale_factor, output_filename):
     """Scale STL file by given factor"""
     logging.info(f"[SCALE_STL] Starting STL scaling: {filename} -> {output_filename}")
@@ -28,18 +58,26 @@ def scale_stl(filename, scale_factor, output_filename):
         input_size = os.path.getsize(filename)
         logging.info(f"[SCALE_STL] Input file size: {input_size} bytes")
         
-        # Load the STL file
-        logging.info(f"[SCALE_STL] Loading STL mesh from: {filename}")
-        your_mesh = mesh.Mesh.from_file(filename)
-        logging.info(f"[SCALE_STL] Loaded mesh with {len(your_mesh.vectors)} faces")
-        
-        # Scale the mesh
-        logging.info(f"[SCALE_STL] Applying scale factor: {scale_factor}")
-        your_mesh.vectors *= scale_factor
-        
-        # Save the scaled mesh
-        logging.info(f"[SCALE_STL] Saving scaled mesh to: {output_filename}")
-        your_mesh.save(output_filename)
+        if meshtools.is_binary_stl(filename):
+            # Rewrite the vertex floats in place through a memory map instead of loading and re-saving the mesh
+            if not (os.path.exists(output_filename) and os.path.samefile(filename, output_filename)):
+                logging.info(f"[SCALE_STL] Copying binary STL to: {output_filename}")
+                shutil.copyfile(filename, output_filename)
+            logging.info(f"[SCALE_STL] Binary STL detected, scaling in place via memory map")
+            meshtools.scale_binary_stl_in_place(output_filename, scale_factor)
+        else:
+            # Load the STL file
+            logging.info(f"[SCALE_STL] Loading STL mesh from: {filename}")
+            your_mesh = mesh.Mesh.from_file(filename)
+            logging.info(f"[SCALE_STL] Loaded mesh with {len(your_mesh.vectors)} faces")
+            
+            # Scale the mesh
+            logging.info(f"[SCALE_STL] Applying scale factor: {scale_factor}")
+            your_mesh.vectors *= scale_factor
+            
+            # Save the scaled mesh
+            logging.info(f"[SCALE_STL] Saving scaled mesh to: {output_filename}")
+            your_mesh.save(output_filename)
         
         # Verify output
         if os.path.exists(output_filename):
@@ -56,7 +94,8 @@ def scale_stl(filename, scale_factor, output_filename):
 # Printslicer module initialization
 logging.info(f"[PRINTSLICER_INIT] Printslicer module loaded")
 logging.info(f"[PRINTSLICER_INIT] Working directory: {os.getcwd()}")
-logging.info(f"[PRINTSLICER_INIT] Available functions: scale_stl, get_mass, run_slicer_command_and_extract_info")
+logging.info("[PRINTSLICER_INIT] Available functions: run_superslicer, write_test_cube, scale_stl, get_mass, "
+             "analyze_stl, preflight_check, measure_filament_volume, run_slicer_command_and_extract_info")
 
 
 def get_mass(filename):
@@ -183,6 +222,167 @@ def get_mass(filename):
     return response
 
 
+def analyze_stl(directory_to_stl):
+    """Compute volume, mass and dimensions directly from the STL mesh without slicing"""
+    logging.info(f"[ANALYZE] ===== STARTING FAST MESH ANALYSIS =====")
+    logging.info(f"[ANALYZE] Input file: {directory_to_stl}")
+    
+    start_time = time.time()
+    
+    if not os.path.exists(directory_to_stl):
+        logging.error(f"[ANALYZE] Input STL file not found: {directory_to_stl}")
+        return {"status": 400, "error": "Input STL file not found"}
+    
+    try:
+        stats = meshtools.read_mesh_stats(directory_to_stl)
+    except Exception as e:
+        logging.error(f"[ANALYZE] Failed to analyze mesh: {str(e)}")
+        logging.error(f"[ANALYZE] Exception type: {type(e).__name__}")
+        return {"status": 400, "error": f"Failed to analyze mesh: {str(e)}"}
+    
+    # Same mass model as the slicer path: PLA with density 1.25 g/cm³
+    mass = stats['volume'] / 1000 * 1.25
+    
+    total_time = time.time() - start_time
+    logging.info(f"[ANALYZE] {stats['triangle_count']} triangles, volume={stats['volume']:.2f}mm³, "
+                 f"area={stats['surface_area']:.2f}mm², "
+                 f"size={stats['size_x']:.2f}×{stats['size_y']:.2f}×{stats['size_z']:.2f}mm")
+    logging.info(f"[ANALYZE] Calculated mass: {mass:.2f}g (using PLA density 1.25 g/cm³)")
+    logging.info(f"[ANALYZE] ===== FAST MESH ANALYSIS COMPLETED in {total_time:.3f}s =====")
+    
+    return {
+        "status": 200,
+        "mass": mass,
+        "size_x": stats['size_x'],
+        "size_y": stats['size_y'],
+        "size_z": stats['size_z'],
+        "volume": stats['volume'],
+        "surface_area": stats['surface_area'],
+        "top_area": stats['top_area'],
+        "bottom_area": stats['bottom_area'],
+        "side_area": stats['side_area'],
+        "triangle_count": stats['triangle_count']
+    }
+
+
+# Largest extent below which a model is read as meters; in inches it would be under 0.25 mm
+METER_MAX_EXTENT = 0.01
+
+
+def detect_unit_scale(size, max_dimensions, min_extent_mm=0.4):
+    """Guess the factor that converts a model's units to millimeters from its extents
+    
+    Models whose largest extent is below ``min_extent_mm`` are too small to
+    slice and are assumed to be in inches, like the slicer's no-extrusions
+    retry; only extents below METER_MAX_EXTENT are taken to be meters. The
+    factor is only used if the scaled model fits within ``max_dimensions``.
+    """
+    max_extent = max(size)
+    if max_extent <= 0 or max_extent >= min_extent_mm:
+        return 1.0
+    
+    factor = 1000.0 if max_extent < METER_MAX_EXTENT else 25.4
+    if all(extent * factor <= max_dimensions[axis] for extent, axis in zip(size, 'xyz')):
+        return factor
+    return 1.0
+
+
+def preflight_check(directory_to_stl, max_dimensions, min_extent_mm=0.4):
+    """Read the bounding box before slicing: fix inch/meter units and flag oversized models
+    
+    Returns a slicer-shaped response with the (possibly rescaled) dimensions,
+    the applied ``scale_factor`` and ``fits`` telling whether the model is
+    within ``max_dimensions``.
+    """
+    logging.info(f"[PREFLIGHT] ===== STARTING PRE-FLIGHT CHECK =====")
+    logging.info(f"[PREFLIGHT] Input file: {directory_to_stl}")
+    
+    start_time = time.time()
+    
+    try:
+        stats = meshtools.read_mesh_stats(directory_to_stl)
+    except Exception as e:
+        logging.error(f"[PREFLIGHT] Failed to read mesh bounding box: {str(e)}")
+        logging.error(f"[PREFLIGHT] Exception type: {type(e).__name__}")
+        return {"status": 400, "error": f"Failed to read mesh: {str(e)}"}
+    
+    size = [stats['size_x'], stats['size_y'], stats['size_z']]
+    logging.info(f"[PREFLIGHT] Model extents: {size[0]:.4f}x{size[1]:.4f}x{size[2]:.4f}, "
+                 f"{stats['triangle_count']} triangles")
+    if not stats['valid']:
+        logging.warning(f"[PREFLIGHT] Mesh has {stats['nonfinite_triangles']} triangles with non-finite coordinates, "
+                        "ignored for the bounding box")
+    if stats['degenerate_triangles']:
+        logging.info(f"[PREFLIGHT] Mesh has {stats['degenerate_triangles']} degenerate triangles")
+    
+    scale_factor = detect_unit_scale(size, max_dimensions, min_extent_mm)
+    if scale_factor != 1.0:
+        unit = 'meters' if scale_factor == 1000.0 else 'inches'
+        logging.info(f"[PREFLIGHT] Model looks like it was exported in {unit}, scaling by {scale_factor}")
+        try:
+            scale_stl(directory_to_stl, scale_factor, directory_to_stl)
+        except Exception as e:
+            return {"status": 400, "error": f"Failed to scale STL file: {str(e)}"}
+        size = [extent * scale_factor for extent in size]
+    
+    fits = all(extent <= max_dimensions[axis] for extent, axis in zip(size, 'xyz'))
+    
+    logging.info(f"[PREFLIGHT] Final dimensions: {size[0]:.2f}x{size[1]:.2f}x{size[2]:.2f}mm, fits: {fits}")
+    logging.info(f"[PREFLIGHT] ===== PRE-FLIGHT CHECK COMPLETED in {time.time() - start_time:.3f}s =====")
+    
+    return {
+        "status": 200,
+        "size_x": size[0],
+        "size_y": size[1],
+        "size_z": size[2],
+        "scale_factor": scale_factor,
+        "triangle_count": stats['triangle_count'],
+        "fits": fits
+    }
+
+
+def measure_filament_volume(directory_to_stl, config_path='config.ini'):
+    """Slice an STL with ``config_path`` and read the extruded filament volume from the G-code"""
+    logging.info(f"[FILAMENT] Measuring filament usage for: {directory_to_stl} with {config_path}")
+    
+    start_time = time.time()
+    gcode_file = f'{os.urandom(24).hex()}.gcode'
+    command = ['--load', config_path, '--export-gcode', '-o', gcode_file, directory_to_stl]
+    logging.info(f"[FILAMENT] SuperSlicer arguments: {' '.join(command)}")
+    
+    try:
+        result = run_superslicer(command)
+        logging.info(f"[FILAMENT] SuperSlicer completed in {time.time() - start_time:.2f}s with return code "
+                     f"{result.returncode}")
+        
+        if not os.path.exists(gcode_file):
+            logging.error(f"[FILAMENT] G-code file was not created: {result.stderr[:1000]}")
+            return {"status": 400, "error": "G-code file was not created"}
+        
+        with open(gcode_file, 'r', errors='replace') as f:
+            gcode = f.read()
+    except subprocess.TimeoutExpired:
+        logging.error(f"[FILAMENT] Command timed out after {time.time() - start_time:.2f}s")
+        return {"status": 400, "error": "Slicer command timed out."}
+    finally:
+        if os.path.exists(gcode_file):
+            os.remove(gcode_file)
+    
+    # SuperSlicer writes e.g. "; filament used [cm3] = 12.34" into the G-code footer
+    mm3_match = re.search(r"; filament used \[mm3\] = (\d+\.?\d*)", gcode)
+    cm3_match = re.search(r"; filament used \[cm3\] = (\d+\.?\d*)", gcode)
+    if mm3_match:
+        filament_volume = float(mm3_match.group(1))
+    elif cm3_match:
+        filament_volume = float(cm3_match.group(1)) * 1000
+    else:
+        logging.error(f"[FILAMENT] Filament usage not found in G-code")
+        return {"status": 400, "error": "Filament usage not found in G-code"}
+    
+    logging.info(f"[FILAMENT] Filament used: {filament_volume:.2f}mm³")
+    return {"status": 200, "filament_volume": filament_volume}
+
+
 def run_slicer_command_and_extract_info(directory_to_stl, filename):
     """Run SuperSlicer command and extract slicing information"""
     logging.info(f"[SLICER] ===== STARTING SLICER ANALYSIS =====")
@@ -229,13 +429,13 @@ def run_slicer_command_and_extract_info(directory_to_stl, filename):
     logging.info(f"[SLICER] Generated temp G-code filename: {gcode_file}")
     
     # Build command
-    command = ['xvfb-run', '-a', './slicersuper', '--load', 'config.ini', '--export-gcode', '-o', gcode_file, directory_to_stl, '--info']
+    command = ['--load', 'config.ini', '--export-gcode', '-o', gcode_file, directory_to_stl, '--info']
     command_str = ' '.join(command)
-    logging.info(f"[SLICER] Command to execute: {command_str}")
+    logging.info(f"[SLICER] SuperSlicer arguments: {command_str}")
     
     try:
         logging.info(f"[SLICER] Starting SuperSlicer subprocess with 240s timeout...")
-        result = subprocess.run(command, capture_output=True, text=True, timeout=240)
+        result = run_superslicer(command)
         
         execution_time = time.time() - start_time
         logging.info(f"[SLICER] SuperSlicer completed in {execution_time:.2f}s")
@@ -292,6 +492,14 @@ def run_slicer_command_and_extract_info(directory_to_stl, filename):
     if "No extrusions were generated for objects." in result.stderr:
         logging.warning(f"[SLICER] {filename} - No extrusions were generated for objects")
         logging.info(f"[SLICER] This usually means the model is too small, likely created in inches")
+        if not directory_to_stl.lower().endswith('.stl'):
+            # scale_stl only reads STL; a natively sliced OBJ/3MF/AMF is converted and unit-checked instead
+            if os.path.exists(gcode_file):
+                os.remove(gcode_file)
+            return {
+                "status": 400,
+                "error": "No extrusions were generated for objects."
+            }
         logging.info(f"[SLICER] Attempting to scale by factor 25.4 (inches to mm)...")
         
         try:
@@ -307,15 +515,15 @@ def run_slicer_command_and_extract_info(directory_to_stl, filename):
                 "error": f"Failed to scale STL file: {str(e)}"
             }
         
-        # Retry slicing with scaled model (without --load config.ini this time)
-        retry_command = ['xvfb-run', '-a', './slicersuper', '--export-gcode', '-o', gcode_file, directory_to_stl, '--info']
+        # Retry slicing with scaled model and the same config
+        retry_command = ['--load', 'config.ini', '--export-gcode', '-o', gcode_file, directory_to_stl, '--info']
         retry_command_str = ' '.join(retry_command)
-        logging.info(f"[SLICER] Retry command after scaling: {retry_command_str}")
+        logging.info(f"[SLICER] Retry arguments after scaling: {retry_command_str}")
         
         try:
             logging.info(f"[SLICER] Retrying SuperSlicer with scaled model...")
             retry_start_time = time.time()
-            result = subprocess.run(retry_command, capture_output=True, text=True, timeout=240)
+            result = run_superslicer(retry_command)
             retry_time = time.time() - retry_start_time
             
             logging.info(f"[SLICER] Retry completed in {retry_time:.2f}s")
@@ -398,6 +606,8 @@ def run_slicer_command_and_extract_info(directory_to_stl, filename):
         response['size_x'] = size_x
         response['size_y'] = size_y
         response['size_z'] = size_z
+        # --info prints one block per object; only the first is used above
+        response['object_count'] = len(re.findall(volume_pattern, result.stdout))
         
         total_time = time.time() - start_time
         logging.info(f"[SLICER] ===== SLICER ANALYSIS SUCCESSFUL =====")
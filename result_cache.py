@@ -0,0 +1,110 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def config_namespace(config_path, version):
+    """Short key prefix identifying a slicer config and service version"""
+    return hashlib.sha256(f"{hash_file(config_path)}:{version}".encode()).hexdigest()[:16]
+
+
+class ResultCache:
+    """Persistent SQLite cache of slicer results.
+
+    Keys combine a content hash with a namespace derived from the slicer
+    config and service version, so changing either invalidates every entry.
+    Entries older than ``max_age`` seconds are dropped and the least recently
+    used entries are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, db_path, config_path, version, max_entries, max_age):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.namespace = config_namespace(config_path, version)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS results_accessed_at ON results (accessed_at)")
+
+        logging.info(f"[RESULT_CACHE] Cache ready at {db_path} (namespace {self.namespace}, "
+                     f"max {max_entries} entries, max age {max_age / 86400:.1f} days)")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def make_key(self, content_hash):
+        return f"{self.namespace}:{content_hash}"
+
+    def get(self, key):
+        """Return the cached slicer response for ``key``, or None"""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT payload, created_at FROM results WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] <= self.max_age:
+                conn.execute("UPDATE results SET accessed_at = ? WHERE key = ?", (now, key))
+            else:
+                row = None
+
+        with self._lock:
+            if row:
+                self._hits += 1
+            else:
+                self._misses += 1
+
+        if row is None:
+            logging.info(f"[RESULT_CACHE] Miss for {key}")
+            return None
+        logging.info(f"[RESULT_CACHE] Hit for {key}")
+        return json.loads(row[0])
+
+    def put(self, key, response):
+        """Store a slicer response and evict expired or excess entries"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO results (key, payload, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(response), now, now)
+            )
+            conn.execute("DELETE FROM results WHERE created_at < ?", (now - self.max_age,))
+            conn.execute("""
+                DELETE FROM results WHERE key IN (
+                    SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+        logging.info(f"[RESULT_CACHE] Stored result for {key}")
+
+    def stats(self):
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        with self._lock:
+            return {
+                "entries": entries,
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "misses": self._misses
+            }
@@ -0,0 +1,107 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import textwrap
+import time
+import uuid
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MAX_DIMENSIONS = {"x": 200, "y": 200, "z": 200}
+
+# The slicer is replaced before app is imported, so the resume thread started at import already sees it
+FIRST_RUN = textwrap.dedent("""
+    import sys, time
+    import printslicer
+
+    def hang(path, filename):
+        with open(sys.argv[1], 'w') as f:
+            f.write(path)
+        time.sleep(600)
+
+    printslicer.run_slicer_command_and_extract_info = hang
+    import app
+
+    job_id = app.jobs.create(sys.argv[2], None, 'resume-test', {max_dimensions}, 'full')
+    app.job_executor.submit(app.run_job, sys.argv[2], None, 'resume-test', {max_dimensions}, 'full', job_id)
+    with open(sys.argv[3], 'w') as f:
+        f.write(job_id)
+    time.sleep(600)
+""").format(max_dimensions=MAX_DIMENSIONS)
+
+SECOND_RUN = textwrap.dedent("""
+    import json, sys, time
+    import printslicer
+
+    sliced = []
+
+    def fake_slice(path, filename):
+        sliced.append(path)
+        return {"status": 200, "mass": 1.25, "size_x": 10.0, "size_y": 10.0, "size_z": 10.0, "object_count": 1}
+
+    printslicer.run_slicer_command_and_extract_info = fake_slice
+    import app
+
+    deadline = time.time() + 120
+    job = app.jobs.get(sys.argv[1])
+    while job['state'] not in ('completed', 'failed') and time.time() < deadline:
+        time.sleep(0.2)
+        job = app.jobs.get(sys.argv[1])
+    with open(sys.argv[2], 'w') as f:
+        json.dump({"job": job, "sliced": sliced}, f)
+    app.converter_pool.shutdown()
+""")
+
+
+def write_cube_off(path, size=10.0):
+    """A cube in OFF, which SuperSlicer cannot read, so the job has to convert it to STL first"""
+    corners = [(x, y, z) for x in (0, size) for y in (0, size) for z in (0, size)]
+    faces = [(0, 1, 3, 2), (4, 6, 7, 5), (0, 4, 5, 1), (2, 3, 7, 6), (0, 2, 6, 4), (1, 5, 7, 3)]
+    with open(path, 'w') as f:
+        f.write(f"OFF\n{len(corners)} {len(faces)} 0\n")
+        for corner in corners:
+            f.write("{} {} {}\n".format(*corner))
+        for face in faces:
+            f.write("4 {} {} {} {}\n".format(*face))
+
+
+def test_converted_job_resumes_after_kill_mid_slice(tmp_path):
+    env = dict(os.environ, DATA_DIR=str(tmp_path / 'data'), SLICER_DISPLAY_MODE='xvfb-run')
+    os.makedirs(env['DATA_DIR'])
+    input_path = os.path.join('tmp', f"resume_test_{uuid.uuid4().hex}.off")
+    write_cube_off(os.path.join(REPO_DIR, input_path))
+    marker = tmp_path / 'slicing'
+    job_file = tmp_path / 'job_id'
+    outcome_file = tmp_path / 'outcome.json'
+
+    first = subprocess.Popen([sys.executable, '-c', FIRST_RUN, str(marker), input_path, str(job_file)], cwd=REPO_DIR,
+                             env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    sliced_path = None
+    try:
+        deadline = time.time() + 120
+        while not marker.exists() and time.time() < deadline:
+            time.sleep(0.1)
+        assert marker.exists(), "first run never reached the slicer"
+        time.sleep(0.1)
+        sliced_path = marker.read_text()
+    finally:
+        # Kill the whole session so conversion pool workers go too, as on a container restart
+        os.killpg(first.pid, signal.SIGKILL)
+        first.wait()
+        if sliced_path is None and os.path.exists(os.path.join(REPO_DIR, input_path)):
+            os.remove(os.path.join(REPO_DIR, input_path))
+
+    job_id = job_file.read_text()
+    assert sliced_path.endswith('_converted.stl')
+    assert not os.path.exists(os.path.join(REPO_DIR, input_path))
+
+    subprocess.run([sys.executable, '-c', SECOND_RUN, job_id, str(outcome_file)], cwd=REPO_DIR, env=env,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=300)
+    outcome = json.loads(outcome_file.read_text())
+
+    assert outcome['job']['state'] == 'completed', outcome['job']
+    assert outcome['job']['result']['status'] == 'success'
+    assert outcome['sliced'] == [sliced_path]
+    assert not os.path.exists(sliced_path)
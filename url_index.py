@@ -0,0 +1,138 @@
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+
+class UrlIndex:
+    """Remembers downloaded URLs so repeat downloads can be conditional.
+
+    Each URL maps to its last ETag/Last-Modified validators, the SHA-256 of
+    its content and a stored copy in ``store_dir``. Stored files are named by
+    content hash, so URLs serving identical bytes share one copy. The least
+    recently used URLs are forgotten once the store exceeds ``max_bytes``.
+    """
+
+    def __init__(self, db_path, store_dir, max_bytes):
+        self.db_path = db_path
+        self.store_dir = store_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        os.makedirs(store_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS urls (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS urls_accessed_at ON urls (accessed_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS urls_sha256 ON urls (sha256)")
+
+        logging.info(f"[URL_INDEX] URL index ready at {db_path}, storing up to {max_bytes / 1024 / 1024:.0f} MB in "
+                     f"{store_dir}")
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _stored_path(self, sha256):
+        return os.path.join(self.store_dir, sha256)
+
+    def conditional_headers(self, url):
+        """Return ``(entry, headers)`` for a conditional GET of ``url``, or ``(None, {})`` if it is unknown"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT etag, last_modified, sha256, size FROM urls WHERE url = ?", (url,)).fetchone()
+        if row is None or not os.path.exists(self._stored_path(row[2])):
+            return None, {}
+
+        headers = {}
+        if row[0]:
+            headers['If-None-Match'] = row[0]
+        if row[1]:
+            headers['If-Modified-Since'] = row[1]
+        return {"etag": row[0], "last_modified": row[1], "sha256": row[2], "size": row[3]}, headers
+
+    def restore(self, url, entry, destination):
+        """Place the stored copy for a not-modified ``url`` at ``destination``"""
+        # Copied rather than hard linked: the pipeline may rescale an STL in place
+        shutil.copyfile(self._stored_path(entry['sha256']), destination)
+        with self._connect() as conn:
+            conn.execute("UPDATE urls SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        with self._lock:
+            self._hits += 1
+        logging.info(f"[URL_INDEX] Reused stored copy of {url} ({entry['size']} bytes)")
+
+    def put(self, url, etag, last_modified, sha256, source_path):
+        """Store a fresh download of ``url``; responses without validators are not indexed"""
+        with self._lock:
+            self._misses += 1
+        if not etag and not last_modified:
+            return
+
+        size = os.path.getsize(source_path)
+        if size > self.max_bytes:
+            return
+
+        stored_path = self._stored_path(sha256)
+        if not os.path.exists(stored_path):
+            temp_path = f"{stored_path}.{os.getpid()}.{threading.get_ident()}"
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, stored_path)
+
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO urls (url, etag, last_modified, sha256, size, fetched_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, sha256, size, now, now)
+            )
+        logging.info(f"[URL_INDEX] Indexed {url} (etag {etag}, last modified {last_modified})")
+        self._evict()
+
+    def _evict(self):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT url, sha256, size FROM urls ORDER BY accessed_at DESC"
+            ).fetchall()
+            kept_hashes = set()
+            total = 0
+            for url, sha256, size in rows:
+                if sha256 not in kept_hashes:
+                    if total + size > self.max_bytes:
+                        conn.execute("DELETE FROM urls WHERE url = ?", (url,))
+                        continue
+                    kept_hashes.add(sha256)
+                    total += size
+
+            for sha256 in {row[1] for row in rows} - kept_hashes:
+                try:
+                    os.remove(self._stored_path(sha256))
+                    logging.info(f"[URL_INDEX] Evicted stored file {sha256}")
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        with self._connect() as conn:
+            entries, stored_bytes = conn.execute(
+                "SELECT COUNT(*), (SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM urls)) "
+                "FROM urls"
+            ).fetchone()
+        with self._lock:
+            return {
+                "entries": entries,
+                "stored_bytes": stored_bytes,
+                "not_modified_hits": self._hits,
+                "full_downloads": self._misses
+            }
@@ -0,0 +1,167 @@
+import logging
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueueFullError(Exception):
+    """Raised when the executor has no free slot for another job"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobExecutor:
+    """Thread pool with a fixed number of slicer slots and a bounded pending queue.
+
+    At most ``max_workers`` jobs run at once and at most ``max_pending`` more
+    wait for a slot. Submissions beyond that raise ``QueueFullError`` so the
+    API can answer with 503 instead of piling up slicer processes.
+    """
+
+    def __init__(self, max_workers, max_pending, name='slicer'):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_pending = max(0, int(max_pending))
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_pending)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._durations = deque(maxlen=50)
+
+        logging.info(f"[EXECUTOR] {name} executor started: {self.max_workers} workers, "
+                     f"{self.max_pending} pending slots")
+
+    def submit(self, fn, *args, block=False, timeout=None, **kwargs):
+        """Queue ``fn`` for execution, raising QueueFullError when no slot is free"""
+        if block:
+            acquired = self._slots.acquire(timeout=timeout)
+        else:
+            acquired = self._slots.acquire(blocking=False)
+
+        if not acquired:
+            self._reject()
+
+        with self._lock:
+            self._pending += 1
+
+        try:
+            return self._executor.submit(self._run, fn, args, kwargs)
+        except Exception:
+            with self._lock:
+                self._pending -= 1
+            self._slots.release()
+            raise
+
+    def _run(self, fn, args, kwargs):
+        with self._lock:
+            self._pending -= 1
+            self._active += 1
+
+        start_time = time.time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+                self._durations.append(time.time() - start_time)
+            self._slots.release()
+
+    def _reject(self):
+        with self._lock:
+            self._rejected += 1
+        retry_after = self.retry_after()
+        logging.warning(f"[EXECUTOR] {self.name} queue full ({self.max_workers} running, {self.max_pending} pending), "
+                        f"retry after {retry_after}s")
+        raise QueueFullError(retry_after)
+
+    def ensure_capacity(self):
+        """Raise QueueFullError if a submission right now would be rejected"""
+        if self.is_full():
+            self._reject()
+
+    def is_full(self):
+        """Whether every running and pending slot is taken"""
+        with self._lock:
+            return self._active + self._pending >= self.max_workers + self.max_pending
+
+    def retry_after(self):
+        """Estimate seconds until a slot frees up, based on recent job durations"""
+        with self._lock:
+            if not self._durations:
+                return 30
+            average = sum(self._durations) / len(self._durations)
+            backlog = self._pending + 1
+        return max(1, math.ceil(average * backlog / self.max_workers))
+
+    def stats(self):
+        with self._lock:
+            average = sum(self._durations) / len(self._durations) if self._durations else None
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "active": self._active,
+                "pending": self._pending,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "average_job_time": average
+            }
+
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers with the same key share its result.
+
+    The first caller (the leader) runs the function. Callers arriving while it
+    runs wait for it and receive the same return value, or the same exception.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._leaders = 0
+        self._followers = 0
+
+    def run(self, key, fn, *args, **kwargs):
+        """Return ``(result, shared)`` where ``shared`` is True for callers that joined a running call"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {"done": threading.Event(), "result": None, "error": None}
+                self._leaders += 1
+                leader = True
+            else:
+                self._followers += 1
+                leader = False
+
+        if not leader:
+            logging.info(f"[SINGLE_FLIGHT] Joining in-flight call for {key}")
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"], True
+
+        try:
+            call["result"] = fn(*args, **kwargs)
+            return call["result"], False
+        except BaseException as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._calls),
+                "leaders": self._leaders,
+                "followers": self._followers
+            }